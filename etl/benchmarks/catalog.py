@@ -0,0 +1,278 @@
+import io
+import logging
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Iterator
+
+from psycopg2.extensions import connection
+
+logger = logging.getLogger(__name__)
+
+# Старшие биты UUID - вид объекта, младшие - его номер в каталоге:
+# id вычисляется по номеру и обратно без справочников в памяти
+FILM, PERSON, GENRE, PERSON_FILM, GENRE_FILM = range(1, 6)
+
+CREATED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+FIRST_NAMES = "Anna Boris Clara David Elena Felix Greta Hugo Irina".split()
+LAST_NAMES = "Abbott Belov Carter Dolan Egorova Fisher Gordon Hill".split()
+WORDS = (
+    "star war night city love last return dark empire river ghost secret "
+    "journey storm king garden machine shadow winter dream road silence"
+).split()
+
+
+def make_id(kind: int, number: int) -> str:
+    """Детерминированный id объекта вида kind с номером number."""
+    digits = f"{kind:08x}{number:024x}"
+    return "-".join(
+        (digits[:8], digits[8:12], digits[12:16], digits[16:20], digits[20:])
+    )
+
+
+def id_number(id_: str) -> int:
+    """Номер объекта в каталоге по его id."""
+    return uuid.UUID(str(id_)).int & (2**96 - 1)
+
+
+@dataclass(frozen=True)
+class CatalogSpec:
+    """
+    Параметры синтетического каталога.
+
+    Каталог не хранится в памяти: фильм, персона или жанр с номером n
+    строится заново при каждом обращении генератором со своим зерном,
+    поэтому каталог из миллиона фильмов занимает столько же памяти,
+    сколько из тысячи.
+    """
+
+    films: int
+    persons_per_film: int = 8
+    films_per_person: int = 4
+    genres: int = 30
+    genres_per_film: int = 3
+    description_words: int = 40
+    seed: int = 42
+
+    @property
+    def persons(self) -> int:
+        return max(
+            self.films * self.persons_per_film // self.films_per_person,
+            self.persons_per_film,
+        )
+
+    @property
+    def stride(self) -> int:
+        """Шаг между участниками одного фильма в нумерации персон."""
+        return max(self.persons // self.persons_per_film, 1)
+
+    def rng(self, kind: int, number: int) -> random.Random:
+        return random.Random((self.seed << 100) | (kind << 96) | number)
+
+    def pick(
+        self, kind: int, number: int, choices: list[str], salt: int = 0
+    ) -> str:
+        """Детерминированный выбор без генератора: дешевле random.Random."""
+        mixed = number * 2654435761 + self.seed * 40503 + kind * 97 + salt
+        mixed %= 2**32
+        return choices[(mixed ^ (mixed >> 13)) % len(choices)]
+
+    def film_persons(self, film: int) -> list[tuple[int, str]]:
+        """Участники фильма: (номер персоны, роль)."""
+        return [
+            (
+                (film + slot * self.stride) % self.persons,
+                self.role(slot),
+            )
+            for slot in range(self.persons_per_film)
+        ]
+
+    def person_films(self, person: int) -> Iterator[tuple[int, str]]:
+        """Фильмы персоны: (номер фильма, роль); обратное film_persons."""
+        for slot in range(self.persons_per_film):
+            film = (person - slot * self.stride) % self.persons
+            while film < self.films:
+                yield film, self.role(slot)
+                film += self.persons
+
+    def film_genres(self, film: int) -> list[int]:
+        """Номера жанров фильма."""
+        count = min(self.genres_per_film, self.genres)
+        return [(film * 7 + slot) % self.genres for slot in range(count)]
+
+    @staticmethod
+    def role(slot: int) -> str:
+        if slot == 0:
+            return "director"
+        if slot <= 2:
+            return "writer"
+        return "actor"
+
+    def film(self, number: int) -> dict[str, Any]:
+        rng = self.rng(FILM, number)
+        return {
+            "id": make_id(FILM, number),
+            "title": " ".join(rng.choices(WORDS, k=3)).title() + f" {number}",
+            "description": " ".join(
+                rng.choices(WORDS, k=self.description_words)
+            ),
+            "rating": round(rng.uniform(1, 10), 1),
+            "type": "movie",
+        }
+
+    def person(self, number: int) -> dict[str, Any]:
+        first_name = self.pick(PERSON, number, FIRST_NAMES)
+        last_name = self.pick(PERSON, number, LAST_NAMES, salt=1)
+        return {
+            "id": make_id(PERSON, number),
+            "full_name": f"{first_name} {last_name} {number}",
+        }
+
+    def genre(self, number: int) -> dict[str, Any]:
+        return {
+            "id": make_id(GENRE, number),
+            "name": f"{self.pick(GENRE, number, WORDS).title()} {number}",
+            "description": " ".join(
+                self.pick(GENRE, number, WORDS, salt=salt)
+                for salt in range(10)
+            ),
+        }
+
+
+# Таблицы каталога в порядке удаления: связи раньше фильмов, персон и жанров
+CATALOG_TABLES = (
+    ("genre_film_work", GENRE_FILM),
+    ("person_film_work", PERSON_FILM),
+    ("film_work", FILM),
+    ("person", PERSON),
+    ("genre", GENRE),
+)
+
+
+def disable_triggers(conn: connection) -> None:
+    """
+    Отключает триггеры outbox до конца сеанса.
+
+    session_replication_role требует прав суперпользователя; без них
+    триггеры остаются включены.
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("SET session_replication_role = replica;")
+        except Exception as e:
+            logger.warning(f"Триггеры не отключены: {e}")
+            conn.rollback()
+
+
+def clear(conn: connection) -> None:
+    """
+    Удаляет из таблиц content синтетический каталог любого размера.
+
+    Строки каталога узнаются по виду объекта в старших битах id, поэтому
+    остальные строки таблиц не затрагиваются.
+    """
+    disable_triggers(conn)
+    with conn.cursor() as cursor:
+        for table, kind in CATALOG_TABLES:
+            cursor.execute(
+                f"DELETE FROM content.{table} WHERE id BETWEEN %s AND %s;",
+                (make_id(kind, 0), make_id(kind, 2**96 - 1)),
+            )
+            logger.info(f"content.{table}: удалено {cursor.rowcount} строк.")
+    conn.commit()
+
+
+def populate(conn: connection, spec: CatalogSpec, chunk: int = 10000):
+    """
+    Заливает каталог в таблицы content через COPY.
+
+    Рассчитан на базу без синтетического каталога (см. clear): триггеры
+    outbox на время заливки отключаются.
+    """
+    disable_triggers(conn)
+    with conn.cursor() as cursor:
+        tables = {
+            "genre": (
+                "id, name, description, created, modified",
+                (
+                    (g["id"], g["name"], g["description"], CREATED, CREATED)
+                    for g in map(spec.genre, range(spec.genres))
+                ),
+            ),
+            "person": (
+                "id, full_name, created, modified",
+                (
+                    (p["id"], p["full_name"], CREATED, CREATED)
+                    for p in map(spec.person, range(spec.persons))
+                ),
+            ),
+            "film_work": (
+                "id, title, description, rating, type, created, modified",
+                (
+                    (
+                        f["id"],
+                        f["title"],
+                        f["description"],
+                        f["rating"],
+                        f["type"],
+                        CREATED,
+                        CREATED,
+                    )
+                    for f in map(spec.film, range(spec.films))
+                ),
+            ),
+            "person_film_work": (
+                "id, film_work_id, person_id, role, created",
+                (
+                    (
+                        make_id(
+                            PERSON_FILM, film * spec.persons_per_film + slot
+                        ),
+                        make_id(FILM, film),
+                        make_id(PERSON, person),
+                        role,
+                        CREATED,
+                    )
+                    for film in range(spec.films)
+                    for slot, (person, role) in enumerate(
+                        spec.film_persons(film)
+                    )
+                ),
+            ),
+            "genre_film_work": (
+                "id, film_work_id, genre_id, created",
+                (
+                    (
+                        make_id(
+                            GENRE_FILM, film * spec.genres_per_film + slot
+                        ),
+                        make_id(FILM, film),
+                        make_id(GENRE, genre),
+                        CREATED,
+                    )
+                    for film in range(spec.films)
+                    for slot, genre in enumerate(spec.film_genres(film))
+                ),
+            ),
+        }
+        for table, (columns, rows) in tables.items():
+            total = 0
+            while True:
+                buffer = io.StringIO()
+                count = 0
+                for row in rows:
+                    buffer.write("\t".join(map(str, row)) + "\n")
+                    count += 1
+                    if count >= chunk:
+                        break
+                if not count:
+                    break
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY content.{table} ({columns}) FROM STDIN", buffer
+                )
+                total += count
+            logger.info(f"content.{table}: загружено {total} строк.")
+    conn.commit()
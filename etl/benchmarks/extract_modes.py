@@ -0,0 +1,78 @@
+"""
+Сравнение режимов извлечения фильмов: split и denormalized.
+
+Запуск из каталога etl против базы из POSTGRES_CONFIG:
+
+    python -m benchmarks.extract_modes --films 5000 --batch-size 500
+"""
+
+import argparse
+import statistics
+import time
+
+from etl.extractor import Extractor
+from etl.transformer import Transformer
+
+
+def measure(
+    extractor: Extractor, batches: list[list[str]], repeats: int
+) -> dict[str, float]:
+    """Замеряет время извлечения и трансформации всех пачек фильмов."""
+    extract_times, transform_times = [], []
+    for _ in range(repeats):
+        extract_time = transform_time = 0.0
+        for batch in batches:
+            started = time.perf_counter()
+            rows = extractor.fetch_movies(batch)
+            extracted = time.perf_counter()
+            Transformer.transform(rows, extractor.movies_data_type)
+            extract_time += extracted - started
+            transform_time += time.perf_counter() - extracted
+        extract_times.append(extract_time)
+        transform_times.append(transform_time)
+    return {
+        "extract": statistics.median(extract_times),
+        "transform": statistics.median(transform_times),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--films", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    probe = Extractor()
+    film_ids = [
+        row["id"]
+        for row in probe._fetch_data(
+            "SELECT id FROM content.film_work ORDER BY id LIMIT %s;",
+            (args.films,),
+        )
+    ]
+    probe.close()
+    batches = [
+        film_ids[i : i + args.batch_size]
+        for i in range(0, len(film_ids), args.batch_size)
+    ]
+    print(
+        f"films={len(film_ids)} batch_size={args.batch_size} "
+        f"repeats={args.repeats}"
+    )
+    print(f"{'mode':<14}{'extract, s':>12}{'transform, s':>14}{'films/s':>12}")
+    for mode in ("split", "denormalized"):
+        extractor = Extractor(film_extract_mode=mode)
+        measure(extractor, batches[:1], 1)  # прогрев пула и кэша PostgreSQL
+        result = measure(extractor, batches, args.repeats)
+        extractor.close()
+        total = result["extract"] + result["transform"]
+        print(
+            f"{mode:<14}{result['extract']:>12.3f}"
+            f"{result['transform']:>14.3f}"
+            f"{len(film_ids) / total if total else 0:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import time
+from typing import Any
+
+from elastic_transport import (
+    ApiResponseMeta,
+    BaseAsyncNode,
+    BaseNode,
+    HttpHeaders,
+)
+from elastic_transport._node import NodeApiResponse
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+
+from benchmarks.catalog import (
+    CREATED,
+    GENRE,
+    PERSON,
+    CatalogSpec,
+    id_number,
+    make_id,
+)
+from etl.extractor import AsyncExtractor, Extractor
+
+
+class FixtureExtractor(Extractor):
+    """
+    Extractor, отвечающий строками синтетического каталога вместо
+    PostgreSQL.
+
+    Подменяются только запросы: строки имеют ту же форму, что и ответы
+    PostgreSQL, а сборка фильма (_combine_data) и всё, что идёт дальше,
+    работают как в проде. Поддерживается раздельный режим извлечения.
+    """
+
+    def __init__(self, spec: CatalogSpec) -> None:
+        super().__init__(film_extract_mode="split")
+        self.spec = spec
+        self.genres = [spec.genre(number) for number in range(spec.genres)]
+
+    def _fetch_filmwork_details(self, filmwork_ids: list[str]) -> list[dict]:
+        rows = []
+        for id_ in filmwork_ids:
+            film = self.spec.film(id_number(id_))
+            rows.append(
+                {
+                    "fw_id": film["id"],
+                    "title": film["title"],
+                    "description": film["description"],
+                    "rating": film["rating"],
+                    "type": film["type"],
+                    "created": CREATED,
+                    "modified": CREATED,
+                }
+            )
+        return rows
+
+    def _fetch_person_data(self, filmwork_ids: list[str]) -> list[dict]:
+        return [
+            {
+                "film_work_id": id_,
+                "person_id": make_id(PERSON, person),
+                "person_name": self.spec.person(person)["full_name"],
+                "role": role,
+            }
+            for id_ in filmwork_ids
+            for person, role in self.spec.film_persons(id_number(id_))
+        ]
+
+    def _fetch_genre_data(self, filmwork_ids: list[str]) -> list[dict]:
+        return [
+            {
+                "film_work_id": id_,
+                "genre_id": make_id(GENRE, genre),
+                "genre_name": self.genres[genre]["name"],
+            }
+            for id_ in filmwork_ids
+            for genre in self.spec.film_genres(id_number(id_))
+        ]
+
+    def fetch_persons_by_ids(
+        self, person_ids: list[str], any_shard: bool = False
+    ) -> list[dict]:
+        rows = []
+        for id_ in person_ids:
+            person = self.spec.person(id_number(id_))
+            films: dict[int, list[str]] = {}
+            for film, role in self.spec.person_films(id_number(id_)):
+                films.setdefault(film, []).append(role)
+            person["films"] = []
+            for film, roles in films.items():
+                details = self.spec.film(film)
+                person["films"].append(
+                    {
+                        "id": details["id"],
+                        "title": details["title"],
+                        "imdb_rating": details["rating"],
+                        "roles": roles,
+                    }
+                )
+            rows.append(person)
+        return rows
+
+    def fetch_genres_by_ids(self, genre_ids: list[str]) -> list[dict]:
+        return [
+            {**self.genres[id_number(id_)], "modified": CREATED}
+            for id_ in genre_ids
+        ]
+
+
+class AsyncFixtureExtractor(AsyncExtractor):
+    """AsyncExtractor поверх FixtureExtractor для асинхронного движка."""
+
+    def __init__(self, spec: CatalogSpec) -> None:
+        super().__init__(film_extract_mode="split")
+        self.fixtures = FixtureExtractor(spec)
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def fetch_movies(self, filmwork_ids: list[str]) -> list[dict]:
+        return self.fixtures.fetch_movies(filmwork_ids)
+
+    async def fetch_persons_by_ids(self, person_ids: list[str]) -> list[dict]:
+        return self.fixtures.fetch_persons_by_ids(person_ids)
+
+    async def fetch_genres_by_ids(self, genre_ids: list[str]) -> list[dict]:
+        return self.fixtures.fetch_genres_by_ids(genre_ids)
+
+
+class BulkSinkNode(BaseNode):
+    """
+    Узел Elasticsearch в памяти процесса: принимает _bulk и подтверждает
+    каждый документ, остальные запросы отвечают пустым успехом.
+
+    Клиент, сериализация и хелперы bulk работают по-настоящему, а сеть
+    и сам Elasticsearch из замера исключены; latency секунд на каждый
+    _bulk имитирует время сети и индексации.
+    """
+
+    documents = 0
+    bytes = 0
+    latency = 0.0
+
+    def perform_request(
+        self, method, target, body=None, headers=None, request_timeout=None
+    ):
+        if is_bulk(target):
+            time.sleep(BulkSinkNode.latency)
+        return sink_response(self.config, target, body)
+
+
+class AsyncBulkSinkNode(BaseAsyncNode):
+    """Асинхронный вариант BulkSinkNode для AsyncElasticsearch."""
+
+    async def perform_request(
+        self, method, target, body=None, headers=None, request_timeout=None
+    ):
+        if is_bulk(target):
+            await asyncio.sleep(BulkSinkNode.latency)
+        return sink_response(self.config, target, body)
+
+    async def close(self) -> None:
+        pass
+
+
+def is_bulk(target: str) -> bool:
+    return target.partition("?")[0].endswith("/_bulk")
+
+
+def sink_response(config: Any, target: str, body: bytes | None):
+    """Ответ приёмника; счётчики документов общие для обоих узлов."""
+    response: dict[str, Any] = {}
+    if is_bulk(target):
+        lines = body.count(b"\n")
+        BulkSinkNode.documents += lines // 2
+        BulkSinkNode.bytes += len(body)
+        response = {
+            "took": 0,
+            "errors": False,
+            "items": [{"index": {"status": 201}}] * (lines // 2),
+        }
+    meta = ApiResponseMeta(
+        status=200,
+        http_version="1.1",
+        headers=HttpHeaders(
+            {
+                "content-type": "application/json",
+                "x-elastic-product": "Elasticsearch",
+            }
+        ),
+        duration=0.0,
+        node=config,
+    )
+    return NodeApiResponse(meta, json.dumps(response).encode())
+
+
+def make_sink() -> Elasticsearch:
+    """Клиент Elasticsearch, пишущий в BulkSinkNode."""
+    return Elasticsearch("http://bulk-sink:9200", node_class=BulkSinkNode)
+
+
+def make_async_sink() -> AsyncElasticsearch:
+    """Клиент AsyncElasticsearch, пишущий в AsyncBulkSinkNode."""
+    return AsyncElasticsearch(
+        "http://bulk-sink:9200", node_class=AsyncBulkSinkNode
+    )
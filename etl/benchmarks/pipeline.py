@@ -0,0 +1,276 @@
+"""
+Нагрузочный прогон ETL на синтетическом каталоге.
+
+Запуск из каталога etl:
+
+    python -m benchmarks.pipeline              # 10k, 100k и 1M фильмов
+    python -m benchmarks.pipeline --films 10000 --source postgres --populate
+    python -m benchmarks.pipeline --engine sync async --es-latency 0.02
+
+Фильмы, персоны и жанры каталога проходят через Extractor, Transformer
+и Loader пачками, как в инкрементальном проходе; Loader пишет в
+Elasticsearch в памяти процесса. Каждый размер каталога прогоняется
+в отдельном процессе, чтобы пиковая память не накапливалась.
+
+С --source postgres строки читаются из базы POSTGRES_CONFIG; --populate
+перед прогоном каждого размера заменяет в ней синтетический каталог,
+не трогая остальные строки таблиц.
+Движок async прогоняет каждый индекс конвейером AsyncPipeline, и его
+этапы замеряются вместе; --es-latency добавляет каждому запросу _bulk
+задержку сети и индексации, которую конвейер перекрывает чтением.
+"""
+
+import argparse
+import itertools
+import logging
+import multiprocessing
+import resource
+import time
+from collections import defaultdict
+from typing import Any
+
+from benchmarks.catalog import (
+    FILM,
+    GENRE,
+    PERSON,
+    CatalogSpec,
+    clear as clear_catalog,
+    make_id,
+    populate as populate_catalog,
+)
+from benchmarks.fixtures import (
+    AsyncFixtureExtractor,
+    BulkSinkNode,
+    FixtureExtractor,
+    make_async_sink,
+    make_sink,
+)
+from etl.extractor import AsyncExtractor, Extractor, get_connection
+from etl.loader import Loader
+from etl.pipeline import AsyncPipeline
+from etl.transformer import Transformer
+
+# pipeline - все этапы асинхронного движка, идущие одновременно
+STAGES = ("extract", "transform", "load", "pipeline")
+
+
+def run_benchmark(
+    spec: CatalogSpec, source: str, batch_size: int, engine: str = "sync"
+) -> dict[str, Any]:
+    """Прогоняет каталог через ETL и возвращает замеры."""
+    if engine == "async":
+        return run_async_benchmark(spec, source, batch_size)
+    extractor = FixtureExtractor(spec) if source == "fixtures" else Extractor()
+    loader = Loader(make_sink())
+    timings: dict[tuple[str, str], list[float]] = defaultdict(lambda: [0, 0])
+    sources = {
+        "movies": (
+            FILM,
+            spec.films,
+            extractor.fetch_movies,
+            extractor.movies_data_type,
+        ),
+        "persons": (
+            PERSON,
+            spec.persons,
+            extractor.fetch_persons_by_ids,
+            "persons",
+        ),
+        "genres": (
+            GENRE,
+            spec.genres,
+            extractor.fetch_genres_by_ids,
+            "genres",
+        ),
+    }
+    started = time.perf_counter()
+    for index, (kind, count, fetch, data_type) in sources.items():
+        for start in range(0, count, batch_size):
+            ids = [
+                make_id(kind, number)
+                for number in range(start, min(start + batch_size, count))
+            ]
+            marks = [time.perf_counter()]
+            rows = fetch(ids)
+            marks.append(time.perf_counter())
+            documents = Transformer.transform(rows, data_type)
+            marks.append(time.perf_counter())
+            loader.load_data(index, documents)
+            marks.append(time.perf_counter())
+            for stage, processed, begin, end in zip(
+                STAGES,
+                (len(rows), len(documents), len(documents)),
+                marks,
+                marks[1:],
+            ):
+                totals = timings[(index, stage)]
+                totals[0] += processed
+                totals[1] += end - begin
+    extractor.close()
+    return summary(time.perf_counter() - started, timings)
+
+
+def run_async_benchmark(
+    spec: CatalogSpec, source: str, batch_size: int
+) -> dict[str, Any]:
+    """Прогоняет каталог конвейером асинхронного движка."""
+    extractor = (
+        AsyncFixtureExtractor(spec)
+        if source == "fixtures"
+        else AsyncExtractor()
+    )
+    pipeline = AsyncPipeline(Loader(make_sink()), extractor, make_async_sink())
+    timings: dict[tuple[str, str], list[float]] = {}
+    sources = {
+        "movies": (FILM, spec.films, extractor.movies_data_type),
+        "persons": (PERSON, spec.persons, "persons"),
+        "genres": (GENRE, spec.genres, "genres"),
+    }
+    fetches = {
+        "movies": extractor.fetch_movies,
+        "persons": extractor.fetch_persons_by_ids,
+        "genres": extractor.fetch_genres_by_ids,
+    }
+    started = time.perf_counter()
+    for index, (kind, count, data_type) in sources.items():
+        # пачки id порождаются по ходу, а не списком на весь каталог
+        batches = (
+            [
+                make_id(kind, number)
+                for number in range(start, min(start + batch_size, count))
+            ]
+            for start in range(0, count, batch_size)
+        )
+        begin = time.perf_counter()
+        loaded = pipeline.loop.run_until_complete(
+            pipeline.run(batches, fetches[index], data_type, [(index, None)])
+        )
+        timings[(index, "pipeline")] = [loaded, time.perf_counter() - begin]
+    pipeline.close()
+    return summary(time.perf_counter() - started, timings)
+
+
+def summary(
+    seconds: float, timings: dict[tuple[str, str], list[float]]
+) -> dict[str, Any]:
+    return {
+        "seconds": seconds,
+        "timings": dict(timings),
+        "documents": BulkSinkNode.documents,
+        "bytes": BulkSinkNode.bytes,
+        # на Linux ru_maxrss в килобайтах
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / 1024,
+    }
+
+
+def report(spec: CatalogSpec, engine: str, result: dict[str, Any]) -> None:
+    print(
+        f"\nengine={engine} films={spec.films} persons={spec.persons} "
+        f"genres={spec.genres}"
+    )
+    header = ("index", "stage", "rows", "seconds", "rows/s")
+    print("{:<9}{:<11}{:>10}{:>10}{:>12}".format(*header))
+    for (index, stage), (rows, seconds) in sorted(
+        result["timings"].items(),
+        key=lambda item: (item[0][0], STAGES.index(item[0][1])),
+    ):
+        rate = rows / seconds if seconds else 0
+        print(f"{index:<9}{stage:<11}{rows:>10}{seconds:>10.2f}{rate:>12.0f}")
+    seconds = result["seconds"]
+    print(
+        f"total: {result['documents']} docs in {seconds:.2f} s, "
+        f"{result['documents'] / seconds:.0f} docs/s, "
+        f"{result['bytes'] / 2**20 / seconds:.2f} MB/s, "
+        f"peak RSS {result['peak_rss_mb']:.0f} MB"
+    )
+
+
+def run_in_process(
+    spec: CatalogSpec,
+    source: str,
+    batch_size: int,
+    populate: bool,
+    engine: str = "sync",
+    es_latency: float = 0.0,
+) -> dict[str, Any]:
+    """Точка входа отдельного процесса прогона."""
+    logging.basicConfig(level=logging.WARNING)
+    BulkSinkNode.latency = es_latency
+    if populate:
+        conn = get_connection()
+        try:
+            # каталог предыдущего размера занял бы те же id
+            clear_catalog(conn)
+            populate_catalog(conn, spec)
+        finally:
+            conn.close()
+    return run_benchmark(spec, source, batch_size, engine)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--films",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000, 1_000_000],
+        help="размеры каталога, по прогону на каждый",
+    )
+    parser.add_argument("--persons-per-film", type=int, default=8)
+    parser.add_argument("--films-per-person", type=int, default=4)
+    parser.add_argument("--genres", type=int, default=30)
+    parser.add_argument("--genres-per-film", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument(
+        "--source", choices=("fixtures", "postgres"), default="fixtures"
+    )
+    parser.add_argument(
+        "--populate",
+        action="store_true",
+        help="залить каталог в PostgreSQL перед прогоном каждого размера",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=("sync", "async"),
+        nargs="+",
+        default=["sync"],
+        help="движки ETL, по прогону на каждый",
+    )
+    parser.add_argument(
+        "--es-latency",
+        type=float,
+        default=0.0,
+        help="имитируемое время ответа Elasticsearch на _bulk, секунд",
+    )
+    args = parser.parse_args()
+    # отдельный чистый процесс на прогон: пиковая память не наследуется
+    context = multiprocessing.get_context("spawn")
+    for films, engine in itertools.product(args.films, args.engine):
+        spec = CatalogSpec(
+            films=films,
+            persons_per_film=args.persons_per_film,
+            films_per_person=args.films_per_person,
+            genres=args.genres,
+            genres_per_film=args.genres_per_film,
+            seed=args.seed,
+        )
+        with context.Pool(1) as pool:
+            result = pool.apply(
+                run_in_process,
+                (
+                    spec,
+                    args.source,
+                    args.batch_size,
+                    # каталог заливается один раз, до первого движка
+                    args.populate and engine == args.engine[0],
+                    engine,
+                    args.es_latency,
+                ),
+            )
+        report(spec, engine, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Сверка индексов Elasticsearch с таблицами PostgreSQL.
+
+Запуск из каталога etl:
+
+    python check.py                          # все индексы
+    python check.py --entity movies --depth 4
+    python check.py --repair                 # и перечитать расхождения
+
+Печатает id документов, которых нет в индексе (missing), лишних
+(extra) и устаревших (stale) - с версией etl_version, отличной от
+времени изменения строки в БД. Документы, записанные до появления
+версий, считаются устаревшими: их обновит python main.py backfill или
+--repair.
+
+С --repair расходящиеся объекты перечитываются из БД и загружаются,
+как в python reindex.py: найденные обновляются, лишние удаляются.
+"""
+
+import argparse
+import logging
+
+from config.settings import REDIS_CONFIG
+
+from etl.consistency import BUCKET_DEPTH, ConsistencyChecker
+from main import ETLProcess
+from reindex import ENTITIES
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--entity",
+        choices=tuple(ENTITIES),
+        nargs="+",
+        default=list(ENTITIES),
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=BUCKET_DEPTH,
+        help="цифр md5 в номере корзины: корзин 16**depth",
+    )
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="перечитать из БД и загрузить расходящиеся объекты",
+    )
+    args = parser.parse_args()
+
+    process = ETLProcess(REDIS_CONFIG)
+    process.refresh_version()
+    # отпечатки могли совпасть с документом, которого в индексе уже нет
+    process.loader.fingerprints = None
+    checker = ConsistencyChecker(process.extractor, process.loader, args.depth)
+    drifted = False
+    try:
+        for entity in args.entity:
+            drift = checker.check(ENTITIES[entity], process.indices[entity])
+            for outcome in ("missing", "extra", "stale"):
+                for doc_id in getattr(drift, outcome):
+                    print(f"{outcome} {entity} {doc_id}")
+            drifted = drifted or bool(drift.ids)
+            if args.repair and drift.ids:
+                for start in range(0, len(drift.ids), process.batch_size):
+                    process.resync(
+                        entity, drift.ids[start : start + process.batch_size]
+                    )
+                logging.info(
+                    f"Исправлено {len(drift.ids)} документов '{entity}'."
+                )
+    finally:
+        if process.pipeline is not None:
+            process.pipeline.close()
+    # ненулевой код - для запуска по расписанию и алертов
+    raise SystemExit(1 if drifted and not args.repair else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,140 @@ MAX_BACKOFF = 60  # максимальное время ожидания в се
 BASE_BACKOFF = 5  # базовое время ожидания между попытками в секундах
 MAX_RETRIES = 5  # максимальное количество попыток
 
+# Размер пачки изменений, выбираемой из каждой таблицы за один проход
+BATCH_SIZE = int(os.getenv("ETL_BATCH_SIZE", 100))
+# Режим догона: пока пачки выбираются целиком, следующий проход
+# запускается сразу, без паузы опроса
+CATCH_UP_MODE = os.getenv("ETL_CATCH_UP", "true").lower() == "true"
+
+# Источник изменений:
+# outbox - очередь content.etl_outbox, которую заполняют триггеры,
+# timestamps - сканирование таблиц по составным меткам (modified, id)
+CHANGE_CAPTURE = os.getenv("ETL_CHANGE_CAPTURE", "outbox")
+# Триггеры заполняют outbox в любом режиме, поэтому в режиме timestamps
+# обработчики раз в OUTBOX_PRUNE_INTERVAL секунд удаляют события старше
+# OUTBOX_RETENTION секунд; недавние события остаются для перехода на outbox
+OUTBOX_RETENTION = float(os.getenv("ETL_OUTBOX_RETENTION", 86400))
+OUTBOX_PRUNE_INTERVAL = float(os.getenv("ETL_OUTBOX_PRUNE_INTERVAL", 600))
+
+# Пробуждение по LISTEN/NOTIFY вместо частого опроса PostgreSQL
+LISTEN_NOTIFY = os.getenv("ETL_LISTEN_NOTIFY", "false").lower() == "true"
+NOTIFY_CHANNEL = "etl_changes"
+# максимальное время ожидания уведомления, после которого проход
+# всё равно выполняется, в секундах
+NOTIFY_FALLBACK_TIMEOUT = float(os.getenv("ETL_NOTIFY_FALLBACK_TIMEOUT", 30))
+
+# Горизонтальное масштабирование: процессы-обработчики делят фильмы,
+# персоны и жанры на шарды по хешу id, шарды распределяются арендой в Redis
+WORKERS = int(os.getenv("ETL_WORKERS", 1))  # процессов в этом контейнере
+SHARDS = int(os.getenv("ETL_SHARDS", 1))  # шардов на все контейнеры
+# пауза перед перезапуском упавшего процесса-обработчика, в секундах
+WORKER_RESTART_DELAY = float(os.getenv("ETL_WORKER_RESTART_DELAY", 5))
+# время жизни аренды в секундах; фоновый поток продлевает её каждую треть
+# этого времени, и шард упавшего экземпляра освобождается не позже
+SHARD_LEASE_TTL = float(os.getenv("ETL_SHARD_LEASE_TTL", 10))
+
+# Индексы - псевдонимы над версиями вида movies_v7: пересборка заполняет
+# новую версию и атомарно переключает на неё псевдонимы;
+# сколько предыдущих версий хранить после переключения
+INDEX_VERSIONS_KEEP = int(os.getenv("ETL_INDEX_VERSIONS_KEEP", 1))
+
+# Быстрая первичная загрузка: выгрузка каталога через COPY в индексы
+# с отключёнными refresh и репликами
+BULK_INITIAL_LOAD = (
+    os.getenv("ETL_BULK_INITIAL_LOAD", "true").lower() == "true"
+)
+# на сколько секунд раньше начала выгрузки ставятся метки, чтобы
+# перечитать строки, изменённые в ещё не завершённых транзакциях
+INITIAL_LOAD_SAFETY_MARGIN = int(
+    os.getenv("ETL_INITIAL_LOAD_SAFETY_MARGIN", 300)
+)
+# ожидание слияния сегментов после загрузки, в секундах
+FORCEMERGE_TIMEOUT = int(os.getenv("ETL_FORCEMERGE_TIMEOUT", 3600))
+
+# Отпечатки (хеши) записанных документов в Redis: документы, которые
+# после трансформации не изменились, повторно не отправляются
+DOC_FINGERPRINTS = os.getenv("ETL_DOC_FINGERPRINTS", "true").lower() == "true"
+
+# Документы, отклонённые Elasticsearch навсегда (например, не подходящие
+# под маппинг), откладываются в Redis, а не останавливают всю пачку;
+# повторная загрузка - python main.py replay
+DEAD_LETTER_QUEUE = (
+    os.getenv("ETL_DEAD_LETTER_QUEUE", "true").lower() == "true"
+)
+
+# Возобновляемая перезаливка индексов (python main.py backfill) идёт
+# рядом с инкрементальным ETL не быстрее стольких строк в секунду;
+# 0 - без ограничения
+BACKFILL_RATE = float(os.getenv("ETL_BACKFILL_RATE", 1000))
+# документов в одном файле выгрузки и файлов, загружаемых параллельно
+SNAPSHOT_CHUNK_DOCUMENTS = int(
+    os.getenv("ETL_SNAPSHOT_CHUNK_DOCUMENTS", 100000)
+)
+SNAPSHOT_WORKERS = int(os.getenv("ETL_SNAPSHOT_WORKERS", 4))
+
+# Смена имени персоны или названия жанра правится прямо в документах
+# фильмов через update_by_query вместо их полной переиндексации;
+# ожидание такого запроса, в секундах
+UPDATE_BY_QUERY_TIMEOUT = int(os.getenv("ETL_UPDATE_BY_QUERY_TIMEOUT", 600))
+
+# Метрики Prometheus: HTTP-сервер главного процесса (0 - выключен)
+METRICS_PORT = int(os.getenv("ETL_METRICS_PORT", 8001))
+# каталог, через который процессы-обработчики передают значения метрик
+METRICS_DIR = os.getenv("ETL_METRICS_DIR", "/tmp/etl_metrics")
+# до скольких строк досчитывается очередь необработанных изменений
+METRICS_BACKLOG_LIMIT = int(os.getenv("ETL_METRICS_BACKLOG_LIMIT", 100000))
+
+# Потоковое извлечение данных через серверные (именованные) курсоры
+PG_STREAMING = os.getenv("ETL_PG_STREAMING", "false").lower() == "true"
+PG_ITERSIZE = int(os.getenv("ETL_PG_ITERSIZE", 2000))  # строк за одну выборку
+
+# Параметры bulk-загрузки в Elasticsearch
+ES_BULK_CHUNK_SIZE = int(os.getenv("ETL_ES_BULK_CHUNK_SIZE", 500))
+ES_BULK_MAX_CHUNK_BYTES = int(
+    os.getenv("ETL_ES_BULK_MAX_CHUNK_BYTES", 10 * 1024 * 1024)
+)
+# число потоков, отправляющих пачки _bulk параллельно
+ES_BULK_WORKERS = int(os.getenv("ETL_ES_BULK_WORKERS", 1))
+
+# Размер пачек подстраивается под целевые длительность и объём запроса
+# _bulk и уменьшается, когда Elasticsearch отклоняет запросы: отдельно
+# для фильмов, персон и жанров. ETL_ES_BULK_CHUNK_SIZE - начальный размер
+# пачки _bulk, ETL_ES_BULK_MAX_CHUNK_BYTES - по-прежнему жёсткий предел
+ADAPTIVE_BATCHING = (
+    os.getenv("ETL_ADAPTIVE_BATCHING", "true").lower() == "true"
+)
+BULK_TARGET_SECONDS = float(os.getenv("ETL_BULK_TARGET_SECONDS", 1.0))
+BULK_TARGET_BYTES = int(os.getenv("ETL_BULK_TARGET_BYTES", 5 * 1024 * 1024))
+BATCH_SIZE_MIN = int(os.getenv("ETL_BATCH_SIZE_MIN", 10))
+BATCH_SIZE_MAX = int(os.getenv("ETL_BATCH_SIZE_MAX", 5000))
+
+# Способ извлечения фильмов:
+# split - три запроса и сборка документа в Python,
+# denormalized - PostgreSQL сразу собирает готовый документ одним запросом
+FILM_EXTRACT_MODE = os.getenv("ETL_FILM_EXTRACT_MODE", "split")
+
+# Движок загрузки фильмов и персон:
+# sync - извлечение, трансформация и загрузка пачки идут по очереди,
+# async - пачки проходят конвейером на asyncio (asyncpg, AsyncElasticsearch),
+#         и этапы работают одновременно
+ENGINE = os.getenv("ETL_ENGINE", "sync")
+# пачек в очереди между этапами конвейера; полная очередь
+# приостанавливает предыдущий этап
+PIPELINE_QUEUE_SIZE = int(os.getenv("ETL_PIPELINE_QUEUE_SIZE", 4))
+
+# Пул соединений с PostgreSQL
+PG_POOL_MIN_SIZE = int(os.getenv("ETL_PG_POOL_MIN_SIZE", 1))
+PG_POOL_MAX_SIZE = int(os.getenv("ETL_PG_POOL_MAX_SIZE", 4))
+# время жизни соединения в секундах, после которого оно переоткрывается
+PG_POOL_MAX_LIFETIME = int(os.getenv("ETL_PG_POOL_MAX_LIFETIME", 1800))
+# как часто проверять простаивающее соединение запросом SELECT 1, в секундах
+PG_POOL_HEALTHCHECK_INTERVAL = int(
+    os.getenv("ETL_PG_POOL_HEALTHCHECK_INTERVAL", 30)
+)
+# сколько ждать свободного соединения, когда заняты все, в секундах
+PG_POOL_TIMEOUT = float(os.getenv("ETL_PG_POOL_TIMEOUT", 30))
+
 # Конфигурация для PostgreSQL
 POSTGRES_CONFIG = {
     "dbname": os.getenv("DB_NAME"),
@@ -34,6 +168,8 @@ ES_CONFIG = {
     "verify_certs": os.getenv("ES_VERIFY_CERTS", "false").lower() == "true",
     "retry_on_timeout": False,
     "max_retries": 1,
+    "http_compress": os.getenv("ETL_ES_HTTP_COMPRESS", "false").lower()
+    == "true",
 }
 
 # Конфигурация для Redis
@@ -122,6 +258,7 @@ movies_schema = {
                     "name": {"type": "text", "analyzer": "ru_en"},
                 },
             },
+            "etl_version": {"type": "long"},
         },
     },
 }
@@ -136,6 +273,7 @@ genres_schema = {
             "id": {"type": "keyword"},
             "name": {"type": "text", "analyzer": "ru_en"},
             "description": {"type": "text", "analyzer": "ru_en"},
+            "etl_version": {"type": "long"},
         },
     },
 }
@@ -158,6 +296,7 @@ persons_schema = {
                     "roles": {"type": "keyword"},
                 },
             },
+            "etl_version": {"type": "long"},
         },
     },
 }
@@ -0,0 +1,163 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+from datetime import datetime
+from itertools import chain, count, islice
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import orjson
+
+from etl.loader import encode
+
+# Версия формата выгрузки: импорт отказывается читать другие
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+SCHEMAS = "schemas.json"
+# выгрузка упирается в сжатие, поэтому скорость важнее степени сжатия
+COMPRESS_LEVEL = 1
+WRITE_BUFFER = 2**20
+
+
+class SnapshotError(Exception):
+    """Выгрузка не найдена, не завершена или повреждена."""
+
+    pass
+
+
+def prepare_directory(directory: Path) -> None:
+    """Создаёт каталог выгрузки; завершённую выгрузку не перезаписывает."""
+    if (directory / MANIFEST).exists():
+        raise SnapshotError(f"В каталоге '{directory}' уже есть выгрузка.")
+    directory.mkdir(parents=True, exist_ok=True)
+
+
+def write_index(
+    directory: Path,
+    index: str,
+    documents: Iterable[dict[str, Any]],
+    chunk_documents: int,
+) -> dict[str, Any]:
+    """
+    Пишет документы индекса в файлы index/part-NNNNN.ndjson.gz.
+
+    В каждом файле не больше chunk_documents документов, по одному
+    в строке; документы не накапливаются в памяти.
+
+    :return: Запись манифеста: число документов и файлы с суммами sha256.
+    """
+    (directory / index).mkdir(parents=True, exist_ok=True)
+    iterator = iter(documents)
+    files: list[dict[str, Any]] = []
+    for part in count():
+        first = next(iterator, None)
+        if first is None:
+            break
+        name = f"{index}/part-{part:05d}.ndjson.gz"
+        written = write_part(
+            directory / name,
+            chain([first], islice(iterator, chunk_documents - 1)),
+        )
+        files.append(
+            {
+                "name": name,
+                "documents": written,
+                "sha256": file_digest(directory / name),
+            }
+        )
+    return {
+        "documents": sum(file["documents"] for file in files),
+        "files": files,
+    }
+
+
+def write_part(path: Path, documents: Iterable[dict[str, Any]]) -> int:
+    """Пишет документы в сжатый файл NDJSON и возвращает их число."""
+    written = 0
+    with gzip.open(path, "wb", compresslevel=COMPRESS_LEVEL) as raw:
+        # GzipFile сжимает каждую запись отдельным вызовом zlib
+        with io.BufferedWriter(raw, WRITE_BUFFER) as file:
+            for document in documents:
+                file.write(encode(document) + b"\n")
+                written += 1
+    return written
+
+
+def read_part(directory: Path, part: dict[str, Any]) -> Iterator[dict]:
+    """Читает документы файла выгрузки, сверив его сумму с манифестом."""
+    path = directory / part["name"]
+    if file_digest(path) != part["sha256"]:
+        raise SnapshotError(f"Файл '{path}' повреждён: сумма не совпадает.")
+    with gzip.open(path, "rb") as file:
+        for line in file:
+            yield orjson.loads(line)
+
+
+def file_digest(path: Path) -> str:
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def save_manifest(
+    directory: Path,
+    schemas: dict[str, dict],
+    watermarks: dict[str, tuple[datetime, str]],
+    indices: dict[str, dict[str, Any]],
+) -> None:
+    """
+    Сохраняет схемы индексов и манифест выгрузки.
+
+    Манифест пишется последним и атомарно: выгрузка без него считается
+    незавершённой.
+    """
+    write_json(directory / SCHEMAS, schemas)
+    write_json(
+        directory / MANIFEST,
+        {
+            "format": FORMAT_VERSION,
+            "created": datetime.now().astimezone().isoformat(),
+            "watermarks": {
+                table: [modified.isoformat(), last_id]
+                for table, (modified, last_id) in watermarks.items()
+            },
+            "indices": indices,
+        },
+    )
+
+
+def load_manifest(directory: Path) -> dict[str, Any]:
+    """
+    Читает манифест выгрузки.
+
+    Метки возвращаются парами (время изменения, id), как их хранит Redis.
+    """
+    path = directory / MANIFEST
+    if not path.exists():
+        raise SnapshotError(
+            f"В каталоге '{directory}' нет завершённой выгрузки."
+        )
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if manifest.get("format") != FORMAT_VERSION:
+        raise SnapshotError(
+            f"Формат выгрузки {manifest.get('format')} не поддерживается."
+        )
+    manifest["watermarks"] = {
+        table: (datetime.fromisoformat(modified), last_id)
+        for table, (modified, last_id) in manifest["watermarks"].items()
+    }
+    return manifest
+
+
+def load_schemas(directory: Path) -> dict[str, dict]:
+    """Читает схемы индексов, сохранённые при выгрузке."""
+    return json.loads((directory / SCHEMAS).read_text(encoding="utf-8"))
+
+
+def write_json(path: Path, value: Any) -> None:
+    temporary = path.with_name(f".{path.name}.tmp")
+    temporary.write_text(
+        json.dumps(value, indent=2, ensure_ascii=False), encoding="utf-8"
+    )
+    os.replace(temporary, path)
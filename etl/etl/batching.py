@@ -0,0 +1,89 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Во сколько раз пачка уменьшается, когда Elasticsearch отклоняет запросы
+BACKOFF_FACTOR = 0.5
+# Доля начального размера, на которую растёт пачка, уложившаяся в цель
+GROWTH_RATE = 0.1
+
+
+class AdaptiveBatchSize:
+    """
+    Размер пачки, подстраиваемый по итогам запросов _bulk (AIMD).
+
+    Полная пачка, уложившаяся в целевые время и объём, увеличивает размер
+    на постоянный шаг. Пачка, превысившая цель, уменьшает его пропорционально
+    превышению, но не больше чем вдвое; отклонённая (429, 5xx) - вдвое.
+    Так размер держится у наибольшего, который кластер принимает без
+    перегрузки, и быстро отступает, когда кластер перегружен.
+
+    Итоги пачек приходят из потоков отправки, поэтому изменения размера
+    выполняются под блокировкой.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_seconds: float,
+        target_bytes: int,
+    ) -> None:
+        """
+        :param initial: Начальный размер пачки.
+        :param minimum: Размер, меньше которого пачка не уменьшается.
+        :param maximum: Размер, больше которого пачка не растёт.
+        :param target_seconds: Целевая длительность запроса _bulk.
+        :param target_bytes: Целевой объём тела запроса _bulk.
+        """
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.target_seconds = target_seconds
+        self.target_bytes = target_bytes
+        self.step = max(initial * GROWTH_RATE, 1.0)
+        self._size = float(min(max(initial, self.minimum), self.maximum))
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Текущий размер пачки."""
+        return int(self._size)
+
+    def observe(
+        self, count: int, seconds: float, size_bytes: int, rejected: bool
+    ) -> int:
+        """
+        Учитывает итоги отправленной пачки.
+
+        :param count: Число действий в пачке.
+        :param seconds: Длительность запроса.
+        :param size_bytes: Объём тела запроса.
+        :param rejected: Elasticsearch отклонил пачку или её часть
+            временной ошибкой.
+        :return: Новый размер пачки.
+        """
+        with self._lock:
+            overload = max(
+                seconds / self.target_seconds if self.target_seconds else 0,
+                size_bytes / self.target_bytes if self.target_bytes else 0,
+            )
+            if rejected:
+                self._size *= BACKOFF_FACTOR
+            elif overload > 1:
+                self._size *= max(1 / overload, BACKOFF_FACTOR)
+            elif count >= self.size:
+                # растёт только полная пачка: по неполной не видно,
+                # выдержит ли кластер больше
+                self._size += self.step
+            self._size = min(max(self._size, self.minimum), self.maximum)
+            logger.debug(
+                "Batch of %s took %.2fs, %s bytes, rejected=%s: size %s",
+                count,
+                seconds,
+                size_bytes,
+                rejected,
+                self.size,
+            )
+            return self.size
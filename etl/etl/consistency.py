@@ -0,0 +1,131 @@
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from etl.extractor import Extractor
+from etl.loader import Loader
+from etl.metrics import index_label
+
+# Корзин по умолчанию: 16**3 = 4096
+BUCKET_DEPTH = 3
+
+
+def bucket_of(doc_id: str, depth: int) -> str:
+    """Корзина документа: первые depth цифр md5 его id, как в PostgreSQL."""
+    return hashlib.md5(doc_id.encode()).hexdigest()[:depth]
+
+
+def item_checksum(doc_id: str, version: int | None) -> int:
+    """Первые 64 бита md5("id:версия"), как в Extractor.bucket_checksums."""
+    return int(
+        hashlib.md5(f"{doc_id}:{version}".encode()).hexdigest()[:16], 16
+    )
+
+
+@dataclass
+class Drift:
+    """Расхождения индекса с таблицей."""
+
+    index: str
+    buckets: int = 0
+    mismatched_buckets: int = 0
+    # есть в БД, нет в индексе
+    missing: list[str] = field(default_factory=list)
+    # есть в индексе, нет в БД
+    extra: list[str] = field(default_factory=list)
+    # версия документа отстаёт от строки или не записана
+    stale: list[str] = field(default_factory=list)
+
+    @property
+    def ids(self) -> list[str]:
+        """Все расходящиеся id: их перечитывание исправляет индекс."""
+        return self.missing + self.extra + self.stale
+
+
+class ConsistencyChecker:
+    """
+    Сверка индексов Elasticsearch с таблицами PostgreSQL.
+
+    Пространство id делится на корзины по md5 id. Для каждой корзины
+    обе стороны считают число строк и контрольную сумму пар
+    (id, etl_version): PostgreSQL - одним агрегирующим запросом, индекс -
+    одним обходом id и версий без остальных полей документов. Версии
+    документов запоминаются по корзинам на время сверки, и построчно
+    сравниваются только корзины, суммы которых разошлись.
+    """
+
+    def __init__(
+        self, extractor: Extractor, loader: Loader, depth: int = BUCKET_DEPTH
+    ) -> None:
+        """
+        :param depth: Число шестнадцатеричных цифр md5 в номере корзины.
+        """
+        self.extractor = extractor
+        self.loader = loader
+        self.depth = depth
+
+    def check(self, table: str, index_name: str) -> Drift:
+        """Находит документы index_name, расходящиеся со строками table."""
+        expected = self.extractor.bucket_checksums(table, self.depth)
+        indexed = self.collect(self.loader.iter_versions(index_name))
+        actual = {
+            bucket: self.summarize(versions)
+            for bucket, versions in indexed.items()
+        }
+        buckets = expected.keys() | actual.keys()
+        mismatched = {
+            bucket
+            for bucket in buckets
+            if expected.get(bucket) != actual.get(bucket)
+        }
+        drift = Drift(
+            index_label(index_name),
+            buckets=len(buckets),
+            mismatched_buckets=len(mismatched),
+        )
+        if not mismatched:
+            return drift
+        rows = self.extractor.fetch_bucket_versions(
+            table, self.depth, sorted(mismatched)
+        )
+        documents = {
+            doc_id: version
+            for bucket in mismatched
+            for doc_id, version in indexed.get(bucket, {}).items()
+        }
+        drift.missing = sorted(rows.keys() - documents.keys())
+        drift.extra = sorted(documents.keys() - rows.keys())
+        drift.stale = sorted(
+            doc_id
+            for doc_id in rows.keys() & documents.keys()
+            if rows[doc_id] != documents[doc_id]
+        )
+        logging.info(
+            f"Сверка '{index_name}': разошлись {len(mismatched)} из "
+            f"{len(buckets)} корзин, нет в индексе {len(drift.missing)}, "
+            f"лишних {len(drift.extra)}, устаревших {len(drift.stale)}."
+        )
+        return drift
+
+    def collect(
+        self, versions: Iterable[tuple[str, int | None]]
+    ) -> dict[str, dict[str, int | None]]:
+        """Версии документов по корзинам: корзина -> id -> версия."""
+        buckets: dict[str, dict[str, int | None]] = {}
+        for doc_id, version in versions:
+            bucket = buckets.setdefault(bucket_of(doc_id, self.depth), {})
+            bucket[doc_id] = version
+        return buckets
+
+    @staticmethod
+    def summarize(versions: dict[str, int | None]) -> tuple[int, int]:
+        """Число документов корзины и её контрольная сумма."""
+        return (
+            len(versions),
+            sum(
+                item_checksum(doc_id, version)
+                for doc_id, version in versions.items()
+            )
+            % 2**64,
+        )
@@ -1,12 +1,38 @@
+import asyncio
+import csv
+import functools
+import itertools
+import json
 import logging
+import os
+import re
+import sys
+import threading
 import uuid
 from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator
 
+import asyncpg
 import backoff
+import orjson
 import psycopg2
-from config.settings import POSTGRES_CONFIG
+from config.settings import (
+    FILM_EXTRACT_MODE,
+    PG_ITERSIZE,
+    PG_POOL_HEALTHCHECK_INTERVAL,
+    PG_POOL_MAX_LIFETIME,
+    PG_POOL_MAX_SIZE,
+    PG_POOL_MIN_SIZE,
+    PG_POOL_TIMEOUT,
+    PG_STREAMING,
+    POSTGRES_CONFIG,
+)
 from psycopg2.extras import RealDictCursor
 
+from etl.metrics import observe_extract
+from etl.pool import PostgresPool
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,10 +49,17 @@ def get_connection():
 
 
 @contextmanager
-def get_db_cursor():
-    """Context manager для автоматического управления соединением и курсором с БД."""
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+def get_db_cursor(pool: PostgresPool, name: str | None = None):
+    """Context manager для автоматического управления соединением и курсором с БД.
+
+    Соединение берётся из пула и возвращается в него после запроса;
+    сломанное соединение закрывается, чтобы пул открыл новое.
+    Если передано имя, создаётся серверный (именованный) курсор,
+    который отдаёт строки частями и не держит всю выборку в памяти.
+    """
+    conn = pool.getconn()
+    broken = False
+    cursor = conn.cursor(name=name, cursor_factory=RealDictCursor)
     try:
         yield cursor
         conn.commit()
@@ -35,119 +68,468 @@ def get_db_cursor():
             f"Database operation failed: {e}",
             exc_info=True,
         )
-        conn.rollback()
+        broken = isinstance(
+            e, (psycopg2.OperationalError, psycopg2.InterfaceError)
+        )
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
         raise
     finally:
-        cursor.close()
-        conn.close()
+        try:
+            cursor.close()
+        except psycopg2.Error:
+            broken = True
+        pool.putconn(conn, close=broken)
+
+
+# Версия документа (etl_version) - время изменения его строки
+# в микросекундах от эпохи; так же её считает проверка согласованности
+ETL_VERSION_SQL = "(extract(epoch FROM {column}) * 1000000)::bigint"
+
+FILMWORK_DOCUMENTS_QUERY = f"""
+WITH films AS (
+    SELECT id, modified, rating, title, description
+    FROM content.film_work
+    {{where}}
+),
+persons AS (
+    SELECT
+        pfw.film_work_id,
+        jsonb_agg(jsonb_build_object('id', p.id, 'name', p.full_name))
+            FILTER (WHERE pfw.role = 'director') AS directors,
+        jsonb_agg(jsonb_build_object('id', p.id, 'name', p.full_name))
+            FILTER (WHERE pfw.role = 'actor') AS actors,
+        jsonb_agg(jsonb_build_object('id', p.id, 'name', p.full_name))
+            FILTER (WHERE pfw.role = 'writer') AS writers,
+        jsonb_agg(p.full_name)
+            FILTER (WHERE pfw.role = 'director') AS directors_names,
+        jsonb_agg(p.full_name)
+            FILTER (WHERE pfw.role = 'actor') AS actors_names,
+        jsonb_agg(p.full_name)
+            FILTER (WHERE pfw.role = 'writer') AS writers_names
+    FROM content.person_film_work pfw
+    JOIN content.person p ON p.id = pfw.person_id
+    WHERE pfw.film_work_id IN (SELECT id FROM films)
+    GROUP BY pfw.film_work_id
+),
+genres AS (
+    SELECT
+        gfw.film_work_id,
+        jsonb_agg(g.name) AS names,
+        jsonb_agg(jsonb_build_object('id', g.id, 'name', g.name)) AS details
+    FROM content.genre_film_work gfw
+    JOIN content.genre g ON g.id = gfw.genre_id
+    WHERE gfw.film_work_id IN (SELECT id FROM films)
+    GROUP BY gfw.film_work_id
+)
+SELECT
+    films.id,
+    films.modified,
+    jsonb_build_object(
+        'id', films.id,
+        'imdb_rating', films.rating,
+        'title', films.title,
+        'description', films.description,
+        'genres', COALESCE(genres.names, '[]'::jsonb),
+        'genres_details', COALESCE(genres.details, '[]'::jsonb),
+        'directors', COALESCE(persons.directors, '[]'::jsonb),
+        'actors', COALESCE(persons.actors, '[]'::jsonb),
+        'writers', COALESCE(persons.writers, '[]'::jsonb),
+        'directors_names', COALESCE(persons.directors_names, '[]'::jsonb),
+        'actors_names', COALESCE(persons.actors_names, '[]'::jsonb),
+        'writers_names', COALESCE(persons.writers_names, '[]'::jsonb),
+        'etl_version', {ETL_VERSION_SQL.format(column="films.modified")}
+    ) AS document
+FROM films
+LEFT JOIN persons ON persons.film_work_id = films.id
+LEFT JOIN genres ON genres.film_work_id = films.id
+"""
+
+FILMWORK_DETAILS_QUERY = f"""
+SELECT id AS fw_id, title, description, rating, type, created, modified,
+       {ETL_VERSION_SQL.format(column="modified")} AS etl_version
+FROM content.film_work
+WHERE id = ANY(%s::uuid[]);
+"""
+
+FILMWORK_PERSONS_QUERY = """
+SELECT pfw.film_work_id, p.id AS person_id, p.full_name AS person_name, pfw.role
+FROM content.person_film_work pfw
+JOIN content.person p ON p.id = pfw.person_id
+WHERE pfw.film_work_id = ANY(%s::uuid[]);
+"""
+
+FILMWORK_GENRES_QUERY = """
+SELECT gfw.film_work_id, g.id AS genre_id, g.name AS genre_name
+FROM content.genre_film_work gfw
+JOIN content.genre g ON g.id = gfw.genre_id
+WHERE gfw.film_work_id = ANY(%s::uuid[]);
+"""
+
+PERSONS_QUERY = f"""
+SELECT p.id, p.full_name,
+       {ETL_VERSION_SQL.format(column="p.modified")} AS etl_version,
+       COALESCE(
+           json_agg(
+               DISTINCT jsonb_build_object(
+                   'id', fw.id,
+                   'title', fw.title,
+                   'imdb_rating', fw.rating,
+                   'roles', roles
+               )
+           ),
+           '[]'
+       ) as films
+FROM content.person p
+LEFT JOIN content.person_film_work pfw ON p.id = pfw.person_id
+LEFT JOIN content.film_work fw ON pfw.film_work_id = fw.id
+LEFT JOIN (
+    SELECT pfw.person_id, fw.id, fw.title, array_agg(pfw.role) as roles
+    FROM content.person_film_work pfw
+    JOIN content.film_work fw ON pfw.film_work_id = fw.id
+    GROUP BY pfw.person_id, fw.id, fw.title
+) sub ON p.id = sub.person_id and fw.id=sub.id
+WHERE {{where}}
+GROUP BY p.id, p.full_name, p.modified
+"""
 
 
 class Extractor:
+    def __init__(
+        self,
+        streaming: bool = PG_STREAMING,
+        itersize: int = PG_ITERSIZE,
+        film_extract_mode: str = FILM_EXTRACT_MODE,
+    ) -> None:
+        self.streaming = streaming
+        self.itersize = itersize
+        self.denormalized = film_extract_mode == "denormalized"
+        # (номер шарда, число шардов) или None, если шардирования нет
+        self.shard: tuple[int, int] | None = None
+        self.pool = PostgresPool(
+            POSTGRES_CONFIG,
+            min_size=PG_POOL_MIN_SIZE,
+            max_size=PG_POOL_MAX_SIZE,
+            max_lifetime=PG_POOL_MAX_LIFETIME,
+            healthcheck_interval=PG_POOL_HEALTHCHECK_INTERVAL,
+            timeout=PG_POOL_TIMEOUT,
+        )
+
+    def close(self) -> None:
+        """Закрывает соединения с БД."""
+        self.pool.closeall()
+
     def convert_to_uuid(self, ids: list[str]) -> list[str]:
         """Преобразование списка строк в список UUID."""
         return [str(uuid.UUID(id_)) for id_ in ids]
 
-    def fetch_new_filmworks(
-        self, last_modified: str, batch_size: int = 100
+    def shard_condition(self, column: str) -> str:
+        """SQL-условие принадлежности id текущему шарду (по хешу id)."""
+        if self.shard is None:
+            return "TRUE"
+        index, count = self.shard
+        return (
+            f"mod(hashtext({column}::text) & 2147483647, {int(count)})"
+            f" = {int(index)}"
+        )
+
+    @observe_extract
+    def fetch_modified_filmworks(
+        self, watermark: tuple[str, str], batch_size: int = 100
     ) -> list[dict]:
-        """Извлекает новые фильмы, добавленные после последней метки времени."""
-        query = """
+        """Извлекает фильмы, добавленные или изменённые после составной метки."""
+        query = f"""
         SELECT id, modified
         FROM content.film_work
-        WHERE created > %s
-        ORDER BY created
+        WHERE (modified, id) > (%s::timestamptz, %s::uuid)
+            AND {self.shard_condition("id")}
+        ORDER BY modified, id
         LIMIT %s;
         """
-        return self._fetch_data(query, (last_modified, batch_size))
+        return self._fetch_data(query, (*watermark, batch_size))
 
+    @observe_extract
     def fetch_modified_persons(
-        self, last_modified: str, batch_size: int = 100
+        self, watermark: tuple[str, str], batch_size: int = 100
     ) -> list[dict]:
-        """Извлекает изменённых персон после последней метки времени."""
-        query = """
+        """Извлекает изменённых персон после составной метки (modified, id)."""
+        query = f"""
         SELECT id, modified
         FROM content.person
-        WHERE modified > %s
-        ORDER BY modified
+        WHERE (modified, id) > (%s::timestamptz, %s::uuid)
+            AND {self.shard_condition("id")}
+        ORDER BY modified, id
         LIMIT %s;
         """
-        return self._fetch_data(query, (last_modified, batch_size))
+        return self._fetch_data(query, (*watermark, batch_size))
 
-    def fetch_persons_by_ids(self, person_ids: list[str]) -> list[dict]:
-        """Получает персон по списку ID, их роли и фильмы, и преобразует в нужный формат."""
+    @observe_extract
+    def fetch_persons_by_ids(
+        self, person_ids: list[str], any_shard: bool = False
+    ) -> list[dict]:
+        """Получает персон по списку ID, их роли и фильмы, и преобразует в нужный формат.
+
+        По умолчанию возвращаются только персоны текущего шарда;
+        any_shard снимает это ограничение.
+        """
         if not person_ids:
             return []
         placeholders = ", ".join(["%s"] * len(person_ids))
-        query = f"""
-        SELECT p.id, p.full_name,
-               COALESCE(
-                   json_agg(
-                       DISTINCT jsonb_build_object(
-                           'id', fw.id,
-                           'title', fw.title,
-                           'roles', roles
-                       )
-                   ),
-                   '[]'
-               ) as films
-        FROM content.person p
-        LEFT JOIN content.person_film_work pfw ON p.id = pfw.person_id
-        LEFT JOIN content.film_work fw ON pfw.film_work_id = fw.id
-        LEFT JOIN (
-            SELECT pfw.person_id, fw.id, fw.title, array_agg(pfw.role) as roles
-            FROM content.person_film_work pfw
-            JOIN content.film_work fw ON pfw.film_work_id = fw.id
-            GROUP BY pfw.person_id, fw.id, fw.title
-        ) sub ON p.id = sub.person_id and fw.id=sub.id 
-        WHERE p.id IN ({placeholders})
-        GROUP BY p.id, p.full_name;
-        """
+        shard_condition = "TRUE" if any_shard else self.shard_condition("p.id")
+        query = PERSONS_QUERY.format(
+            where=f"p.id IN ({placeholders}) AND {shard_condition}"
+        )
         return self._fetch_data(query, tuple(person_ids))
 
+    @observe_extract
+    def fetch_person_ids_by_filmworks(
+        self, filmwork_ids: list[str]
+    ) -> list[str]:
+        """Извлекает id персон, участвующих в указанных фильмах."""
+        if not filmwork_ids:
+            return []
+        query = """
+        SELECT DISTINCT person_id
+        FROM content.person_film_work
+        WHERE film_work_id = ANY(%s::uuid[]);
+        """
+        rows = self._fetch_data(query, (self.convert_to_uuid(filmwork_ids),))
+        return [str(row["person_id"]) for row in rows]
+
+    @observe_extract
     def fetch_modified_genres(
-        self, last_modified: str, batch_size: int = 100
+        self, watermark: tuple[str, str], batch_size: int = 100
     ) -> list[dict]:
-        """Извлекает изменённые жанры после последней метки времени."""
-        query = """
+        """Извлекает изменённые жанры после составной метки (modified, id)."""
+        query = f"""
         SELECT id, modified, name, description
         FROM content.genre
-        WHERE modified > %s
-        ORDER BY modified
+        WHERE (modified, id) > (%s::timestamptz, %s::uuid)
+            AND {self.shard_condition("id")}
+        ORDER BY modified, id
         LIMIT %s;
         """
-        return self._fetch_data(query, (last_modified, batch_size))
+        return self._fetch_data(query, (*watermark, batch_size))
 
-    def fetch_related_filmworks_by_person(
-        self, person_ids: list[str], batch_size: int = 100
-    ) -> list[dict]:
-        """Извлекает фильмы, связанные с указанными персоналиями."""
-        if not person_ids:
+    @observe_extract
+    def fetch_genres_by_ids(self, genre_ids: list[str]) -> list[dict]:
+        """Получает жанры по списку ID."""
+        if not genre_ids:
             return []
-        query = """
-        SELECT DISTINCT fw.id, fw.modified
-        FROM content.film_work fw
-        JOIN content.person_film_work pfw ON pfw.film_work_id = fw.id
-        WHERE pfw.person_id = ANY(%s::uuid[])
-        ORDER BY fw.modified
-        LIMIT %s;
+        query = f"""
+        SELECT id, modified, name, description,
+            {ETL_VERSION_SQL.format(column="modified")} AS etl_version
+        FROM content.genre
+        WHERE id = ANY(%s::uuid[]) AND {self.shard_condition("id")};
         """
-        return self._fetch_data(query, (self.convert_to_uuid(person_ids), batch_size))
+        return self._fetch_data(query, (self.convert_to_uuid(genre_ids),))
 
-    def fetch_related_filmworks_by_genre(
-        self, genre_ids: list[str], batch_size: int = 100
-    ) -> list[dict]:
-        """Извлекает фильмы, связанные с указанными жанрами."""
-        if not genre_ids:
-            return []
-        query = """
-        SELECT DISTINCT fw.id, fw.modified
-        FROM content.film_work fw
-        JOIN content.genre_film_work gfw ON gfw.film_work_id = fw.id
-        WHERE gfw.genre_id = ANY(%s::uuid[])
-        ORDER BY fw.modified
+    def count_modified(
+        self, table: str, watermark: tuple[str, str], limit: int
+    ) -> int:
+        """Считает строки таблицы после составной метки, но не больше limit."""
+        query = f"""
+        SELECT count(*) AS count FROM (
+            SELECT 1
+            FROM content.{table}
+            WHERE (modified, id) > (%s::timestamptz, %s::uuid)
+                AND {self.shard_condition("id")}
+            LIMIT %s
+        ) pending;
+        """
+        return self._fetch_data(query, (*watermark, limit))[0]["count"]
+
+    @observe_extract
+    def fetch_ids_after(
+        self,
+        table: str,
+        last_id: str,
+        limit: int,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> list[str]:
+        """
+        Id строк таблицы по возрастанию первичного ключа после last_id;
+        since и until ограничивают время изменения строк [since, until).
+        """
+        query = f"""
+        SELECT id
+        FROM content.{table}
+        WHERE id > %s::uuid
+            AND modified >= coalesce(%s::timestamptz, '-infinity')
+            AND modified < coalesce(%s::timestamptz, 'infinity')
+        ORDER BY id
         LIMIT %s;
         """
-        return self._fetch_data(query, (self.convert_to_uuid(genre_ids), batch_size))
+        rows = self._fetch_data(query, (last_id, since, until, limit))
+        return [str(row["id"]) for row in rows]
+
+    def count_rows(self, table: str) -> int:
+        """Считает все строки таблицы."""
+        query = f"SELECT count(*) AS count FROM content.{table};"
+        return self._fetch_data(query, ())[0]["count"]
+
+    def bucket_checksums(
+        self, table: str, depth: int
+    ) -> dict[str, tuple[int, int]]:
+        """
+        Число строк и контрольная сумма каждой корзины таблицы.
+
+        Корзина строки - первые depth шестнадцатеричных цифр md5 её id,
+        контрольная сумма - сумма по модулю 2**64 первых 64 бит
+        md5("id:версия") всех строк корзины; от порядка строк она не
+        зависит, поэтому индекс считает её так же, обходя документы.
+        """
+        version = ETL_VERSION_SQL.format(column="modified")
+        query = f"""
+        SELECT
+            substr(md5(id::text), 1, %s) AS bucket,
+            count(*) AS count,
+            sum(
+                ('x' || substr(md5(id::text || ':' || {version}), 1, 16))
+                    ::bit(64)::bigint
+            ) AS checksum
+        FROM content.{table}
+        GROUP BY 1;
+        """
+        return {
+            row["bucket"]: (row["count"], int(row["checksum"]) % 2**64)
+            for row in self._fetch_data(query, (depth,))
+        }
+
+    def fetch_bucket_versions(
+        self, table: str, depth: int, buckets: list[str]
+    ) -> dict[str, int]:
+        """Версии (etl_version) строк таблицы из указанных корзин."""
+        if not buckets:
+            return {}
+        query = f"""
+        SELECT id, {ETL_VERSION_SQL.format(column="modified")} AS version
+        FROM content.{table}
+        WHERE substr(md5(id::text), 1, %s) = ANY(%s);
+        """
+        return {
+            str(row["id"]): row["version"]
+            for row in self._fetch_data(query, (depth, buckets))
+        }
+
+    def count_outbox(self, limit: int) -> int:
+        """Считает события шарда в outbox-таблице, но не больше limit."""
+        query = f"""
+        SELECT count(*) AS count FROM (
+            SELECT 1
+            FROM content.etl_outbox
+            WHERE {self.shard_condition("entity_id")}
+            LIMIT %s
+        ) pending;
+        """
+        return self._fetch_data(query, (limit,))[0]["count"]
+
+    @contextmanager
+    def outbox_batch(self, batch_size: int = 100) -> Iterator[list[dict]]:
+        """
+        Выбирает пачку событий текущего шарда из content.etl_outbox
+        и удаляет её после успешной обработки блока with.
+
+        События делятся на шарды по хешу id объекта, как и строки таблиц:
+        все события объекта разбирает владелец его шарда. Строки
+        блокируются FOR UPDATE SKIP LOCKED до конца транзакции, поэтому
+        прежний владелец шарда, ещё не заметивший потерю аренды, не мешает
+        новому, а при ошибке события остаются в очереди.
+        """
+        query = f"""
+        SELECT id, entity_type, entity_id, operation, created
+        FROM content.etl_outbox
+        WHERE {self.shard_condition("entity_id")}
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED;
+        """
+        with get_db_cursor(self.pool) as cursor:
+            cursor.execute(query, (batch_size,))
+            events = cursor.fetchall()
+            yield events
+            if events:
+                cursor.execute(
+                    "DELETE FROM content.etl_outbox WHERE id = ANY(%s);",
+                    ([event["id"] for event in events],),
+                )
+
+    def prune_outbox(self, older_than: float, batch_size: int = 10000) -> int:
+        """
+        Удаляет события текущего шарда старше older_than секунд.
+
+        События удаляются пачками по batch_size, каждая в своей
+        транзакции, чтобы не держать блокировки долго.
+
+        :return: Количество удалённых событий.
+        """
+        query = f"""
+        DELETE FROM content.etl_outbox
+        WHERE id IN (
+            SELECT id
+            FROM content.etl_outbox
+            WHERE created < now() - %s * interval '1 second'
+                AND {self.shard_condition("entity_id")}
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        );
+        """
+        deleted = 0
+        while True:
+            with get_db_cursor(self.pool) as cursor:
+                cursor.execute(query, (older_than, batch_size))
+                count = cursor.rowcount
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+    @property
+    def movies_data_type(self) -> str:
+        """Тип данных фильмов для Transformer в текущем режиме извлечения."""
+        return "movie_documents" if self.denormalized else "movies"
+
+    @observe_extract
+    def fetch_movies(self, filmwork_ids: list[str]) -> list[dict]:
+        """Получает данные фильмов в выбранном режиме извлечения."""
+        if self.denormalized:
+            return self.fetch_filmwork_documents(filmwork_ids)
+        return self.fetch_full_filmwork_data(filmwork_ids)
+
+    def iter_movies(
+        self, filmwork_ids: list[str] | None = None
+    ) -> Iterator[dict]:
+        """Потоково отдаёт данные фильмов в выбранном режиме извлечения."""
+        if self.denormalized:
+            return self.iter_filmwork_documents(filmwork_ids)
+        return self.iter_full_filmwork_data(filmwork_ids)
+
+    def fetch_filmwork_documents(self, filmwork_ids: list[str]) -> list[dict]:
+        """Получает готовые документы фильмов, собранные PostgreSQL за один запрос."""
+        if not filmwork_ids:
+            return []
+        query = FILMWORK_DOCUMENTS_QUERY.format(
+            where="WHERE id = ANY(%s::uuid[])"
+        )
+        return self._fetch_data(query, (self.convert_to_uuid(filmwork_ids),))
+
+    def iter_filmwork_documents(
+        self, filmwork_ids: list[str] | None = None
+    ) -> Iterator[dict]:
+        """Потоково отдаёт готовые документы фильмов серверным курсором."""
+        where, params = f"WHERE {self.shard_condition('id')}", ()
+        if filmwork_ids is not None:
+            if not filmwork_ids:
+                return
+            where += " AND id = ANY(%s::uuid[])"
+            params = (self.convert_to_uuid(filmwork_ids),)
+        query = FILMWORK_DOCUMENTS_QUERY.format(where=where)
+        for documents in self._stream_chunks(query, params):
+            yield from documents
 
     def fetch_full_filmwork_data(self, filmwork_ids: list[str]) -> list[dict]:
         """Получает полные данные о фильмах, включая персоналии и жанры."""
@@ -158,34 +540,118 @@ class Extractor:
         genres = self._fetch_genre_data(filmwork_ids)
         return self._combine_data(filmworks, persons, genres)
 
-    def _fetch_filmwork_details(self, filmwork_ids: list[str]) -> list[dict]:
-        query = """
-        SELECT id AS fw_id, title, description, rating, type, created, modified
+    def iter_full_filmwork_data(
+        self, filmwork_ids: list[str] | None = None
+    ) -> Iterator[dict]:
+        """
+        Потоково отдаёт полные данные о фильмах, включая персоналии и жанры.
+
+        Фильмы читаются серверным курсором пачками по itersize строк,
+        персоналии и жанры догружаются для каждой пачки отдельно.
+        Без списка ID обходит весь каталог (в пределах текущего шарда).
+        """
+        query = f"""
+        SELECT id AS fw_id, title, description, rating, type, created,
+            modified,
+            {ETL_VERSION_SQL.format(column="modified")} AS etl_version
         FROM content.film_work
-        WHERE id = ANY(%s::uuid[]);
+        WHERE {self.shard_condition("id")}
         """
-        return self._fetch_data(query, (self.convert_to_uuid(filmwork_ids),))
+        params: tuple = ()
+        if filmwork_ids is not None:
+            if not filmwork_ids:
+                return
+            query += "AND id = ANY(%s::uuid[])"
+            params = (self.convert_to_uuid(filmwork_ids),)
+        for filmworks in self._stream_chunks(query, params):
+            ids = [fw["fw_id"] for fw in filmworks]
+            persons = self._fetch_person_data(ids)
+            genres = self._fetch_genre_data(ids)
+            yield from self._combine_data(filmworks, persons, genres)
 
-    def _fetch_person_data(self, filmwork_ids: list[str]) -> list[dict]:
-        query = """
-        SELECT pfw.film_work_id, p.id AS person_id, p.full_name AS person_name, pfw.role
-        FROM content.person_film_work pfw
-        JOIN content.person p ON p.id = pfw.person_id
-        WHERE pfw.film_work_id = ANY(%s::uuid[]);
+    def fetch_db_time(self) -> datetime:
+        """Возвращает текущее время на сервере PostgreSQL."""
+        return self._fetch_data("SELECT now() AS now;", ())[0]["now"]
+
+    def copy_filmwork_documents(self) -> Iterator[dict]:
+        """Выгружает готовые документы всех фильмов через COPY."""
+        query = FILMWORK_DOCUMENTS_QUERY.format(
+            where=f"WHERE {self.shard_condition('id')}"
+        )
+        return self.copy_records(query)
+
+    def copy_persons(self) -> Iterator[dict]:
+        """Выгружает всех персон с их фильмами через COPY."""
+        return self.copy_records(
+            PERSONS_QUERY.format(where=self.shard_condition("p.id"))
+        )
+
+    def copy_genres(self) -> Iterator[dict]:
+        """Выгружает все жанры через COPY."""
+        return self.copy_records(f"""
+            SELECT id, modified, name, description,
+                {ETL_VERSION_SQL.format(column="modified")} AS etl_version
+            FROM content.genre
+            WHERE {self.shard_condition("id")}
+            """)
+
+    def copy_records(self, query: str, params: tuple = ()) -> Iterator[dict]:
         """
-        return self._fetch_data(query, (self.convert_to_uuid(filmwork_ids),))
+        Выгружает результат запроса через COPY ... TO STDOUT.
 
-    def _fetch_genre_data(self, filmwork_ids: list[str]) -> list[dict]:
-        query = """
-        SELECT gfw.film_work_id, g.id AS genre_id, g.name AS genre_name
-        FROM content.genre_film_work gfw
-        JOIN content.genre g ON g.id = gfw.genre_id
-        WHERE gfw.film_work_id = ANY(%s::uuid[]);
+        Каждая строка упаковывается в jsonb и передаётся одним полем CSV.
+        COPY пишет данные в канал из отдельного потока, а записи
+        разбираются по мере поступления: ни курсора, ни пачек, ни всей
+        выборки в памяти.
         """
-        return self._fetch_data(query, (self.convert_to_uuid(filmwork_ids),))
+        read_fd, write_fd = os.pipe()
+        errors: list[Exception] = []
+
+        def produce() -> None:
+            try:
+                with os.fdopen(write_fd, "wb") as pipe, get_db_cursor(
+                    self.pool
+                ) as cursor:
+                    sql = cursor.mogrify(query, params).decode()
+                    cursor.copy_expert(
+                        f"COPY (SELECT to_jsonb(r) FROM ({sql}) r) "
+                        "TO STDOUT WITH (FORMAT csv)",
+                        pipe,
+                    )
+            except Exception as e:
+                errors.append(e)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            # документ фильма или персоны может быть больше лимита поля CSV
+            csv.field_size_limit(sys.maxsize)
+            with open(read_fd, encoding="utf-8", newline="") as pipe:
+                for row in csv.reader(pipe):
+                    yield json.loads(row[0])
+        finally:
+            producer.join()
+        if errors:
+            raise errors[0]
+
+    def _fetch_filmwork_details(self, filmwork_ids: list[str]) -> list[dict]:
+        return self._fetch_data(
+            FILMWORK_DETAILS_QUERY, (self.convert_to_uuid(filmwork_ids),)
+        )
 
+    def _fetch_person_data(self, filmwork_ids: list[str]) -> list[dict]:
+        return self._fetch_data(
+            FILMWORK_PERSONS_QUERY, (self.convert_to_uuid(filmwork_ids),)
+        )
+
+    def _fetch_genre_data(self, filmwork_ids: list[str]) -> list[dict]:
+        return self._fetch_data(
+            FILMWORK_GENRES_QUERY, (self.convert_to_uuid(filmwork_ids),)
+        )
+
+    @staticmethod
     def _combine_data(
-        self, filmworks: list[dict], persons: list[dict], genres: list[dict]
+        filmworks: list[dict], persons: list[dict], genres: list[dict]
     ) -> list[dict]:
         """Объединяет данные о фильмах, персоналиях и жанрах."""
         filmwork_dict = {fw["fw_id"]: fw for fw in filmworks}
@@ -210,8 +676,171 @@ class Extractor:
 
         return list(filmwork_dict.values())
 
+    @backoff.on_exception(
+        backoff.expo,
+        (psycopg2.OperationalError, psycopg2.InterfaceError),
+        max_time=60,
+        jitter=backoff.full_jitter,
+    )
     def _fetch_data(self, query: str, params: tuple) -> list[dict]:
-        """Выполняет запрос к БД и возвращает результат."""
-        with get_db_cursor() as cursor:
+        """Выполняет запрос к БД и возвращает результат.
+
+        При обрыве соединения запрос повторяется на новом соединении пула.
+        """
+        with get_db_cursor(self.pool) as cursor:
             cursor.execute(query, params)
             return cursor.fetchall()
+
+    def _stream_chunks(
+        self, query: str, params: tuple
+    ) -> Iterator[list[dict]]:
+        """Выполняет запрос серверным курсором и отдаёт результат пачками."""
+        with get_db_cursor(
+            self.pool, name=f"etl_{uuid.uuid4().hex}"
+        ) as cursor:
+            cursor.execute(query, params)
+            while rows := cursor.fetchmany(self.itersize):
+                yield rows
+
+
+def asyncpg_config(config: dict) -> dict:
+    """Параметры подключения psycopg2 в виде параметров asyncpg."""
+    # options вида "-c search_path=content -c statement_timeout=0"
+    server_settings = dict(
+        option.split("=", 1)
+        for option in re.findall(r"-c\s*(\S+=\S+)", config.get("options", ""))
+    )
+    return {
+        "database": config["dbname"],
+        "user": config["user"],
+        "password": config["password"],
+        "host": config["host"],
+        "port": config["port"],
+        "server_settings": server_settings,
+    }
+
+
+@functools.lru_cache
+def asyncpg_query(query: str) -> str:
+    """Заменяет параметры %s запроса psycopg2 нумерованными $1, $2, ..."""
+    numbers = itertools.count(1)
+    return re.sub("%s", lambda _: f"${next(numbers)}", query)
+
+
+class AsyncExtractor:
+    """
+    Чтение фильмов, персон и жанров по id через asyncpg.
+
+    Запросы те же, что у Extractor, а строки приводятся к виду, в котором
+    их отдаёт RealDictCursor (id - строки, json - объекты Python), поэтому
+    Transformer и Loader работают с ними без изменений. Фильтра по шарду
+    нет: id уже выбраны шардом. В раздельном режиме три запроса фильма
+    выполняются одновременно на разных соединениях пула.
+    """
+
+    def __init__(
+        self,
+        film_extract_mode: str = FILM_EXTRACT_MODE,
+        min_size: int = PG_POOL_MIN_SIZE,
+        max_size: int = PG_POOL_MAX_SIZE,
+        max_lifetime: int = PG_POOL_MAX_LIFETIME,
+    ) -> None:
+        self.denormalized = film_extract_mode == "denormalized"
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.pool: asyncpg.Pool | None = None
+
+    @property
+    def movies_data_type(self) -> str:
+        """Тип данных фильмов для Transformer в текущем режиме извлечения."""
+        return "movie_documents" if self.denormalized else "movies"
+
+    async def connect(self) -> None:
+        """Открывает пул соединений, если он ещё не открыт."""
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(
+                **asyncpg_config(POSTGRES_CONFIG),
+                min_size=self.min_size,
+                max_size=self.max_size,
+                max_inactive_connection_lifetime=self.max_lifetime,
+                init=self._init_connection,
+            )
+
+    async def close(self) -> None:
+        """Закрывает соединения с БД."""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    @staticmethod
+    async def _init_connection(conn: asyncpg.Connection) -> None:
+        await conn.set_type_codec(
+            "uuid",
+            schema="pg_catalog",
+            encoder=str,
+            decoder=str,
+            format="text",
+        )
+        for name in ("json", "jsonb"):
+            await conn.set_type_codec(
+                name,
+                schema="pg_catalog",
+                encoder=json.dumps,
+                decoder=orjson.loads,
+            )
+
+    @observe_extract
+    async def fetch_movies(self, filmwork_ids: list[str]) -> list[dict]:
+        """Получает данные фильмов в выбранном режиме извлечения."""
+        if not filmwork_ids:
+            return []
+        if self.denormalized:
+            return await self._fetch_data(
+                FILMWORK_DOCUMENTS_QUERY.format(
+                    where="WHERE id = ANY(%s::uuid[])"
+                ),
+                filmwork_ids,
+            )
+        filmworks, persons, genres = await asyncio.gather(
+            self._fetch_data(FILMWORK_DETAILS_QUERY, filmwork_ids),
+            self._fetch_data(FILMWORK_PERSONS_QUERY, filmwork_ids),
+            self._fetch_data(FILMWORK_GENRES_QUERY, filmwork_ids),
+        )
+        return Extractor._combine_data(filmworks, persons, genres)
+
+    @observe_extract
+    async def fetch_persons_by_ids(self, person_ids: list[str]) -> list[dict]:
+        """Получает персон с их фильмами и ролями по списку ID."""
+        if not person_ids:
+            return []
+        return await self._fetch_data(
+            PERSONS_QUERY.format(where="p.id = ANY(%s::uuid[])"), person_ids
+        )
+
+    @observe_extract
+    async def fetch_genres_by_ids(self, genre_ids: list[str]) -> list[dict]:
+        """Получает жанры по списку ID."""
+        if not genre_ids:
+            return []
+        return await self._fetch_data(
+            f"""
+            SELECT id, modified, name, description,
+                {ETL_VERSION_SQL.format(column="modified")} AS etl_version
+            FROM content.genre
+            WHERE id = ANY(%s::uuid[]);
+            """,
+            genre_ids,
+        )
+
+    @backoff.on_exception(
+        backoff.expo,
+        (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError),
+        max_time=60,
+        jitter=backoff.full_jitter,
+    )
+    async def _fetch_data(self, query: str, *params) -> list[dict]:
+        """Выполняет запрос к БД и возвращает строки словарями."""
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(asyncpg_query(query), *params)
+        return [dict(row) for row in rows]
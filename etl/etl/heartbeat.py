@@ -0,0 +1,59 @@
+import logging
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Heartbeat:
+    """Продлевает аренду в фоновом потоке, пока идёт долгая работа."""
+
+    def __init__(self, renew: Callable[[], bool], interval: float) -> None:
+        """
+        :param renew: Продлевает аренду; False, если аренда потеряна.
+        :param interval: Интервал между продлениями в секундах.
+        """
+        self.renew = renew
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._lost = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def lost(self) -> bool:
+        """Аренду продлить не удалось, и она могла перейти другому."""
+        return self._lost.is_set()
+
+    def start(self) -> None:
+        """Запускает продление аренды."""
+        self.stop()
+        self._stopped.clear()
+        self._lost.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает продление аренды."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                renewed = self.renew()
+            except Exception as e:
+                logger.error("Lease heartbeat failed: %s", e)
+                renewed = False
+            if not renewed:
+                logger.warning("Lease lost, heartbeat stopped")
+                self._lost.set()
+                return
+
+    def __enter__(self) -> "Heartbeat":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
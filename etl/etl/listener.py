@@ -0,0 +1,64 @@
+import logging
+import select
+import time
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, connection
+
+from etl.extractor import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeListener:
+    """Ожидает уведомлений PostgreSQL (LISTEN/NOTIFY) об изменениях данных."""
+
+    def __init__(self, channel: str) -> None:
+        """
+        :param channel: Канал, в который триггеры отправляют NOTIFY.
+        """
+        self.channel = channel
+        self.conn: connection | None = None
+
+    def listen(self) -> None:
+        """Открывает отдельное соединение и подписывается на канал."""
+        self.close()
+        self.conn = get_connection()
+        self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel};")
+        logger.info("Listening for changes on channel '%s'", self.channel)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Блокируется до прихода уведомления, но не дольше timeout секунд.
+
+        Уведомления, пришедшие пока ETL обрабатывал данные, копятся
+        в соединении, поэтому в этом случае ожидание завершается сразу.
+
+        :return: True, если были уведомления, False при таймауте.
+        """
+        try:
+            if self.conn is None or self.conn.closed:
+                self.listen()
+            self.conn.poll()
+            if not self.conn.notifies:
+                ready, _, _ = select.select([self.conn], [], [], timeout)
+                if not ready:
+                    return False
+                self.conn.poll()
+            tables = {notify.payload for notify in self.conn.notifies}
+            self.conn.notifies.clear()
+            logger.debug("Changes notified for tables: %s", tables)
+            return bool(tables)
+        except (psycopg2.Error, OSError) as e:
+            logger.error("LISTEN connection failed: %s", e)
+            self.close()
+            time.sleep(timeout)
+            return False
+
+    def close(self) -> None:
+        """Закрывает соединение подписки."""
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
+        self.conn = None
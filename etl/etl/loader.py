@@ -1,9 +1,145 @@
+import asyncio
+import hashlib
+import json
 import logging
-from typing import Any
+import random
+import re
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator
 
-import backoff
-from config.settings import MAX_BACKOFF, MAX_RETRIES
-from elasticsearch import Elasticsearch, helpers
+import orjson
+from config.settings import (
+    ADAPTIVE_BATCHING,
+    BASE_BACKOFF,
+    BATCH_SIZE_MAX,
+    BATCH_SIZE_MIN,
+    BULK_TARGET_BYTES,
+    BULK_TARGET_SECONDS,
+    ES_BULK_CHUNK_SIZE,
+    ES_BULK_MAX_CHUNK_BYTES,
+    ES_BULK_WORKERS,
+    FORCEMERGE_TIMEOUT,
+    MAX_BACKOFF,
+    MAX_RETRIES,
+    UPDATE_BY_QUERY_TIMEOUT,
+)
+from elasticsearch import ApiError, AsyncElasticsearch, Elasticsearch, helpers
+from storage.redis_state import RedisStateManager
+
+from etl import metrics
+from etl.batching import AdaptiveBatchSize
+from etl.metrics import index_label
+
+# Статусы, с которыми документ стоит отправить повторно
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+# Статусы документа, который не загрузится и при повторе; 413 говорит
+# о размере запроса, а не о документе
+DEAD_LETTER_STATUSES = set(range(400, 500)) - RETRYABLE_STATUSES - {413}
+
+# Хеш Redis с недоставленными документами: "индекс:id" -> письмо в JSON
+DEAD_LETTERS_KEY = "etl_dead_letters"
+
+# Переименовывает персон params.names (id -> имя) во вложенных списках
+# фильма и пересобирает списки имён *_names; документ, в котором все
+# имена уже совпадают, не перезаписывается
+RENAME_PERSONS_SCRIPT = """
+boolean changed = false;
+for (String role : ['actors', 'directors', 'writers']) {
+    List people = ctx._source[role];
+    if (people == null) {
+        continue;
+    }
+    List names = new ArrayList();
+    for (def person : people) {
+        if (params.names.containsKey(person.id)
+                && person.name != params.names[person.id]) {
+            person.name = params.names[person.id];
+            changed = true;
+        }
+        names.add(person.name);
+    }
+    ctx._source[role + '_names'] = names;
+}
+if (!changed) {
+    ctx.op = 'noop';
+}
+"""
+
+# Переименовывает жанры params.names (id -> имя) в genres_details
+# и пересобирает список названий genres; документ, в котором все
+# названия уже совпадают, не перезаписывается
+RENAME_GENRES_SCRIPT = """
+boolean changed = false;
+List genres = ctx._source.genres_details;
+if (genres != null) {
+    List names = new ArrayList();
+    for (def genre : genres) {
+        if (params.names.containsKey(genre.id)
+                && genre.name != params.names[genre.id]) {
+            genre.name = params.names[genre.id];
+            changed = true;
+        }
+        names.add(genre.name);
+    }
+    ctx._source.genres = names;
+}
+if (!changed) {
+    ctx.op = 'noop';
+}
+"""
+
+
+def fingerprint(record: dict[str, Any]) -> bytes:
+    """
+    Отпечаток документа, не зависящий от порядка ключей и элементов
+    списков: без ORDER BY PostgreSQL может отдавать персон и жанры
+    фильма в разном порядке, а документ от этого не меняется.
+    """
+    return hashlib.blake2b(
+        _canonical_json(record).encode(), digest_size=16
+    ).digest()
+
+
+def _canonical_json(value: Any) -> str:
+    if isinstance(value, dict):
+        items = sorted((str(key), item) for key, item in value.items())
+        return "{%s}" % ",".join(
+            f"{json.dumps(key)}:{_canonical_json(item)}" for key, item in items
+        )
+    if isinstance(value, (list, tuple)):
+        return "[%s]" % ",".join(sorted(_canonical_json(v) for v in value))
+    if isinstance(value, float) and value.is_integer():
+        # jsonb отдаёт рейтинг 7, а драйвер из столбца float - 7.0
+        value = int(value)
+    return json.dumps(value, default=str)
+
+
+def encode(value: Any) -> bytes:
+    """
+    Сериализует документ в JSON через orjson.
+
+    UUID и даты из RealDictCursor кодируются без обращения к Python,
+    Decimal приводится к float, как это делает сериализатор клиента.
+    """
+    return orjson.dumps(value, default=_encode_default)
+
+
+def _encode_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def versioned_index_name(index_name: str, version: int) -> str:
+    """Имя физического индекса версии version за псевдонимом index_name."""
+    return f"{index_name}_v{version}"
 
 
 class EsLoaderBulkError(Exception):
@@ -13,14 +149,78 @@ class EsLoaderBulkError(Exception):
 
 
 class EsLoaderDocumentError(Exception):
-    """Ошибка при использовании helpers.bulk."""
+    """Ошибка при загрузке документов запросом _bulk."""
 
     pass
 
 
+@dataclass
+class BulkStats:
+    """Итоги одного вызова загрузки."""
+
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    dead_lettered: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.succeeded / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / 2**20 / self.seconds if self.seconds else 0.0
+
+
 class Loader:
-    def __init__(self, es: Elasticsearch):
+    def __init__(
+        self,
+        es: Elasticsearch,
+        workers: int = ES_BULK_WORKERS,
+        chunk_size: int = ES_BULK_CHUNK_SIZE,
+        max_chunk_bytes: int = ES_BULK_MAX_CHUNK_BYTES,
+        fingerprints: RedisStateManager | None = None,
+        dead_letters: RedisStateManager | None = None,
+        adaptive: bool = ADAPTIVE_BATCHING,
+    ):
+        """
+        :param fingerprints: Хранилище отпечатков записанных документов;
+            без него документы отправляются всегда.
+        :param dead_letters: Хранилище документов, отклонённых навсегда;
+            без него такие документы поднимают EsLoaderDocumentError.
+        :param adaptive: Подбирать размер пачек каждого индекса по итогам
+            запросов, начиная с chunk_size.
+        """
         self.es = es
+        self.fingerprints = fingerprints
+        self.dead_letters = dead_letters
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_chunk_bytes = max_chunk_bytes
+        self.adaptive = adaptive
+        self.batch_sizes: dict[str, AdaptiveBatchSize] = {}
+
+    def batch_size(self, index_name: str) -> int:
+        """
+        Текущий размер пачки _bulk индекса; версии индекса делят общий.
+        """
+        if not self.adaptive:
+            return self.chunk_size
+        return self._batch_size(index_name).size
+
+    def _batch_size(self, index_name: str) -> AdaptiveBatchSize:
+        label = index_label(index_name)
+        if label not in self.batch_sizes:
+            self.batch_sizes[label] = AdaptiveBatchSize(
+                self.chunk_size,
+                BATCH_SIZE_MIN,
+                BATCH_SIZE_MAX,
+                BULK_TARGET_SECONDS,
+                min(BULK_TARGET_BYTES, self.max_chunk_bytes),
+            )
+        return self.batch_sizes[label]
 
     def create_index(self, index_name: str, schema: dict[str, Any]) -> None:
         """Создает индекс в Elasticsearch, если он не существует."""
@@ -38,35 +238,710 @@ class Loader:
                 exc_info=True,
             )
 
-    @backoff.on_exception(
-        backoff.expo,
-        (EsLoaderBulkError, EsLoaderDocumentError),
-        max_time=MAX_BACKOFF,
-        max_tries=MAX_RETRIES,
-        jitter=backoff.random_jitter,
-    )
-    def load_data(self, index_name: str, data: list[dict[str, Any]]) -> None:
-        """Загружает данные в указанный индекс Elasticsearch."""
-        actions = []
+    def update_mapping(self, index_name: str, schema: dict[str, Any]) -> None:
+        """
+        Добавляет в существующий индекс новые поля схемы.
+
+        Уже существующие поля Elasticsearch принимает без изменений;
+        сменить тип поля так нельзя - для этого нужна пересборка.
+        """
+        self.es.indices.put_mapping(
+            index=index_name, properties=schema["mappings"]["properties"]
+        )
+
+    def load_data(
+        self,
+        index_name: str,
+        data: Iterable[dict[str, Any]],
+        fingerprint_key: str | None = None,
+    ) -> BulkStats:
+        """
+        Загружает данные в указанный индекс Elasticsearch.
+
+        Данные могут быть потоком: документы уходят пачками по batch_size
+        штук и не больше max_chunk_bytes байт, в workers потоков.
+        Повторно отправляются только документы, отклонённые с временной
+        ошибкой (429, 5xx); остальные ошибки собираются и после обхода
+        поднимаются одним EsLoaderDocumentError.
+
+        Если передан fingerprint_key, документы, побайтно совпадающие
+        с уже записанными, не отправляются: их отпечатки хранятся в Redis
+        и обновляются только после подтверждения записи.
+        """
+        stats = BulkStats()
+        with self._track_fingerprints(fingerprint_key, data, stats) as (
+            records,
+            confirm,
+        ):
+            self._send(
+                index_name,
+                self._generate_actions(index_name, records, stats),
+                stats,
+                "index",
+                on_success=confirm,
+            )
+        self._log_loaded(index_name, stats)
+        return stats
+
+    def delete_data(
+        self,
+        index_name: str,
+        ids: Iterable[str],
+        fingerprint_key: str | None = None,
+    ) -> BulkStats:
+        """Удаляет документы из индекса; отсутствующие документы не ошибка."""
+        stats = BulkStats()
+        ids = [str(id_) for id_ in ids]
+        try:
+            self._send(
+                index_name,
+                self._delete_actions(index_name, ids),
+                stats,
+                "delete",
+                ignore_statuses={404},
+            )
+        finally:
+            self._forget_fingerprints(fingerprint_key, ids)
+        logging.info(
+            f"Удалено {stats.succeeded} документов из '{index_name}'."
+        )
+        return stats
+
+    def get_documents(
+        self, index_name: str, ids: Iterable[str]
+    ) -> dict[str, dict[str, Any]]:
+        """Возвращает найденные в индексе документы: id -> документ."""
+        ids = [str(id_) for id_ in ids]
+        if not ids:
+            return {}
+        response = self.es.mget(index=index_name, ids=ids)
+        return {
+            doc["_id"]: doc["_source"]
+            for doc in response["docs"]
+            if doc.get("found")
+        }
+
+    def iter_versions(
+        self, index_name: str
+    ) -> Iterator[tuple[str, int | None]]:
+        """
+        Обходит все документы индекса: id и версия (etl_version).
+
+        Из документов читается только версия, поэтому обход миллионов
+        документов дёшев; у документов, записанных до появления версий,
+        она None.
+        """
+        for hit in helpers.scan(
+            self.es,
+            index=index_name,
+            query={"query": {"match_all": {}}, "_source": ["etl_version"]},
+            size=5000,
+        ):
+            yield hit["_id"], hit.get("_source", {}).get("etl_version")
+
+    def find_persons_by_films(
+        self, index_name: str, filmwork_ids: Iterable[str]
+    ) -> set[str]:
+        """Возвращает id документов персон, в которых упомянуты фильмы."""
+        filmwork_ids = [str(id_) for id_ in filmwork_ids]
+        if not filmwork_ids:
+            return set()
+        query = {
+            "nested": {
+                "path": "films",
+                "query": {"terms": {"films.id": filmwork_ids}},
+            }
+        }
+        return {
+            hit["_id"]
+            for hit in helpers.scan(
+                self.es,
+                index=index_name,
+                query={"query": query, "_source": False},
+            )
+        }
+
+    def rename_persons(self, index_name: str, names: dict[str, str]) -> int:
+        """
+        Переименовывает персон прямо в документах фильмов.
+
+        Фильмы, где имена персон уже актуальны, не перезаписываются.
+
+        :param names: id персоны -> новое имя.
+        :return: Количество обновлённых фильмов.
+        """
+        query = {
+            "bool": {
+                "should": [
+                    {
+                        "nested": {
+                            "path": role,
+                            "query": {"terms": {f"{role}.id": list(names)}},
+                        }
+                    }
+                    for role in ("actors", "directors", "writers")
+                ]
+            }
+        }
+        return self._update_by_query(
+            index_name, query, RENAME_PERSONS_SCRIPT, {"names": names}
+        )
+
+    def rename_genres(self, index_name: str, names: dict[str, str]) -> int:
+        """
+        Переименовывает жанры прямо в документах фильмов.
+
+        Фильмы, где названия жанров уже актуальны, не перезаписываются.
+
+        :param names: id жанра -> новое название.
+        :return: Количество обновлённых фильмов.
+        """
+        query = {
+            "nested": {
+                "path": "genres_details",
+                "query": {"terms": {"genres_details.id": list(names)}},
+            }
+        }
+        return self._update_by_query(
+            index_name, query, RENAME_GENRES_SCRIPT, {"names": names}
+        )
+
+    def _update_by_query(
+        self,
+        index_name: str,
+        query: dict[str, Any],
+        script: str,
+        params: dict[str, Any],
+    ) -> int:
+        """
+        Выполняет скрипт над документами запроса параллельными срезами.
+
+        Конфликты версий пропускаются: такой документ одновременно
+        перезаписан целиком, уже с актуальными данными из БД.
+        """
+        response = self.es.options(
+            request_timeout=UPDATE_BY_QUERY_TIMEOUT
+        ).update_by_query(
+            index=index_name,
+            query=query,
+            script={"source": script, "lang": "painless", "params": params},
+            slices="auto",
+            conflicts="proceed",
+            wait_for_completion=True,
+        )
+        if response.get("failures"):
+            raise EsLoaderBulkError(
+                f"Ошибки update_by_query в '{index_name}': "
+                f"{response['failures'][:3]}"
+            )
+        logging.info(
+            f"В '{index_name}' на месте обновлено "
+            f"{response.get('updated', 0)} документов."
+        )
+        return response.get("updated", 0)
+
+    @contextmanager
+    def _track_fingerprints(
+        self,
+        fingerprint_key: str | None,
+        data: Iterable[dict[str, Any]],
+        stats: BulkStats,
+    ) -> Iterator[
+        tuple[
+            Iterable[dict[str, Any]],
+            Callable[[dict[str, Any]], None] | None,
+        ]
+    ]:
+        """
+        Отдаёт документы для отправки и функцию подтверждения записи.
+
+        Без fingerprint_key документы идут как есть. Иначе совпадающие
+        с записанными отбрасываются, а отпечатки подтверждённых
+        сохраняются пачками и при выходе из блока with.
+        """
+        if fingerprint_key is None or self.fingerprints is None:
+            yield data, None
+            return
+        pending: dict[str, bytes] = {}
+        confirmed: dict[str, bytes] = {}
+
+        def confirm(action: dict[str, Any]) -> None:
+            doc_id = str(action["_id"])
+            if doc_id in pending:
+                confirmed[doc_id] = pending.pop(doc_id)
+            if len(confirmed) >= self.chunk_size:
+                self.fingerprints.set_fingerprints(fingerprint_key, confirmed)
+                confirmed.clear()
+
+        try:
+            yield self._skip_unchanged(
+                fingerprint_key, data, stats, pending
+            ), confirm
+        finally:
+            self.fingerprints.set_fingerprints(fingerprint_key, confirmed)
+
+    def _forget_fingerprints(
+        self, fingerprint_key: str | None, ids: list[str]
+    ) -> None:
+        if fingerprint_key is not None and self.fingerprints is not None:
+            self.fingerprints.delete_fingerprints(fingerprint_key, ids)
+
+    @staticmethod
+    def _delete_actions(
+        index_name: str, ids: list[str]
+    ) -> Iterator[dict[str, Any]]:
+        for id_ in ids:
+            yield {"_op_type": "delete", "_index": index_name, "_id": id_}
+
+    @staticmethod
+    def _log_loaded(index_name: str, stats: BulkStats) -> None:
+        logging.info(
+            f"Успешно индексировано {stats.succeeded} документов в "
+            f"'{index_name}': {stats.docs_per_second:.0f} док/с, "
+            f"{stats.mb_per_second:.2f} МБ/с, "
+            f"без изменений пропущено {stats.skipped}, "
+            f"отложено {stats.dead_lettered}."
+        )
+
+    def _skip_unchanged(
+        self,
+        fingerprint_key: str,
+        data: Iterable[dict[str, Any]],
+        stats: BulkStats,
+        pending: dict[str, bytes],
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Отбрасывает документы, отпечаток которых совпадает с записанным.
+
+        Отпечатки сверяются пачками по chunk_size одним HMGET; отпечатки
+        отправленных документов ждут подтверждения в pending.
+        """
+        data = iter(data)
+        while chunk := list(islice(data, self.chunk_size)):
+            stored = self.fingerprints.get_fingerprints(
+                fingerprint_key, [str(record["id"]) for record in chunk]
+            )
+            for record, old in zip(chunk, stored):
+                digest = fingerprint(record)
+                if digest == old:
+                    stats.skipped += 1
+                    continue
+                pending[str(record["id"])] = digest
+                yield record
+
+    def _send(
+        self,
+        index_name: str,
+        actions: Iterable[dict[str, Any]],
+        stats: BulkStats,
+        operation: str,
+        ignore_statuses: set[int] | None = None,
+        on_success: Callable[[dict[str, Any]], None] | None = None,
+    ) -> None:
+        """
+        Отправляет действия, повторяя только временно отклонённые.
+
+        Итоги отправки учитываются в метриках индекса под видом operation.
+        """
+        started = time.perf_counter()
+        errors: list[tuple[dict[str, Any], dict[str, Any]]] = []
+        for attempt in range(1, MAX_RETRIES + 1):
+            retry: list[dict[str, Any]] = []
+            self._sort_results(
+                self._bulk(actions),
+                stats,
+                retry,
+                errors,
+                ignore_statuses,
+                on_success,
+            )
+            delay = self._retry_delay(index_name, attempt, retry, errors)
+            if delay is None:
+                break
+            time.sleep(delay)
+            actions = retry
+        self._record(index_name, stats, operation, errors, started)
+
+    @staticmethod
+    def _sort_results(
+        results: Iterable[tuple[bool, dict[str, Any], dict[str, Any]]],
+        stats: BulkStats,
+        retry: list[dict[str, Any]],
+        errors: list[tuple[dict[str, Any], dict[str, Any]]],
+        ignore_statuses: set[int] | None = None,
+        on_success: Callable[[dict[str, Any]], None] | None = None,
+    ) -> None:
+        """
+        Раскладывает ответы на успешные, повторяемые и ошибки;
+        ошибка сохраняется вместе с действием.
+        """
+        ignore_statuses = ignore_statuses or set()
+        for ok, item, action in results:
+            _, info = next(iter(item.items()))
+            if ok or info.get("status") in ignore_statuses:
+                stats.succeeded += 1
+                if on_success is not None:
+                    on_success(action)
+            elif info.get("status") in RETRYABLE_STATUSES:
+                retry.append(action)
+            else:
+                errors.append((info, action))
+
+    @staticmethod
+    def _retry_delay(
+        index_name: str,
+        attempt: int,
+        retry: list[dict[str, Any]],
+        errors: list[tuple[dict[str, Any], dict[str, Any]]],
+    ) -> float | None:
+        """
+        Пауза перед повтором временно отклонённых действий.
+
+        :return: None, если повторять нечего или попытки исчерпаны:
+            тогда оставшиеся действия переносятся в errors.
+        """
+        if not retry:
+            return None
+        if attempt == MAX_RETRIES:
+            errors.extend(
+                ({"_id": action["_id"], "error": "retries exhausted"}, action)
+                for action in retry
+            )
+            return None
+        delay = random.uniform(
+            0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (attempt - 1))
+        )
+        logging.warning(
+            f"Повторная отправка {len(retry)} документов в "
+            f"'{index_name}' через {delay:.1f} с."
+        )
+        return delay
+
+    def _record(
+        self,
+        index_name: str,
+        stats: BulkStats,
+        operation: str,
+        errors: list[tuple[dict[str, Any], dict[str, Any]]],
+        started: float,
+    ) -> None:
+        """
+        Подводит итоги отправки в метриках и поднимает ошибки, которые
+        не удалось отложить в очередь недоставленных.
+        """
+        errors = self._dead_letter(index_name, errors, stats)
+        stats.failed = len(errors)
+        stats.seconds = time.perf_counter() - started
+        label = index_label(index_name)
+        metrics.BULK_SECONDS.labels(label, operation).observe(stats.seconds)
+        metrics.DOCUMENTS.labels(label, operation).inc(stats.succeeded)
+        metrics.DOCUMENTS.labels(label, "failed").inc(stats.failed)
+        metrics.DOCUMENTS.labels(label, "skipped").inc(stats.skipped)
+        metrics.DOCUMENTS.labels(label, "dead_lettered").inc(
+            stats.dead_lettered
+        )
+        if errors:
+            for error, _ in errors:
+                logging.error(error)
+            raise EsLoaderDocumentError(
+                f"Не удалось обработать {len(errors)} документов "
+                f"в '{index_name}'."
+            )
+
+    def _dead_letter(
+        self,
+        index_name: str,
+        errors: list[tuple[dict[str, Any], dict[str, Any]]],
+        stats: BulkStats,
+    ) -> list[tuple[dict[str, Any], dict[str, Any]]]:
+        """
+        Откладывает документы, отклонённые навсегда, в очередь недоставленных.
+
+        Такой документ не загрузится и при повторе, а пока его ошибка
+        поднимается, метки не сдвигаются и вся пачка повторяется снова
+        и снова. Временные ошибки, исчерпавшие попытки, не откладываются:
+        их пачку стоит повторить.
+
+        :return: Ошибки, которые не отложены.
+        """
+        if self.dead_letters is None:
+            return errors
+        label = index_label(index_name)
+        failed_at = datetime.now(timezone.utc).isoformat()
+        letters: dict[str, str] = {}
+        remaining = []
+        for info, action in errors:
+            if (
+                info.get("status") not in DEAD_LETTER_STATUSES
+                or "_source" not in action
+            ):
+                remaining.append((info, action))
+                continue
+            letters[f"{label}:{action['_id']}"] = json.dumps(
+                {
+                    "index": label,
+                    "target": index_name,
+                    "id": str(action["_id"]),
+                    "status": info.get("status"),
+                    "error": info.get("error"),
+                    "document": json.loads(action["_source"]),
+                    "failed_at": failed_at,
+                },
+                ensure_ascii=False,
+            )
+        if not letters:
+            return errors
+        if not self.dead_letters.add_dead_letters(DEAD_LETTERS_KEY, letters):
+            return errors
+        stats.dead_lettered += len(letters)
+        metrics.DEAD_LETTERS.set(
+            self.dead_letters.count_dead_letters(DEAD_LETTERS_KEY)
+        )
+        logging.warning(
+            f"{len(letters)} документов, отклонённых '{index_name}', "
+            "отложены в очередь недоставленных."
+        )
+        return remaining
+
+    def _bulk(
+        self, actions: Iterable[dict[str, Any]]
+    ) -> Iterator[tuple[bool, dict[str, Any], dict[str, Any]]]:
+        """
+        Отправляет действия готовыми телами NDJSON, в workers потоков.
+
+        Ответы возвращаются в порядке отправки, к каждому прикладывается
+        исходное действие для повтора. Пока ждётся ответ на самую старую
+        пачку, в полёте не больше workers пачек.
+        """
+        chunks = self._chunk_actions(actions)
+        if self.workers == 1:
+            for chunk, body in chunks:
+                yield from self._bulk_chunk(chunk, body)
+            return
+        with ThreadPoolExecutor(self.workers) as pool:
+            in_flight: deque[Future] = deque()
+            for chunk, body in chunks:
+                in_flight.append(pool.submit(self._bulk_chunk, chunk, body))
+                if len(in_flight) >= self.workers:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+
+    def _chunk_actions(
+        self, actions: Iterable[dict[str, Any]]
+    ) -> Iterator[tuple[list[dict[str, Any]], bytes]]:
+        """
+        Режет действия на пачки по batch_size штук и max_chunk_bytes байт.
+
+        Тело запроса склеивается из уже сериализованных документов:
+        ни действия, ни документы повторно не копируются и не кодируются.
+        Размер каждой следующей пачки учитывает итоги уже отправленных.
+        """
+        chunk: list[dict[str, Any]] = []
+        body = bytearray()
+        limit = self.chunk_size
+        for action in actions:
+            operation = action.get("_op_type", "index")
+            lines = encode(
+                {
+                    operation: {
+                        "_index": action["_index"],
+                        "_id": action["_id"],
+                    }
+                }
+            )
+            lines += b"\n"
+            if "_source" in action:
+                lines += action["_source"] + b"\n"
+            if chunk and (
+                len(chunk) >= limit
+                or len(body) + len(lines) > self.max_chunk_bytes
+            ):
+                yield chunk, bytes(body)
+                chunk, body = [], bytearray()
+            if not chunk:
+                limit = self.batch_size(action["_index"])
+            chunk.append(action)
+            body += lines
+        if chunk:
+            yield chunk, bytes(body)
+
+    def _bulk_chunk(
+        self, chunk: list[dict[str, Any]], body: bytes
+    ) -> list[tuple[bool, dict[str, Any], dict[str, Any]]]:
+        """
+        Отправляет одну пачку запросом _bulk.
+
+        Если Elasticsearch отклонил весь запрос, ошибка с его статусом
+        приписывается каждому действию пачки: при 429 и 5xx пачка уйдёт
+        повторно вместе с остальными временно отклонёнными.
+        """
+        started = time.perf_counter()
+        try:
+            response = self.es.bulk(operations=body)
+        except ApiError as e:
+            results = self._chunk_failed(chunk, e)
+        else:
+            results = self._chunk_results(chunk, response)
+        self._observe_chunk(
+            chunk, body, time.perf_counter() - started, results
+        )
+        return results
+
+    def _observe_chunk(
+        self,
+        chunk: list[dict[str, Any]],
+        body: bytes,
+        seconds: float,
+        results: list[tuple[bool, dict[str, Any], dict[str, Any]]],
+    ) -> None:
+        """
+        Подстраивает размер пачек индекса по итогам отправленной пачки.
+
+        Временно отклонённое действие (429, 5xx) значит, что кластер
+        перегружен, и пачки уменьшаются вдвое.
+        """
+        if not self.adaptive or not chunk:
+            return
+        rejected = any(
+            not ok
+            and next(iter(item.values())).get("status") in RETRYABLE_STATUSES
+            for ok, item, _ in results
+        )
+        index_name = chunk[0]["_index"]
+        size = self._batch_size(index_name).observe(
+            len(chunk), seconds, len(body), rejected
+        )
+        metrics.BULK_BATCH_SIZE.labels(index_label(index_name)).set(size)
+
+    @staticmethod
+    def _chunk_results(
+        chunk: list[dict[str, Any]], response: Any
+    ) -> list[tuple[bool, dict[str, Any], dict[str, Any]]]:
+        """Сопоставляет ответы _bulk действиям пачки."""
+        results = []
+        for item, action in zip(response["items"], chunk):
+            _, info = next(iter(item.items()))
+            ok = 200 <= info.get("status", 500) < 300
+            results.append((ok, item, action))
+        return results
+
+    @staticmethod
+    def _chunk_failed(
+        chunk: list[dict[str, Any]], error: ApiError
+    ) -> list[tuple[bool, dict[str, Any], dict[str, Any]]]:
+        """Приписывает ошибку отклонённого запроса каждому действию пачки."""
+        return [
+            (
+                False,
+                {
+                    action.get("_op_type", "index"): {
+                        "_index": action["_index"],
+                        "_id": action["_id"],
+                        "status": error.status_code,
+                        "error": str(error),
+                    }
+                },
+                action,
+            )
+            for action in chunk
+        ]
+
+    def _generate_actions(
+        self,
+        index_name: str,
+        data: Iterable[dict[str, Any]],
+        stats: BulkStats,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Формирует bulk-действия для записей по мере их поступления.
+
+        Документ сериализуется здесь один раз: так известен его размер,
+        а в тело запроса попадают уже готовые байты.
+        """
         for record in data:
-            action = {
+            source = encode(record)
+            stats.bytes += len(source)
+            yield {
                 "_index": index_name,
                 "_id": record["id"],
-                "_source": record,
+                "_source": source,
             }
-            actions.append(action)
-
-        if actions:
-            try:
-                success, _ = helpers.bulk(self.es, actions)
-                logging.info(f"Успешно индексировано {success} документов.")
-            except Exception as e:
-                logging.error(
-                    f"Не удалось индексировать документы: {e}", exc_info=True
+
+    @contextmanager
+    def bulk_load_settings(self, index_name: str) -> Iterator[None]:
+        """
+        Настраивает индекс на массовую загрузку на время блока with.
+
+        Обновление (refresh) и реплики отключаются, после загрузки прежние
+        значения возвращаются, а сегменты индекса сливаются в один.
+        """
+        settings = self.es.indices.get_settings(
+            index=index_name, include_defaults=True, flat_settings=True
+        )
+        restore = {}
+        for name in ("index.refresh_interval", "index.number_of_replicas"):
+            for index_settings in settings.values():
+                value = index_settings["settings"].get(
+                    name, index_settings.get("defaults", {}).get(name)
+                )
+                restore[name] = value
+        self.es.indices.put_settings(
+            index=index_name,
+            settings={
+                "index.refresh_interval": "-1",
+                "index.number_of_replicas": 0,
+            },
+        )
+        logging.info(f"Индекс '{index_name}' переведён в режим загрузки.")
+        try:
+            yield
+        finally:
+            self.es.indices.put_settings(index=index_name, settings=restore)
+            logging.info(
+                f"Настройки индекса '{index_name}' восстановлены: {restore}."
+            )
+        self.es.indices.refresh(index=index_name)
+        self.es.options(request_timeout=FORCEMERGE_TIMEOUT).indices.forcemerge(
+            index=index_name, max_num_segments=1
+        )
+        logging.info(f"Сегменты индекса '{index_name}' слиты.")
+
+    def alias_exists(self, alias: str) -> bool:
+        """Проверяет, что имя является псевдонимом, а не индексом."""
+        return bool(self.es.indices.exists_alias(name=alias))
+
+    def get_index_versions(self, alias: str) -> dict[int, str]:
+        """Возвращает физические индексы-версии псевдонима: номер -> имя."""
+        pattern = re.compile(rf"^{re.escape(alias)}_v(\d+)$")
+        indices = self.es.indices.get(index=f"{alias}_v*")
+        return {
+            int(match.group(1)): name
+            for name in indices
+            if (match := pattern.match(name))
+        }
+
+    def swap_aliases(self, targets: dict[str, str]) -> None:
+        """
+        Атомарно переключает псевдонимы на новые индексы.
+
+        Индекс старого формата, занимающий имя псевдонима, удаляется
+        в том же запросе, иначе псевдоним с таким именем не создать.
+
+        :param targets: Псевдоним -> физический индекс.
+        """
+        actions: list[dict[str, Any]] = []
+        for alias, index_name in targets.items():
+            if self.alias_exists(alias):
+                actions.extend(
+                    {"remove": {"index": current, "alias": alias}}
+                    for current in self.es.indices.get_alias(name=alias)
                 )
-                for error in e.errors:
-                    logging.error(error, exc_info=True)
-                raise EsLoaderBulkError(e)
+            elif self.index_exists(alias):
+                actions.append({"remove_index": {"index": alias}})
+            actions.append({"add": {"index": index_name, "alias": alias}})
+        self.es.indices.update_aliases(actions=actions)
+        logging.info(f"Псевдонимы переключены: {targets}.")
 
     def index_exists(self, index_name: str) -> bool:
         """Проверяет существование индекса в Elasticsearch."""
@@ -90,3 +965,101 @@ class Loader:
                 exc_info=True,
             )
             return False
+
+
+class AsyncLoader:
+    """
+    Загрузка документов через AsyncElasticsearch для асинхронного движка.
+
+    Сериализация, нарезка пачек, отпечатки, повторы и метрики общие
+    с синхронным Loader: ему делегируется всё, кроме самих запросов.
+    """
+
+    def __init__(self, es: AsyncElasticsearch, loader: Loader) -> None:
+        self.es = es
+        self.loader = loader
+
+    async def close(self) -> None:
+        """Закрывает соединения с Elasticsearch."""
+        await self.es.close()
+
+    async def load_data(
+        self,
+        index_name: str,
+        data: Iterable[dict[str, Any]],
+        fingerprint_key: str | None = None,
+    ) -> BulkStats:
+        """Загружает документы в индекс, как Loader.load_data."""
+        stats = BulkStats()
+        with self.loader._track_fingerprints(fingerprint_key, data, stats) as (
+            records,
+            confirm,
+        ):
+            await self._send(
+                index_name,
+                self.loader._generate_actions(index_name, records, stats),
+                stats,
+                "index",
+                on_success=confirm,
+            )
+        self.loader._log_loaded(index_name, stats)
+        return stats
+
+    async def delete_data(
+        self,
+        index_name: str,
+        ids: Iterable[str],
+        fingerprint_key: str | None = None,
+    ) -> BulkStats:
+        """Удаляет документы из индекса, как Loader.delete_data."""
+        stats = BulkStats()
+        ids = [str(id_) for id_ in ids]
+        try:
+            await self._send(
+                index_name,
+                self.loader._delete_actions(index_name, ids),
+                stats,
+                "delete",
+                ignore_statuses={404},
+            )
+        finally:
+            self.loader._forget_fingerprints(fingerprint_key, ids)
+        logging.info(
+            f"Удалено {stats.succeeded} документов из '{index_name}'."
+        )
+        return stats
+
+    async def _send(
+        self,
+        index_name: str,
+        actions: Iterable[dict[str, Any]],
+        stats: BulkStats,
+        operation: str,
+        ignore_statuses: set[int] | None = None,
+        on_success: Callable[[dict[str, Any]], None] | None = None,
+    ) -> None:
+        """Отправляет действия, повторяя только временно отклонённые."""
+        started = time.perf_counter()
+        errors: list[tuple[dict[str, Any], dict[str, Any]]] = []
+        for attempt in range(1, MAX_RETRIES + 1):
+            retry: list[dict[str, Any]] = []
+            for chunk, body in self.loader._chunk_actions(actions):
+                chunk_started = time.perf_counter()
+                try:
+                    response = await self.es.bulk(operations=body)
+                except ApiError as e:
+                    results = Loader._chunk_failed(chunk, e)
+                else:
+                    results = Loader._chunk_results(chunk, response)
+                self.loader._observe_chunk(
+                    chunk, body, time.perf_counter() - chunk_started, results
+                )
+                Loader._sort_results(
+                    results, stats, retry, errors, ignore_statuses, on_success
+                )
+            delay = Loader._retry_delay(index_name, attempt, retry, errors)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+            actions = retry
+        self.loader._record(index_name, stats, operation, errors, started)
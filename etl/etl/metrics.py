@@ -0,0 +1,157 @@
+import functools
+import inspect
+import logging
+import os
+import re
+import shutil
+import time
+from typing import Any, Callable
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+    start_http_server,
+    values,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def setup(path: str) -> None:
+    """
+    Переводит метрики в общий каталог path и очищает его.
+
+    Метрики пишут процессы-обработчики, а отдаёт HTTP-сервер главного
+    процесса, поэтому значения хранятся в файлах каталога. Главный
+    процесс вызывает setup до первого обращения к метрикам: созданные
+    раньше метрики хранят значения в памяти своего процесса. Без setup
+    (разовые команды) метрики не пишутся на диск.
+    """
+    if _collectors.cache_info().currsize:
+        raise RuntimeError("Метрики уже созданы до настройки каталога.")
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    # prometheus_client выбирает хранилище значений при импорте
+    values.ValueClass = values.get_value_class()
+
+
+@functools.cache
+def _collectors() -> dict[str, Any]:
+    """Метрики, создаваемые при первом обращении к ним."""
+    return {
+        "LAG": Gauge(
+            "etl_lag_seconds",
+            "Возраст самого старого ещё не обработанного изменения",
+            ["entity", "shard"],
+            multiprocess_mode="livemax",
+        ),
+        "BACKLOG": Gauge(
+            "etl_backlog",
+            "Необработанные изменения (не больше ETL_METRICS_BACKLOG_LIMIT)",
+            ["entity", "shard"],
+            multiprocess_mode="livemax",
+        ),
+        "EXTRACT_ROWS": Histogram(
+            "etl_extract_rows",
+            "Строк, выбранных одним запросом к PostgreSQL",
+            ["query"],
+            buckets=(0, 1, 10, 100, 1000, 10000, 100000),
+        ),
+        "EXTRACT_SECONDS": Histogram(
+            "etl_extract_duration_seconds",
+            "Время запроса к PostgreSQL",
+            ["query"],
+        ),
+        "TRANSFORM_SECONDS": Histogram(
+            "etl_transform_duration_seconds",
+            "Время трансформации пачки записей",
+            ["data_type"],
+        ),
+        "BULK_SECONDS": Histogram(
+            "etl_bulk_duration_seconds",
+            "Время загрузки пачки документов в Elasticsearch",
+            ["index", "operation"],
+            buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+        ),
+        "BULK_BATCH_SIZE": Gauge(
+            "etl_bulk_batch_size",
+            "Размер пачки _bulk, подобранный по задержке и объёму запросов",
+            ["index"],
+            multiprocess_mode="mostrecent",
+        ),
+        "DEAD_LETTERS": Gauge(
+            "etl_dead_letters",
+            "Документы в очереди недоставленных",
+            multiprocess_mode="mostrecent",
+        ),
+        "DOCUMENTS": Counter(
+            "etl_documents",
+            "Документы, обработанные в Elasticsearch",
+            ["index", "result"],
+        ),
+    }
+
+
+def __getattr__(name: str) -> Any:
+    """metrics.LAG и др.: метрики создаются при первом обращении."""
+    # служебные атрибуты (__path__ и др.) запрашивает механизм импорта
+    collectors = {} if name.startswith("_") else _collectors()
+    if name in collectors:
+        return collectors[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def index_label(index_name: str) -> str:
+    """Имя индекса без номера версии: у всех версий общие метрики."""
+    return re.sub(r"_v\d+$", "", index_name)
+
+
+def observe_extract(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Учитывает время запроса и число выбранных строк метода Extractor;
+    методы AsyncExtractor учитываются так же.
+    """
+
+    def observe(started: float, rows: list[Any]) -> None:
+        collectors = _collectors()
+        collectors["EXTRACT_SECONDS"].labels(func.__name__).observe(
+            time.perf_counter() - started
+        )
+        collectors["EXTRACT_ROWS"].labels(func.__name__).observe(len(rows))
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs) -> list[Any]:
+            started = time.perf_counter()
+            rows = await func(*args, **kwargs)
+            observe(started, rows)
+            return rows
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs) -> list[Any]:
+        started = time.perf_counter()
+        rows = func(*args, **kwargs)
+        observe(started, rows)
+        return rows
+
+    return wrapper
+
+
+def serve(port: int) -> None:
+    """Запускает HTTP-сервер /metrics со сводкой по всем процессам."""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(port, registry=registry)
+    logger.info("Metrics are served on port %s", port)
+
+
+def mark_process_dead(pid: int) -> None:
+    """Исключает завершившийся процесс из метрик live*."""
+    multiprocess.mark_process_dead(pid)
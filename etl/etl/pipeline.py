@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from config.settings import (
+    ES_BULK_WORKERS,
+    ES_CONFIG,
+    FILM_EXTRACT_MODE,
+    PIPELINE_QUEUE_SIZE,
+)
+from elasticsearch import AsyncElasticsearch
+
+from etl.extractor import AsyncExtractor
+from etl.loader import AsyncLoader, Loader
+from etl.transformer import Transformer
+
+# Признак конца потока пачек в очереди конвейера
+DONE = None
+
+
+class AsyncPipeline:
+    """
+    Асинхронный движок: конвейер извлечение -> трансформация -> загрузка.
+
+    Пачки id проходят три этапа, связанные очередями по queue_size
+    пачек: пока одна пачка индексируется в Elasticsearch, следующая уже
+    читается из PostgreSQL, а переполненная очередь приостанавливает
+    предыдущий этап. Загрузку ведут workers задач.
+
+    Цикл событий живёт всё время процесса, и соединения asyncpg
+    и AsyncElasticsearch переиспользуются между проходами. Аренды, метки
+    и переименования остаются синхронными и выполняются ETLProcess.
+    """
+
+    def __init__(
+        self,
+        loader: Loader,
+        extractor: AsyncExtractor | None = None,
+        es: AsyncElasticsearch | None = None,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        workers: int = ES_BULK_WORKERS,
+    ) -> None:
+        """
+        :param loader: Синхронный Loader, чьи настройки пачек и хранилище
+            отпечатков использует асинхронная загрузка.
+        """
+        self.loop = asyncio.new_event_loop()
+        self.extractor = extractor or AsyncExtractor(FILM_EXTRACT_MODE)
+        self.loader = AsyncLoader(
+            es or AsyncElasticsearch(**ES_CONFIG), loader
+        )
+        self.queue_size = queue_size
+        self.workers = max(workers, 1)
+
+    def load(
+        self,
+        index: str,
+        targets: list[tuple[str, str | None]],
+        ids: list[str],
+        batch_size: int,
+        delete_missing: bool = False,
+    ) -> int:
+        """
+        Перечитывает из БД объекты ids и загружает их документы.
+
+        :param index: movies, persons или genres - определяет запрос
+            и трансформацию.
+        :param targets: Индексы для записи и ключи отпечатков документов.
+        :param delete_missing: Удалять из индексов документы объектов,
+            которых в БД больше нет.
+        :return: Количество загруженных документов.
+        """
+        sources: dict[str, tuple[Callable, str]] = {
+            "movies": (
+                self.extractor.fetch_movies,
+                self.extractor.movies_data_type,
+            ),
+            "persons": (self.extractor.fetch_persons_by_ids, "persons"),
+            "genres": (self.extractor.fetch_genres_by_ids, "genres"),
+        }
+        fetch, data_type = sources[index]
+        batches = [
+            ids[start : start + batch_size]
+            for start in range(0, len(ids), batch_size)
+        ]
+        return self.loop.run_until_complete(
+            self.run(batches, fetch, data_type, targets, delete_missing)
+        )
+
+    async def run(
+        self,
+        batches: list[list[str]],
+        fetch: Callable[[list[str]], Awaitable[list[dict[str, Any]]]],
+        data_type: str,
+        targets: list[tuple[str, str | None]],
+        delete_missing: bool = False,
+    ) -> int:
+        """
+        Прогоняет пачки id через этапы конвейера.
+
+        Ошибка любого этапа отменяет остальные и поднимается наружу;
+        метки в этом случае не сдвигаются, и пачки повторятся.
+        """
+        await self.extractor.connect()
+        extracted: asyncio.Queue = asyncio.Queue(self.queue_size)
+        transformed: asyncio.Queue = asyncio.Queue(self.queue_size)
+        loaded = 0
+
+        async def extract() -> None:
+            for ids in batches:
+                await extracted.put((ids, await fetch(ids)))
+            await extracted.put(DONE)
+
+        async def transform() -> None:
+            while (batch := await extracted.get()) is not DONE:
+                ids, rows = batch
+                await transformed.put(
+                    (ids, Transformer.transform(rows, data_type))
+                )
+            for _ in range(self.workers):
+                await transformed.put(DONE)
+
+        async def load() -> None:
+            nonlocal loaded
+            while (batch := await transformed.get()) is not DONE:
+                ids, documents = batch
+                for index_name, fingerprint_key in targets:
+                    if documents:
+                        await self.loader.load_data(
+                            index_name, documents, fingerprint_key
+                        )
+                    deleted = set(ids) - {
+                        str(document["id"]) for document in documents
+                    }
+                    if delete_missing and deleted:
+                        await self.loader.delete_data(
+                            index_name, deleted, fingerprint_key
+                        )
+                loaded += len(documents)
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(extract())
+                group.create_task(transform())
+                for _ in range(self.workers):
+                    group.create_task(load())
+        except ExceptionGroup as errors:
+            # наружу - исходная ошибка, её разбирает ETLProcess
+            raise errors.exceptions[0]
+        logging.debug(f"Конвейер {data_type}: загружено {loaded} документов.")
+        return loaded
+
+    def close(self) -> None:
+        """Закрывает соединения и цикл событий."""
+        self.loop.run_until_complete(self.extractor.close())
+        self.loop.run_until_complete(self.loader.close())
+        self.loop.close()
@@ -0,0 +1,196 @@
+import logging
+import threading
+import time
+from typing import Any
+
+import backoff
+import psycopg2
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_UNKNOWN,
+    connection,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresPool:
+    """Пул долгоживущих соединений с PostgreSQL с проверкой их состояния."""
+
+    def __init__(
+        self,
+        config: dict[str, Any],
+        min_size: int,
+        max_size: int,
+        max_lifetime: int,
+        healthcheck_interval: int,
+        timeout: float,
+    ) -> None:
+        """
+        :param config: Параметры подключения к PostgreSQL.
+        :param min_size: Сколько соединений открыть при первом запросе.
+        :param max_size: Максимальное количество соединений; все они,
+            вернувшись в пул, остаются открытыми.
+        :param max_lifetime: Время жизни соединения в секундах.
+        :param healthcheck_interval: Интервал проверки соединения в секундах.
+        :param timeout: Сколько секунд ждать свободного соединения, когда
+            открыты все max_size.
+        """
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.healthcheck_interval = healthcheck_interval
+        self.timeout = timeout
+        # открытые соединения пула, выданные и свободные, по id()
+        self._connections: dict[int, connection] = {}
+        # свободные соединения; последнее вернувшееся выдаётся первым,
+        # и редко нужные соединения доживают до max_lifetime
+        self._idle: list[connection] = []
+        self._opened_at: dict[int, float] = {}
+        self._checked_at: dict[int, float] = {}
+        self._opened = False
+        # соединения, которые открываются прямо сейчас
+        self._connecting = 0
+        # соединения берут и возвращают из нескольких потоков
+        self._condition = threading.Condition()
+
+    @backoff.on_exception(
+        backoff.expo,
+        (psycopg2.OperationalError,),
+        max_time=60,
+        jitter=backoff.full_jitter,
+    )
+    def getconn(self) -> connection:
+        """
+        Выдаёт живое соединение из пула, при необходимости переподключаясь.
+
+        Если открыты все max_size соединений, ждёт возврата одного из них
+        не дольше timeout секунд.
+        """
+        self._open()
+        for _ in range(self.max_size + 1):
+            conn = self._acquire()
+            if self._is_healthy(conn):
+                return conn
+            self.putconn(conn, close=True)
+        raise psycopg2.OperationalError("No healthy PostgreSQL connection")
+
+    def putconn(self, conn: connection, close: bool = False) -> None:
+        """Возвращает соединение в пул или закрывает его, если оно сломано."""
+        close = close or bool(conn.closed)
+        if not close:
+            status = conn.info.transaction_status
+            if status == TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+        with self._condition:
+            if id(conn) not in self._connections:
+                # соединение закрыто вызовом closeall, пока было выдано
+                close = True
+            elif close:
+                self._forget(conn)
+            else:
+                self._idle.append(conn)
+            self._condition.notify()
+        if close and not conn.closed:
+            conn.close()
+
+    def closeall(self) -> None:
+        """Закрывает все соединения пула; следующий запрос откроет пул."""
+        with self._condition:
+            connections = list(self._connections.values())
+            for conn in connections:
+                self._forget(conn)
+            self._opened = False
+            self._condition.notify_all()
+        for conn in connections:
+            if not conn.closed:
+                conn.close()
+
+    def _open(self) -> None:
+        """Открывает min_size соединений при первом запросе."""
+        with self._condition:
+            if self._opened:
+                return
+            self._opened = True
+        for _ in range(self.min_size):
+            try:
+                conn = self._acquire()
+            except psycopg2.OperationalError:
+                with self._condition:
+                    self._opened = False
+                raise
+            self.putconn(conn)
+        logger.info(
+            "PostgreSQL pool opened: %s-%s connections",
+            self.min_size,
+            self.max_size,
+        )
+
+    def _acquire(self) -> connection:
+        """Берёт свободное соединение, открывает новое или ждёт возврата."""
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise psycopg2.OperationalError(
+                        f"PostgreSQL pool exhausted: {self.max_size} "
+                        f"connections busy for {self.timeout} s"
+                    )
+                self._condition.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            # место занимается до подключения, чтобы не превысить max_size
+            self._connecting += 1
+        try:
+            conn = psycopg2.connect(**self.config)
+        except Exception:
+            with self._condition:
+                self._connecting -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._connecting -= 1
+            self._connections[id(conn)] = conn
+            self._opened_at[id(conn)] = time.monotonic()
+        return conn
+
+    @property
+    def _size(self) -> int:
+        return len(self._connections) + self._connecting
+
+    def _forget(self, conn: connection) -> None:
+        """Убирает соединение и его метаданные из пула; под блокировкой."""
+        self._connections.pop(id(conn), None)
+        self._opened_at.pop(id(conn), None)
+        self._checked_at.pop(id(conn), None)
+        if conn in self._idle:
+            self._idle.remove(conn)
+
+    def _is_healthy(self, conn: connection) -> bool:
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        opened_at = self._opened_at.get(id(conn), now)
+        if now - opened_at > self.max_lifetime:
+            logger.debug("PostgreSQL connection exceeded its lifetime")
+            return False
+        if now - self._checked_at.get(id(conn), opened_at) < (
+            self.healthcheck_interval
+        ):
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error as e:
+            logger.warning("PostgreSQL connection is broken: %s", e)
+            return False
+        self._checked_at[id(conn)] = now
+        return True
@@ -1,64 +1,82 @@
 import logging
-from typing import Any
+import time
+from typing import Any, Iterable, Iterator
+
+from etl import metrics
 
 
 class Transformer:
     @staticmethod
     def transform(
-        raw_data: list[dict[str, Any]], data_type: str
+        raw_data: Iterable[dict[str, Any]], data_type: str
     ) -> list[dict[str, str | list[dict[str, str]]]]:
         """Преобразует необработанные данные в нужный формат на основе типа данных."""
-        if data_type == "movies":
-            return Transformer.transform_movies(raw_data)
-        elif data_type == "genres":
-            return [Transformer.transform_genre(record) for record in raw_data]
-        elif data_type == "persons":
-            return [
-                Transformer.transform_person(record) for record in raw_data
-            ]
-        else:
+        started = time.perf_counter()
+        documents = list(Transformer.transform_stream(raw_data, data_type))
+        metrics.TRANSFORM_SECONDS.labels(data_type).observe(
+            time.perf_counter() - started
+        )
+        return documents
+
+    @staticmethod
+    def transform_stream(
+        raw_data: Iterable[dict[str, Any]], data_type: str
+    ) -> Iterator[dict[str, Any]]:
+        """Лениво преобразует поток записей, не накапливая их в памяти."""
+        transformers = {
+            "movies": Transformer.transform_movie,
+            "movie_documents": Transformer.transform_movie_document,
+            "genres": Transformer.transform_genre,
+            "persons": Transformer.transform_person,
+        }
+        transform_record = transformers.get(data_type)
+        if transform_record is None:
             logging.warning(
                 f"Неизвестный тип данных для трансформации: {data_type}"
             )
-            return []
+            return
+        for record in raw_data:
+            yield transform_record(record)
 
     @staticmethod
     def transform_movies(
-        raw_data: list[dict[str, Any]]
+        raw_data: Iterable[dict[str, Any]]
     ) -> list[dict[str, Any]]:
         """Преобразует данные фильмов."""
-        transformed_data = []
-        for record in raw_data:
-            transformed_record = {
-                "id": record.get("fw_id"),
-                "imdb_rating": record.get("rating"),
-                "genres": [
-                    genre["name"]
-                    for genre in record["genres"]
-                    if record.get("genres")
-                ],
-                "genres_details": Transformer.extract_genres(record),
-                "title": record.get("title"),
-                "description": record.get("description"),
-                "directors": Transformer.extract_people_by_role(
-                    record, "director"
-                ),
-                "actors": Transformer.extract_people_by_role(record, "actor"),
-                "writers": Transformer.extract_people_by_role(
-                    record, "writer"
-                ),
-            }
-            transformed_record["directors_names"] = [
-                d["name"] for d in transformed_record["directors"]
-            ]
-            transformed_record["actors_names"] = [
-                a["name"] for a in transformed_record["actors"]
-            ]
-            transformed_record["writers_names"] = [
-                w["name"] for w in transformed_record["writers"]
-            ]
-            transformed_data.append(transformed_record)
-        return transformed_data
+        return [Transformer.transform_movie(record) for record in raw_data]
+
+    @staticmethod
+    def transform_movie(record: dict[str, Any]) -> dict[str, Any]:
+        """Преобразует запись для индекса фильмов."""
+        transformed_record = {
+            "id": record.get("fw_id"),
+            "imdb_rating": record.get("rating"),
+            "genres": [genre["name"] for genre in record.get("genres", [])],
+            "genres_details": Transformer.extract_genres(record),
+            "title": record.get("title"),
+            "description": record.get("description"),
+            "directors": Transformer.extract_people_by_role(
+                record, "director"
+            ),
+            "actors": Transformer.extract_people_by_role(record, "actor"),
+            "writers": Transformer.extract_people_by_role(record, "writer"),
+            "etl_version": record.get("etl_version"),
+        }
+        transformed_record["directors_names"] = [
+            d["name"] for d in transformed_record["directors"]
+        ]
+        transformed_record["actors_names"] = [
+            a["name"] for a in transformed_record["actors"]
+        ]
+        transformed_record["writers_names"] = [
+            w["name"] for w in transformed_record["writers"]
+        ]
+        return transformed_record
+
+    @staticmethod
+    def transform_movie_document(record: dict[str, Any]) -> dict[str, Any]:
+        """Достаёт документ фильма, уже собранный на стороне PostgreSQL."""
+        return record["document"]
 
     @staticmethod
     def transform_genre(record: dict[str, Any]) -> dict[str, Any]:
@@ -67,6 +85,7 @@ class Transformer:
             "id": record.get("id"),
             "name": record.get("name"),
             "description": record.get("description"),
+            "etl_version": record.get("etl_version"),
         }
 
     @staticmethod
@@ -76,6 +95,7 @@ class Transformer:
             "id": record.get("id"),
             "full_name": record.get("full_name"),
             "films": record.get("films", []),
+            "etl_version": record.get("etl_version"),
         }
 
     @staticmethod
@@ -1,18 +1,51 @@
+import json
 import logging
 import os
 import random
+import signal
+import socket
+import sys
 import time
-from datetime import datetime
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
 from multiprocessing import Process
-from typing import Any
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Any, Iterable, Iterator
 
 import backoff
 from config.settings import (
+    BACKFILL_RATE,
+    BATCH_SIZE,
+    BULK_INITIAL_LOAD,
+    CATCH_UP_MODE,
+    CHANGE_CAPTURE,
+    DEAD_LETTER_QUEUE,
+    DOC_FINGERPRINTS,
+    ENGINE,
     ES_CONFIG,
     FIRST_TIME_STARTED,
+    INDEX_VERSIONS_KEEP,
+    INITIAL_LOAD_SAFETY_MARGIN,
+    LISTEN_NOTIFY,
     MAX_BACKOFF,
     MAX_RETRIES,
+    METRICS_BACKLOG_LIMIT,
+    METRICS_DIR,
+    METRICS_PORT,
+    NOTIFY_CHANNEL,
+    NOTIFY_FALLBACK_TIMEOUT,
+    OUTBOX_PRUNE_INTERVAL,
+    OUTBOX_RETENTION,
     REDIS_CONFIG,
+    SHARD_LEASE_TTL,
+    SHARDS,
+    SNAPSHOT_CHUNK_DOCUMENTS,
+    SNAPSHOT_WORKERS,
+    WORKER_RESTART_DELAY,
+    WORKERS,
     genres_schema,
     movies_schema,
     persons_schema,
@@ -23,11 +56,16 @@ from elasticsearch import Elasticsearch, NotFoundError
 from elasticsearch.exceptions import ConflictError
 from psycopg2 import OperationalError
 from redis.exceptions import RedisError
-from storage.redis_state import RedisStateManager
+from storage.redis_state import MIN_UUID, RedisStateManager
 from urllib3.connection import NewConnectionError
 
+from etl import archive, metrics
+from etl.consistency import ConsistencyChecker
 from etl.extractor import Extractor
-from etl.loader import Loader
+from etl.heartbeat import Heartbeat
+from etl.listener import ChangeListener
+from etl.loader import DEAD_LETTERS_KEY, Loader, versioned_index_name
+from etl.pipeline import AsyncPipeline
 from etl.transformer import Transformer
 
 load_dotenv()
@@ -54,11 +92,22 @@ class ETLProcess:
     def __init__(
         self,
         redis_config: dict[str, Any],
-        first_time: bool = False,
     ) -> None:
         self.redis_manager = RedisStateManager(redis_config)
-        self.loader = Loader(Elasticsearch(**ES_CONFIG))
+        self.loader = Loader(
+            Elasticsearch(**ES_CONFIG),
+            fingerprints=self.redis_manager if DOC_FINGERPRINTS else None,
+            dead_letters=self.redis_manager if DEAD_LETTER_QUEUE else None,
+        )
         self.extractor = Extractor()
+        # асинхронный движок перечитывает и загружает фильмы и персон
+        # конвейером; остальное выполняется синхронно
+        self.pipeline = (
+            AsyncPipeline(self.loader) if ENGINE == "async" else None
+        )
+        self.listener = (
+            ChangeListener(NOTIFY_CHANNEL) if LISTEN_NOTIFY else None
+        )
         self.schemas = {
             "movies": movies_schema,
             "genres": genres_schema,
@@ -69,8 +118,32 @@ class ETLProcess:
             "genre": "genre_index",
             "person": "person_index",
         }
-        self.initialize = first_time
+        self.table_indices = {
+            "film_work": "movies",
+            "genre": "genres",
+            "person": "persons",
+        }
+        self.batch_size = BATCH_SIZE
         self.process_name = "etl_process_flag"
+        self.worker_id = (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.shard: int | None = None
+        # номер захвата аренды шарда (fencing token), сохраняется с метками
+        self.fencing_token = 0
+        # аренда шарда продлевается в фоне, даже пока идёт долгий проход
+        self.heartbeat = Heartbeat(self.renew_shard, SHARD_LEASE_TTL / 3)
+        # запись идёт через псевдонимы; сборщик новой версии пишет
+        # в её физические индексы напрямую
+        self.indices = {index: index for index in self.schemas}
+        self.version_key = "etl_index_version"
+        self.building_key = "etl_index_building"
+        self.backfill_key = "etl_backfill"
+        self.version = 0
+        self.building: int | None = None
+        self.last_error: Exception | None = None
+        # время последней очистки outbox в режиме timestamps
+        self.outbox_pruned_at: float | None = None
 
     @backoff.on_exception(
         backoff.expo,
@@ -88,10 +161,8 @@ class ETLProcess:
         jitter=backoff.random_jitter,
     )
     def initialize_index(self, index_type: str) -> None:
+        """Создаёт недостающий индекс текущей версии за псевдонимом."""
         try:
-            if not self.redis_manager.set_process_flag(self.process_name):
-                logging.info("Процесс уже запущен другим экземпляром.")
-                return
             schema = self.schemas.get(index_type)
             if not schema:
                 logging.error(
@@ -100,62 +171,76 @@ class ETLProcess:
                 )
                 return
             if self.loader.index_exists(index_type):
-                self.loader.delete_index(index_type)
-                logging.info(
-                    f"Index '{index_type}' deleted from Elasticsearch."
-                )
-            self.loader.create_index(index_type, schema)
-            logging.info(f"Index '{index_type}' created in Elasticsearch.")
+                logging.info(f"Index '{index_type}' already exists.")
+                # поля, добавленные в схему, появляются и в старых индексах
+                self.loader.update_mapping(index_type, schema)
+                return
+            if not self.version:
+                self.loader.create_index(index_type, schema)
+                return
+            index_name = versioned_index_name(index_type, self.version)
+            self.loader.create_index(index_name, schema)
+            self.loader.swap_aliases({index_type: index_name})
+            logging.info(
+                f"Index '{index_name}' created behind alias '{index_type}'."
+            )
         except Exception as e:
             logging.error(f"Ошибка инициализации индекса: {e}", exc_info=True)
-        finally:
-            self.redis_manager.clear_process_flag(self.process_name)
 
-    def run_etl_process(self) -> None:
-        if not self.redis_manager.set_process_flag(self.process_name):
-            logging.info("Процесс уже запущен другим экземпляром.")
-            return
+    def run_etl_process(self) -> bool:
+        """
+        Обрабатывает по одной пачке изменений каждой таблицы.
+
+        :return: True, если хотя бы одна пачка выбрана целиком и в таблицах,
+            вероятно, остались необработанные изменения.
+        """
+        self.last_error = None
         try:
-            last_modified_times = self.get_last_modified_times()
+            watermarks = self.get_watermarks()
+            sizes = {table: self.extract_size(table) for table in self.tables}
             modified_persons = self.extractor.fetch_modified_persons(
-                last_modified_times["person"]
+                watermarks["person"], sizes["person"]
             )
             modified_genres = self.extractor.fetch_modified_genres(
-                last_modified_times["genre"]
+                watermarks["genre"], sizes["genre"]
             )
-            new_filmworks = self.extractor.fetch_new_filmworks(
-                last_modified_times["film_work"]
+            modified_filmworks = self.extractor.fetch_modified_filmworks(
+                watermarks["film_work"], sizes["film_work"]
             )
-            if not (modified_persons or modified_genres or new_filmworks):
+            batches = {
+                "person": modified_persons,
+                "genre": modified_genres,
+                "film_work": modified_filmworks,
+            }
+            self.observe_lag(batches, watermarks, sizes)
+            if not (modified_persons or modified_genres or modified_filmworks):
                 logging.debug("Нет изменений для обработки.")
-                return
-            filmwork_ids = self.get_filmwork_ids(
-                modified_persons, modified_genres, new_filmworks
+                return False
+            # персон и жанры обрабатывает только шард, которому они
+            # принадлежат: выборка изменений отфильтрована по шарду
+            persons = self.extractor.fetch_persons_by_ids(
+                [person["id"] for person in modified_persons]
+            )
+            genres = self.extractor.fetch_genres_by_ids(
+                [genre["id"] for genre in modified_genres]
+            )
+            rebuild_ids = self.compare_persons(persons)
+            filmwork_ids = {
+                str(filmwork["id"]) for filmwork in modified_filmworks
+            }
+            self.process_filmworks(list(filmwork_ids | rebuild_ids))
+            self.rename_in_movies(persons, genres)
+            self.refresh_film_persons(
+                list(filmwork_ids), {str(person["id"]) for person in persons}
+            )
+            if genres:
+                self.load("genres", Transformer.transform(genres, "genres"))
+            if persons:
+                self.load("persons", Transformer.transform(persons, "persons"))
+            self.update_watermarks(batches)
+            return any(
+                len(rows) >= sizes[table] for table, rows in batches.items()
             )
-            self.process_filmworks(filmwork_ids, last_modified_times)
-            if modified_genres:
-                transformed_genres = Transformer.transform(
-                    modified_genres, "genres"
-                )
-                self.loader.load_data("genres", transformed_genres)
-                last_modified_times["genre"] = self.get_max_modified_time(
-                    modified_genres
-                )
-            if modified_persons:
-                modified_persons_ids = [
-                    person["id"] for person in modified_persons
-                ]
-                modified_persons_updates = self.extractor.fetch_persons_by_ids(
-                    modified_persons_ids
-                )
-                transformed_persons = Transformer.transform(
-                    modified_persons_updates, "persons"
-                )
-                self.loader.load_data("persons", transformed_persons)
-                last_modified_times["person"] = self.get_max_modified_time(
-                    modified_persons
-                )
-            self.update_last_modified(last_modified_times)
 
         except (
             RedisError,
@@ -174,82 +259,447 @@ class ETLProcess:
             logging.error(
                 f"Unexpected error during ETL process: {e}", exc_info=True
             )
-        finally:
-            self.redis_manager.clear_process_flag(self.process_name)
+            self.last_error = e
+            return False
 
-    def get_last_modified_times(self) -> dict[str, datetime | None]:
-        return {
-            "person": self.redis_manager.get_last_modified("person"),
-            "genre": self.redis_manager.get_last_modified("genre"),
-            "film_work": self.redis_manager.get_last_modified("film_work"),
-        }
+    def run_outbox_process(self) -> bool:
+        """
+        Обрабатывает пачку событий из outbox-таблицы content.etl_outbox.
 
-    def get_max_modified_time(
-        self, items: list[dict[str, Any]]
-    ) -> datetime | None:
-        return max((item["modified"] for item in items), default=None)
+        Для каждого затронутого объекта перечитывается его текущее
+        состояние: найденные документы обновляются, пропавшие из БД
+        удаляются из индекса. События удаляются из очереди только
+        после успешной загрузки. Пока собирается новая версия индексов,
+        объекты событий ещё и запоминаются для сборщика.
 
-    def get_filmwork_ids(
-        self,
-        modified_persons: list[dict[str, Any]],
-        modified_genres: list[dict[str, Any]],
-        new_filmworks: list[dict[str, Any]],
-    ) -> list[str]:
+        :return: True, если пачка выбрана целиком и в очереди,
+            вероятно, остались события.
+        """
         try:
-            filmwork_ids_by_person = [
-                fw["id"]
-                for fw in self.extractor.fetch_related_filmworks_by_person(
-                    [person["id"] for person in modified_persons]
-                )
-            ]
-            filmwork_ids_by_genre = [
-                fw["id"]
-                for fw in self.extractor.fetch_related_filmworks_by_genre(
-                    [genre["id"] for genre in modified_genres]
-                )
-            ]
-            new_filmworks_ids = [
-                new_filmwork["id"] for new_filmwork in new_filmworks
-            ]
-            return list(
-                set(
-                    filmwork_ids_by_person
-                    + filmwork_ids_by_genre
-                    + new_filmworks_ids
-                )
-            )
+            with self.extractor.outbox_batch(self.batch_size) as events:
+                self.observe_outbox_lag(events)
+                if not events:
+                    logging.debug("Нет изменений для обработки.")
+                    return False
+                changed: dict[str, set[str]] = {
+                    table: set() for table in self.tables
+                }
+                for event in events:
+                    changed[event["entity_type"]].add(event["entity_id"])
+                if self.building is not None:
+                    # до чтения из БД: иначе сборщик мог бы записать
+                    # объект старше того, что запишет этот проход
+                    self.redis_manager.add_changes(
+                        self.changes_key(self.building),
+                        [
+                            f"{table}:{entity_id}"
+                            for table, ids in changed.items()
+                            for entity_id in ids
+                        ],
+                    )
+                self.apply_changes(changed)
+            logging.info(f"Обработано {len(events)} событий из outbox.")
+            return len(events) >= self.batch_size
+
         except (
             RedisError,
             ConnectionError,
             NotFoundError,
             OperationalError,
+            ConnectionRefusedError,
+            NewConnectionError,
         ) as e:
             logging.error(
-                f"Ошибка при получении ID фильмов: {e}",
+                f"Ошибка базы данных или доступа: {e}. Ожидание следующей попытки.",
                 exc_info=True,
             )
             raise
+        except Exception as e:
+            logging.error(
+                f"Unexpected error during ETL process: {e}", exc_info=True
+            )
+            return False
+
+    def apply_changes(self, changed: dict[str, set[str]]) -> None:
+        """Перечитывает изменённые объекты по таблицам и обновляет индексы."""
+        genre_ids = list(changed["genre"])
+        person_ids = list(changed["person"])
+        genres = self.extractor.fetch_genres_by_ids(genre_ids)
+        persons = self.extractor.fetch_persons_by_ids(person_ids)
+        # смена связей фильма ставит в очередь сам фильм, поэтому
+        # событие персоны или жанра обычно требует лишь правки имени
+        rebuild_ids = self.compare_persons(persons)
+        self.sync_movies(list(changed["film_work"] | rebuild_ids))
+        self.rename_in_movies(persons, genres)
+        self.refresh_film_persons(
+            list(changed["film_work"]), changed["person"]
+        )
+        self.sync_index("genres", genre_ids, genres, "genres")
+        self.sync_index("persons", person_ids, persons, "persons")
+
+    def changes_key(self, version: int) -> str:
+        """Множество объектов, изменённых во время сборки версии."""
+        return f"{self.building_key}:v{version}:changes"
 
-    def process_filmworks(
+    def replay_changes(self) -> None:
+        """
+        Повторно применяет к собираемой версии события outbox,
+        обработанные во время её сборки.
+
+        Первичная загрузка читает один снимок БД, а догоняющий проход
+        по меткам времени не видит смены одних только связей, поэтому
+        документы, записанные обработчиками, могли быть перезаписаны
+        старыми. Объекты перечитываются из БД без сверки отпечатков,
+        пока множество не опустеет.
+        """
+        key = self.changes_key(self.version)
+        fingerprints = self.loader.fingerprints
+        self.loader.fingerprints = None
+        replayed = 0
+        try:
+            while members := self.redis_manager.pop_changes(
+                key, self.batch_size
+            ):
+                changed: dict[str, set[str]] = {
+                    table: set() for table in self.tables
+                }
+                for member in members:
+                    table, entity_id = member.split(":", 1)
+                    changed[table].add(entity_id)
+                self.apply_changes(changed)
+                replayed += len(members)
+        finally:
+            self.loader.fingerprints = fingerprints
+        logging.info(f"Повторно применено {replayed} изменений сборки.")
+
+    def observe_lag(
         self,
-        filmwork_ids: list[str],
-        last_modified_times: dict[str, datetime | None],
+        batches: dict[str, list[dict[str, Any]]],
+        watermarks: dict[str, tuple[str, str] | None],
+        sizes: dict[str, int],
     ) -> None:
-        try:
-            full_filmwork_data = self.extractor.fetch_full_filmwork_data(
-                filmwork_ids
+        """
+        Обновляет метрики отставания и очереди изменений каждой таблицы.
+
+        Отставание - возраст самой старой необработанной строки, 0, если
+        изменений нет. Очередь досчитывается отдельным запросом, только
+        если пачка выбрана целиком.
+        """
+        now = datetime.now(timezone.utc)
+        for table, rows in batches.items():
+            lag = (
+                (now - self.convert_to_datetime(rows[0]["modified"]))
+                if rows
+                else timedelta()
             )
-            if not full_filmwork_data:
-                logging.warning("Нет данных для обработки.")
-                return
-            transformed_data = Transformer.transform(
-                full_filmwork_data, "movies"
+            backlog = len(rows)
+            if backlog >= sizes[table] and watermarks[table] is not None:
+                backlog = self.extractor.count_modified(
+                    table, watermarks[table], METRICS_BACKLOG_LIMIT
+                )
+            metrics.LAG.labels(table, self.shard_label).set(
+                max(lag.total_seconds(), 0)
+            )
+            metrics.BACKLOG.labels(table, self.shard_label).set(backlog)
+        self.observe_dead_letters()
+
+    def observe_outbox_lag(self, events: list[dict[str, Any]]) -> None:
+        """Обновляет метрики отставания по событиям и размера outbox."""
+        now = datetime.now(timezone.utc)
+        oldest: dict[str, datetime] = {}
+        for event in events:
+            entity = event["entity_type"]
+            if entity not in oldest or event["created"] < oldest[entity]:
+                oldest[entity] = event["created"]
+        for table in self.tables:
+            lag = now - oldest[table] if table in oldest else timedelta()
+            metrics.LAG.labels(table, self.shard_label).set(
+                max(lag.total_seconds(), 0)
+            )
+        backlog = len(events)
+        if backlog >= self.batch_size:
+            backlog = self.extractor.count_outbox(METRICS_BACKLOG_LIMIT)
+        metrics.BACKLOG.labels("outbox", self.shard_label).set(backlog)
+        self.observe_dead_letters()
+
+    def observe_dead_letters(self) -> None:
+        """Обновляет метрику размера очереди недоставленных."""
+        if DEAD_LETTER_QUEUE:
+            metrics.DEAD_LETTERS.set(
+                self.redis_manager.count_dead_letters(DEAD_LETTERS_KEY)
+            )
+
+    def extract_size(self, table: str) -> int:
+        """
+        Размер пачки чтения таблицы.
+
+        При подборе размера пачек он следует за пачкой _bulk индекса
+        таблицы: прочитанное загружается одним запросом в каждом потоке
+        отправки, и перегрузка Elasticsearch уменьшает и чтение.
+        """
+        if not self.loader.adaptive:
+            return self.batch_size
+        return (
+            self.loader.batch_size(self.table_indices[table])
+            * self.loader.workers
+        )
+
+    def extract_chunks(
+        self, ids: list[str], table: str
+    ) -> Iterator[list[str]]:
+        """Режет id на пачки чтения; размер каждой пачки подбирается заново."""
+        start = 0
+        while start < len(ids):
+            size = self.extract_size(table)
+            yield ids[start : start + size]
+            start += size
+
+    def sync_movies(self, filmwork_ids: list[str]) -> None:
+        """Перечитывает фильмы: найденные обновляет, пропавшие удаляет."""
+        if self.pipeline is not None:
+            self.pipeline.load(
+                "movies",
+                self.write_targets("movies"),
+                filmwork_ids,
+                self.extract_size("film_work"),
+                delete_missing=True,
+            )
+            return
+        for chunk in self.extract_chunks(filmwork_ids, "film_work"):
+            self.sync_index(
+                "movies",
+                chunk,
+                self.extractor.fetch_movies(chunk),
+                self.extractor.movies_data_type,
+            )
+
+    def sync_index(
+        self,
+        index_name: str,
+        ids: list[str],
+        raw_data: list[dict[str, Any]],
+        data_type: str,
+    ) -> None:
+        """Обновляет найденные в БД документы и удаляет из индекса пропавшие."""
+        if not ids:
+            return
+        documents = Transformer.transform(raw_data, data_type)
+        if documents:
+            self.load(index_name, documents)
+        deleted = set(ids) - {str(document["id"]) for document in documents}
+        if deleted:
+            self.delete(index_name, deleted)
+
+    def load(self, index: str, documents: Iterable[dict[str, Any]]) -> None:
+        targets = self.index_targets(index)
+        if len(targets) > 1:
+            documents = list(documents)
+        for target, version in targets:
+            self.loader.load_data(
+                target, documents, self.fingerprint_key(index, version)
+            )
+
+    def delete(self, index: str, ids: Iterable[str]) -> None:
+        targets = self.index_targets(index)
+        ids = list(ids)
+        for target, version in targets:
+            self.loader.delete_data(
+                target, ids, self.fingerprint_key(index, version)
+            )
+
+    def index_targets(self, index: str) -> list[tuple[str, int]]:
+        """
+        Индексы для записи документов и версии, к которым они относятся.
+
+        Пока собирается новая версия индексов, события outbox пишутся
+        и в неё: удаление из очереди необратимо, и сборщик по меткам
+        времени не узнал бы об удалённых объектах.
+        """
+        targets = [(self.indices[index], self.version)]
+        if self.building is not None:
+            targets.append(
+                (versioned_index_name(index, self.building), self.building)
+            )
+        return targets
+
+    def write_targets(self, index: str) -> list[tuple[str, str]]:
+        """Индексы для записи документов и ключи их отпечатков."""
+        return [
+            (target, self.fingerprint_key(index, version))
+            for target, version in self.index_targets(index)
+        ]
+
+    def fingerprint_key(self, index: str, version: int) -> str:
+        """Хеш отпечатков документов индекса; у каждой версии свой."""
+        key = f"{index}_fingerprints"
+        return f"v{version}:{key}" if version else key
+
+    def get_watermarks(self) -> dict[str, tuple[str, str] | None]:
+        """Метки всех таблиц, прочитанные из Redis одним запросом."""
+        keys = {table: self.state_key(table) for table in self.tables}
+        watermarks = self.redis_manager.get_watermarks(list(keys.values()))
+        return {table: watermarks[key] for table, key in keys.items()}
+
+    def state_key(
+        self, table: str, shard: int | None = None, version: int | None = None
+    ) -> str:
+        """Имя метки таблицы; у каждой версии индексов и шарда свои метки."""
+        shard = self.shard if shard is None else shard
+        version = self.version if version is None else version
+        # у индексов без версий (версия 0) метки хранятся по старым ключам
+        key = f"v{version}:{table}" if version else table
+        if SHARDS == 1 or shard is None:
+            return key
+        return f"{key}:shard{shard}"
+
+    def state_keys(self, table: str, version: int | None = None) -> list[str]:
+        """
+        Метки таблицы во всех шардах версии и метка сборщика новой
+        версии: он работает без шарда и читает метки без суффикса.
+        """
+        version = self.version if version is None else version
+        keys = [
+            self.state_key(table, shard, version) for shard in range(SHARDS)
+        ]
+        keys.append(f"v{version}:{table}" if version else table)
+        return list(dict.fromkeys(keys))
+
+    def compare_persons(self, persons: list[dict[str, Any]]) -> set[str]:
+        """
+        Сравнивает фильмы и роли персон из БД с их документами в индексе
+        персон.
+
+        Фильмы, у которых изменился состав или роли персоны, нужно
+        пересобрать целиком. Если документа персоны ещё нет, её связи
+        неизвестны, и пересобираются все её фильмы.
+
+        :return: id фильмов для пересборки.
+        """
+        indexed = self.loader.get_documents(
+            self.indices["persons"], [person["id"] for person in persons]
+        )
+        rebuild_ids: set[str] = set()
+        for person in persons:
+            old = indexed.get(str(person["id"]))
+            new_films = self.person_films(person)
+            old_films = self.person_films(old) if old is not None else {}
+            rebuild_ids.update(
+                film_id
+                for film_id in new_films.keys() | old_films.keys()
+                if old is None
+                or new_films.get(film_id) != old_films.get(film_id)
             )
-            self.loader.load_data("movies", transformed_data)
-            logging.info("Индексы обновлены!")
-            last_modified_times["film_work"] = self.get_max_modified_time(
-                full_filmwork_data
+        return rebuild_ids
+
+    @staticmethod
+    def person_films(person: dict[str, Any]) -> dict[str, list[str]]:
+        """Фильмы персоны с её ролями: id фильма -> роли."""
+        return {
+            str(film["id"]): sorted(film.get("roles") or [])
+            for film in person.get("films") or []
+            if film.get("id") is not None
+        }
+
+    def rename_in_movies(
+        self, persons: list[dict[str, Any]], genres: list[dict[str, Any]]
+    ) -> None:
+        """
+        Правит имена изменённых персон и названия жанров прямо
+        в документах фильмов.
+
+        Правка запускается для каждой изменённой персоны и жанра:
+        документы персон и жанров перезаписываются и без правки фильмов,
+        поэтому по ним нельзя судить, устарели ли имена в фильмах.
+        Фильмы с актуальными именами не перезаписываются.
+
+        Отпечатки этих фильмов не пересчитываются: они отстают только на
+        переименование, а документ из БД совпадёт со старым отпечатком
+        лишь после обратного переименования, которое тоже правится здесь.
+        """
+        person_names = {
+            str(person["id"]): person["full_name"] for person in persons
+        }
+        genre_names = {str(genre["id"]): genre["name"] for genre in genres}
+        for target, _ in self.index_targets("movies"):
+            if person_names:
+                self.loader.rename_persons(target, person_names)
+            if genre_names:
+                self.loader.rename_genres(target, genre_names)
+
+    def refresh_film_persons(
+        self, filmwork_ids: list[str], skip_ids: set[str]
+    ) -> None:
+        """
+        Обновляет документы персон, в которых упомянуты изменённые фильмы.
+
+        В документах персон хранятся название и рейтинг фильмов, поэтому
+        изменение фильма затрагивает всех его участников. К персонам из БД
+        добавляются персоны, в документах которых фильм ещё числится:
+        так из них уходят фильмы, с которыми персона больше не связана.
+        Персоны берутся из всех шардов - их обновляет шард фильма.
+
+        :param skip_ids: id персон, которые и так загружаются в этом проходе.
+        """
+        if not filmwork_ids:
+            return
+        person_ids = set(
+            self.extractor.fetch_person_ids_by_filmworks(filmwork_ids)
+        )
+        person_ids |= self.loader.find_persons_by_films(
+            self.indices["persons"], filmwork_ids
+        )
+        person_ids = sorted(person_ids - skip_ids)
+        self.reload_persons(person_ids)
+        if person_ids:
+            logging.info(
+                f"Обновлены документы {len(person_ids)} персон "
+                f"из {len(filmwork_ids)} изменённых фильмов."
+            )
+
+    def reload_persons(self, person_ids: list[str]) -> None:
+        """Перечитывает персон из всех шардов и загружает их документы."""
+        if self.pipeline is not None:
+            self.pipeline.load(
+                "persons",
+                self.write_targets("persons"),
+                person_ids,
+                self.extract_size("person"),
             )
+            return
+        for chunk in self.extract_chunks(person_ids, "person"):
+            persons = self.extractor.fetch_persons_by_ids(
+                chunk, any_shard=True
+            )
+            if persons:
+                self.load("persons", Transformer.transform(persons, "persons"))
+
+    def process_filmworks(self, filmwork_ids: list[str]) -> None:
+        try:
+            if self.pipeline is not None:
+                self.pipeline.load(
+                    "movies",
+                    self.write_targets("movies"),
+                    filmwork_ids,
+                    self.extract_size("film_work"),
+                )
+                logging.info("Индексы обновлены!")
+                return
+            if self.extractor.streaming:
+                if self.stream_filmworks(filmwork_ids) is None:
+                    logging.warning("Нет данных для обработки.")
+                    return
+                logging.info("Индексы обновлены!")
+                return
+            for chunk in self.extract_chunks(filmwork_ids, "film_work"):
+                full_filmwork_data = self.extractor.fetch_movies(chunk)
+                if not full_filmwork_data:
+                    logging.warning("Нет данных для обработки.")
+                    continue
+                transformed_data = Transformer.transform(
+                    full_filmwork_data, self.extractor.movies_data_type
+                )
+                self.load("movies", transformed_data)
+                logging.info("Индексы обновлены!")
         except (
             RedisError,
             ConnectionError,
@@ -262,21 +712,77 @@ class ETLProcess:
             )
             raise
 
-    def update_last_modified(
-        self, last_modified_times: dict[str, datetime | None]
+    def stream_filmworks(
+        self, filmwork_ids: list[str] | None = None
+    ) -> tuple[datetime, str] | None:
+        """
+        Потоково переиндексирует фильмы: строки из серверного курсора
+        по одной проходят через Transformer в Loader.
+
+        :return: Наибольшая пара (modified, id) среди обработанных фильмов.
+        """
+        watermark: dict[str, tuple[datetime, str] | None] = {"last": None}
+
+        def track_watermark(rows: Iterator[dict[str, Any]]):
+            for row in rows:
+                position = (row["modified"], str(row["id"]))
+                if watermark["last"] is None or position > watermark["last"]:
+                    watermark["last"] = position
+                yield row
+
+        raw_data = self.extractor.iter_movies(filmwork_ids)
+        self.load(
+            "movies",
+            Transformer.transform_stream(
+                track_watermark(raw_data), self.extractor.movies_data_type
+            ),
+        )
+        return watermark["last"]
+
+    def reload_movies(self) -> None:
+        """Полностью перезаливает фильмы текущего шарда одним потоком."""
+        last_position = self.stream_filmworks()
+        if last_position is not None:
+            self.redis_manager.set_watermark(
+                self.state_key("film_work"), *last_position
+            )
+        logging.info("Индекс фильмов полностью перезалит.")
+
+    def update_watermarks(
+        self, batches: dict[str, list[dict[str, Any]]]
     ) -> None:
-        for table, modified_time in last_modified_times.items():
-            if modified_time is not None:
-                modified_time = self.convert_to_datetime(modified_time)
-                self.redis_manager.set_last_modified(table, modified_time)
-        logging.debug(
-            "Обновлены временные метки для всех таблиц: {}".format(
-                [
-                    self.redis_manager.get_last_modified(key)
-                    for key in self.tables.keys()
-                ]
+        """
+        Сдвигает метки на последнюю обработанную строку каждой пачки.
+
+        Метки всех таблиц записываются атомарно и только пока экземпляр
+        владеет арендой шарда, захваченной с последним номером: если шард
+        уже перешёл к другому экземпляру, метки не сдвигаются, и новый
+        владелец повторит эти пачки.
+        """
+        watermarks = {
+            self.state_key(table): (
+                self.convert_to_datetime(rows[-1]["modified"]),
+                rows[-1]["id"],
             )
+            for table, rows in batches.items()
+            if rows
+        }
+        lease_name = (
+            self.lease_name(self.shard) if self.shard is not None else None
         )
+        if not self.redis_manager.set_watermarks(
+            watermarks,
+            lease_name,
+            self.worker_id,
+            SHARD_LEASE_TTL,
+            self.fencing_token,
+        ):
+            logging.warning(
+                f"Метки шарда {self.shard} не сохранены: аренда потеряна "
+                "или Redis недоступен."
+            )
+            return
+        logging.debug(f"Обновлены метки: {watermarks}")
 
     def convert_to_datetime(self, modified_time: Any) -> datetime | None:
         if isinstance(modified_time, str):
@@ -284,40 +790,829 @@ class ETLProcess:
         return modified_time
 
     def start(self) -> None:
-        last_modified_times = self.get_last_modified_times()
+        """
+        Рабочий цикл экземпляра ETL.
+
+        Экземпляр арендует в Redis свободный шард и обрабатывает только
+        фильмы, персоны и жанры, чьи id попадают в этот шард по хешу,
+        и только события outbox об этих объектах.
+        Пока свободных шардов нет, экземпляр ждёт в резерве и подхватывает
+        шард упавшего экземпляра после истечения его аренды, а шард
+        остановленного экземпляра - сразу.
+        """
+        if self.listener is not None:
+            # подписка до первого прохода, чтобы не пропустить изменения
+            self.listener.listen()
+        # захват шарда и версия индексов, для которых метки уже проверены
+        checked: tuple[int, int] | None = None
+        try:
+            while True:
+                self.refresh_version()
+                if not self.hold_shard():
+                    time.sleep(SHARD_LEASE_TTL / 3)
+                    continue
+                if checked != (self.fencing_token, self.version):
+                    self.ensure_watermarks()
+                    checked = (self.fencing_token, self.version)
+                if CHANGE_CAPTURE == "outbox":
+                    has_backlog = self.run_outbox_process()
+                else:
+                    self.prune_outbox()
+                    has_backlog = self.run_etl_process()
+                if has_backlog and CATCH_UP_MODE:
+                    logging.debug(
+                        "Остались необработанные изменения, продолжаем."
+                    )
+                    continue
+                self.wait_for_changes()
+        finally:
+            self.release_shard()
+            if self.pipeline is not None:
+                self.pipeline.close()
+
+    def prune_outbox(self) -> None:
+        """
+        Удаляет устаревшие события outbox своего шарда в режиме
+        timestamps, не чаще раза в OUTBOX_PRUNE_INTERVAL секунд.
+
+        Очередь в этом режиме не разбирается, но триггеры её заполняют.
+        Ошибка очистки не мешает проходу: она повторится в следующий раз.
+        """
+        now = time.monotonic()
         if (
-            any(value is not True for value in last_modified_times.values())
-            or self.initialize
+            self.outbox_pruned_at is not None
+            and now - self.outbox_pruned_at < OUTBOX_PRUNE_INTERVAL
+        ):
+            return
+        self.outbox_pruned_at = now
+        try:
+            deleted = self.extractor.prune_outbox(OUTBOX_RETENTION)
+        except Exception as e:
+            logging.warning(f"Очистка outbox не удалась: {e}")
+            return
+        if deleted:
+            logging.info(f"Из outbox удалено {deleted} устаревших событий.")
+
+    @backoff.on_exception(
+        backoff.expo,
+        (ConnectionError, RedisError, NewConnectionError),
+        max_time=MAX_BACKOFF,
+        max_tries=MAX_RETRIES,
+        jitter=backoff.random_jitter,
+    )
+    def prepare(self) -> bool:
+        """
+        Создаёт индексы перед запуском обработчиков.
+
+        Если индексов ещё нет, заводится первая версия за псевдонимами.
+        Индексы старого формата, без версий, обслуживаются как есть,
+        пока пересборка не заменит их псевдонимами.
+
+        :return: True, если индексы созданы с нуля.
+        """
+        prepare_lease = f"{self.process_name}:prepare"
+        if not self.redis_manager.acquire_lease(
+            prepare_lease, self.worker_id, SHARD_LEASE_TTL
+        ):
+            logging.info("Процесс уже запущен другим экземпляром.")
+            return False
+        heartbeat = Heartbeat(
+            lambda: self.redis_manager.renew_lease(
+                prepare_lease, self.worker_id, SHARD_LEASE_TTL
+            ),
+            SHARD_LEASE_TTL / 3,
+        )
+        try:
+            heartbeat.start()
+            self.refresh_version()
+            created = not any(
+                self.loader.index_exists(index) for index in self.schemas
+            )
+            if created:
+                self.version = self.next_version()
+                self.clear_state(self.version)
+                self.redis_manager.set_version(self.version_key, self.version)
+            for index in self.schemas:
+                self.initialize_index(index)
+            return created
+        finally:
+            heartbeat.stop()
+            self.redis_manager.release_lease(prepare_lease, self.worker_id)
+
+    @backoff.on_exception(
+        backoff.expo,
+        (ConnectionError, RedisError, NewConnectionError),
+        max_time=MAX_BACKOFF,
+        max_tries=MAX_RETRIES,
+        jitter=backoff.random_jitter,
+    )
+    def refresh_version(self) -> None:
+        """
+        Перечитывает из Redis версию живых и строящихся индексов.
+
+        Ошибка Redis повторяется и поднимается, а не принимается
+        за отсутствие версии.
+        """
+        version = self.redis_manager.get_version(self.version_key)
+        if version is None:
+            # Redis мог потерять версию: восстанавливаем её по псевдонимам
+            versions = self.loader.get_index_versions("movies")
+            if versions and self.loader.alias_exists("movies"):
+                live = self.loader.es.indices.get_alias(name="movies")
+                version = next(
+                    (
+                        number
+                        for number, name in versions.items()
+                        if name in live
+                    ),
+                    None,
+                )
+        if (version or 0) != self.version:
+            logging.info(f"Версия индексов: {version or 0}.")
+        self.version = version or 0
+        self.building = (
+            self.redis_manager.get_version(self.building_key)
+            if CHANGE_CAPTURE == "outbox"
+            else None
+        )
+
+    def replay_dead_letters(self) -> int:
+        """
+        Повторно загружает документы из очереди недоставленных.
+
+        Документы не отправляются из писем как есть, а перечитываются из
+        БД: после исправления данных или маппинга в индекс попадёт
+        актуальное состояние, а удалённые объекты будут удалены. Снова
+        отклонённые документы загрузчик вернёт в очередь.
+
+        :return: Количество писем, взятых из очереди.
+        """
+        self.refresh_version()
+        letters = self.redis_manager.get_dead_letters(DEAD_LETTERS_KEY)
+        by_index: dict[str, list[str]] = {}
+        for letter_id, letter in letters.items():
+            by_index.setdefault(letter["index"], []).append(letter_id)
+        for index, letter_ids in by_index.items():
+            for start in range(0, len(letter_ids), self.batch_size):
+                chunk = letter_ids[start : start + self.batch_size]
+                ids = [letters[letter_id]["id"] for letter_id in chunk]
+                self.redis_manager.remove_dead_letters(DEAD_LETTERS_KEY, chunk)
+                try:
+                    self.resync(index, ids)
+                except Exception:
+                    # пачка не загружена: письма возвращаются в очередь
+                    self.redis_manager.add_dead_letters(
+                        DEAD_LETTERS_KEY,
+                        {
+                            letter_id: json.dumps(
+                                letters[letter_id], ensure_ascii=False
+                            )
+                            for letter_id in chunk
+                        },
+                    )
+                    raise
+            logging.info(
+                f"Из очереди недоставленных перечитано {len(letter_ids)} "
+                f"документов '{index}'."
+            )
+        self.observe_dead_letters()
+        return len(letters)
+
+    def resync(self, index: str, ids: list[str]) -> None:
+        """Перечитывает объекты индекса из БД и обновляет их документы."""
+        if index == "movies":
+            self.sync_movies(ids)
+        elif index == "persons":
+            self.sync_index(
+                "persons",
+                ids,
+                self.extractor.fetch_persons_by_ids(ids, any_shard=True),
+                "persons",
+            )
+        else:
+            self.sync_index(
+                "genres",
+                ids,
+                self.extractor.fetch_genres_by_ids(ids),
+                "genres",
+            )
+
+    def backfill(self) -> None:
+        """
+        Возобновляемая перезаливка индексов по диапазонам первичных ключей.
+
+        Таблицы обходятся по возрастанию id, объекты каждой пачки
+        перечитываются из БД и загружаются через псевдонимы рядом
+        с работающими обработчиками, не быстрее BACKFILL_RATE строк
+        в секунду. После каждой загруженной пачки курсор и счётчики
+        сохраняются в Redis: перезапуск продолжает с места остановки,
+        а законченная перезаливка стирает контрольную точку. Отпечатки
+        не сверяются: документ, потерянный в индексе, отправляется, даже
+        если его отпечаток в Redis совпадает.
+        """
+        backfill_lease = f"{self.process_name}:backfill"
+        if not self.redis_manager.acquire_lease(
+            backfill_lease, self.worker_id, SHARD_LEASE_TTL
+        ):
+            logging.info("Перезаливка уже идёт в другом экземпляре.")
+            return
+        heartbeat = Heartbeat(
+            lambda: self.redis_manager.renew_lease(
+                backfill_lease, self.worker_id, SHARD_LEASE_TTL
+            ),
+            SHARD_LEASE_TTL / 3,
+        )
+        checkpoint = self.redis_manager.get_checkpoint(self.backfill_key)
+        if checkpoint:
+            logging.info("Перезаливка продолжается с контрольной точки.")
+        checkpoint = checkpoint or {}
+        self.loader.fingerprints = None
+        started = time.monotonic()
+        processed = 0
+        try:
+            heartbeat.start()
+            for table, index in self.table_indices.items():
+                progress = checkpoint.setdefault(
+                    table, {"last_id": MIN_UUID, "rows": 0, "done": False}
+                )
+                if progress["done"]:
+                    continue
+                progress.setdefault("total", self.extractor.count_rows(table))
+                while ids := self.extractor.fetch_ids_after(
+                    table, progress["last_id"], self.extract_size(table)
+                ):
+                    # за время перезаливки могла начаться пересборка
+                    # или смениться живая версия индексов
+                    self.refresh_version()
+                    self.resync(index, ids)
+                    if heartbeat.lost:
+                        raise RuntimeError("Аренда перезаливки потеряна.")
+                    progress["last_id"] = ids[-1]
+                    progress["rows"] += len(ids)
+                    self.redis_manager.set_checkpoint(
+                        self.backfill_key, checkpoint
+                    )
+                    logging.info(
+                        f"Перезаливка '{index}': {progress['rows']} "
+                        f"из {progress['total']} строк."
+                    )
+                    processed += len(ids)
+                    if BACKFILL_RATE > 0:
+                        time.sleep(
+                            max(
+                                processed / BACKFILL_RATE
+                                - (time.monotonic() - started),
+                                0,
+                            )
+                        )
+                progress["done"] = True
+                self.redis_manager.set_checkpoint(
+                    self.backfill_key, checkpoint
+                )
+            self.redis_manager.clear_checkpoint(self.backfill_key)
+        finally:
+            heartbeat.stop()
+            self.redis_manager.release_lease(backfill_lease, self.worker_id)
+        logging.info("Перезаливка индексов завершена.")
+
+    def next_version(self) -> int:
+        """Номер, больший номеров живой и всех существующих версий."""
+        versions = [self.version]
+        for index in self.schemas:
+            versions.extend(self.loader.get_index_versions(index))
+        return max(versions) + 1
+
+    def rebuild_indices(self) -> None:
+        """
+        Пересобирает индексы без простоя (blue/green).
+
+        Новая версия индексов заполняется с нуля по собственным меткам,
+        пока рабочие процессы обновляют живые индексы через псевдонимы.
+        Догнав изменения, сборщик повторно применяет события outbox,
+        обработанные за время сборки, передаёт свои метки всем шардам
+        новой версии, атомарно переключает псевдонимы и удаляет старые
+        версии.
+        """
+        rebuild_lease = f"{self.process_name}:rebuild"
+        if not self.redis_manager.acquire_lease(
+            rebuild_lease, self.worker_id, SHARD_LEASE_TTL
+        ):
+            logging.info("Пересборка индексов уже идёт в другом экземпляре.")
+            return
+        self.refresh_version()
+        self.building = None
+        self.version = self.next_version()
+        self.indices = {
+            index: versioned_index_name(index, self.version)
+            for index in self.schemas
+        }
+        logging.info(f"Сборка версии индексов {self.version}.")
+        heartbeat = Heartbeat(
+            lambda: self.keep_building(rebuild_lease), SHARD_LEASE_TTL / 3
+        )
+        try:
+            for index, schema in self.schemas.items():
+                self.loader.create_index(self.indices[index], schema)
+            self.keep_building(rebuild_lease)
+            heartbeat.start()
+            if BULK_INITIAL_LOAD:
+                self.bulk_load()
+            else:
+                self.reset_last_modified()
+                if self.extractor.streaming:
+                    self.reload_movies()
+            self.catch_up(heartbeat)
+            self.loader.swap_aliases(self.indices)
+            self.redis_manager.set_version(self.version_key, self.version)
+        except Exception as e:
+            logging.error(
+                f"Пересборка версии {self.version} прервана: {e}",
+                exc_info=True,
+            )
+            for index_name in self.indices.values():
+                self.loader.delete_index(index_name)
+            self.clear_state(self.version)
+            raise
+        finally:
+            heartbeat.stop()
+            self.redis_manager.clear_version(self.building_key)
+            self.redis_manager.release_lease(rebuild_lease, self.worker_id)
+        logging.info(f"Псевдонимы переключены на версию {self.version}.")
+        self.collect_garbage(self.version)
+
+    def catch_up(self, heartbeat: Heartbeat) -> None:
+        """
+        Догоняет изменения в собираемой версии и передаёт метки шардам.
+
+        Сборщик дочитывает таблицы по своим меткам, в режиме outbox
+        повторно применяет события, обработанные за время сборки,
+        и ставит достигнутые метки всем шардам новой версии.
+        """
+        while self.run_etl_process():
+            if heartbeat.lost:
+                raise RuntimeError("Аренда пересборки потеряна.")
+        if heartbeat.lost:
+            raise RuntimeError("Аренда пересборки потеряна.")
+        if self.last_error is not None:
+            raise RuntimeError("Проход ETL завершился ошибкой.")
+        if CHANGE_CAPTURE == "outbox":
+            self.replay_changes()
+        watermarks = self.get_watermarks()
+        self.redis_manager.set_watermarks(
+            {
+                key: (self.convert_to_datetime(modified), last_id)
+                for table, (modified, last_id) in watermarks.items()
+                for key in self.state_keys(table)
+            }
+        )
+
+    def keep_building(self, lease: str) -> bool:
+        """
+        Объявляет строящуюся версию и продлевает аренду сборки.
+
+        Пока версия объявлена, обработчики очереди изменений пишут
+        и в её индексы.
+        """
+        self.redis_manager.set_version(
+            self.building_key, self.version, SHARD_LEASE_TTL
+        )
+        return self.redis_manager.renew_lease(
+            lease, self.worker_id, SHARD_LEASE_TTL
+        )
+
+    def copy_sources(self) -> dict[str, tuple[Any, str]]:
+        """Выгрузка записей каждого индекса через COPY и их тип данных."""
+        return {
+            "genres": (self.extractor.copy_genres, "genres"),
+            "persons": (self.extractor.copy_persons, "persons"),
+            "movies": (
+                self.extractor.copy_filmwork_documents,
+                "movie_documents",
+            ),
+        }
+
+    def bulk_load(self) -> None:
+        """
+        Быстрая первичная загрузка всех индексов.
+
+        Каталог выгружается из PostgreSQL через COPY и потоком проходит
+        через Transformer в индексы, у которых на время загрузки отключены
+        refresh и реплики. Метки всех шардов и сборщика ставятся на начало
+        выгрузки с запасом INITIAL_LOAD_SAFETY_MARGIN: изменения, сделанные
+        во время загрузки, дочитает инкрементальный ETL.
+        """
+        started = self.extractor.fetch_db_time() - timedelta(
+            seconds=INITIAL_LOAD_SAFETY_MARGIN
+        )
+        for index, (copy_records, data_type) in self.copy_sources().items():
+            with self.loader.bulk_load_settings(self.indices[index]):
+                self.loader.load_data(
+                    self.indices[index],
+                    Transformer.transform_stream(copy_records(), data_type),
+                    self.fingerprint_key(index, self.version),
+                )
+        self.redis_manager.set_watermarks(
+            {
+                key: (started, MIN_UUID)
+                for table in self.tables
+                for key in self.state_keys(table)
+            }
+        )
+        logging.info(f"Первичная загрузка завершена, метки: {started}.")
+
+    def export_snapshot(self, directory: str) -> None:
+        """
+        Выгружает документы всех индексов в каталог directory.
+
+        Документы собираются, как при первичной загрузке, и пишутся
+        сжатыми файлами NDJSON по SNAPSHOT_CHUNK_DOCUMENTS штук, индексы -
+        параллельно. Рядом сохраняются схемы индексов и манифест с метками
+        на начало выгрузки с запасом INITIAL_LOAD_SAFETY_MARGIN.
+        """
+        path = Path(directory)
+        archive.prepare_directory(path)
+        started = self.extractor.fetch_db_time() - timedelta(
+            seconds=INITIAL_LOAD_SAFETY_MARGIN
+        )
+        sources = self.copy_sources()
+        with ThreadPoolExecutor(len(sources)) as pool:
+            futures = {
+                index: pool.submit(
+                    archive.write_index,
+                    path,
+                    index,
+                    Transformer.transform_stream(copy_records(), data_type),
+                    SNAPSHOT_CHUNK_DOCUMENTS,
+                )
+                for index, (copy_records, data_type) in sources.items()
+            }
+            indices = {
+                index: future.result() for index, future in futures.items()
+            }
+        archive.save_manifest(
+            path,
+            self.schemas,
+            {table: (started, MIN_UUID) for table in self.tables},
+            indices,
+        )
+        logging.info(
+            f"Выгрузка в '{directory}' завершена: "
+            + ", ".join(
+                f"{index} {entry['documents']}"
+                for index, entry in indices.items()
+            )
+            + f", метки: {started}."
+        )
+
+    def import_snapshot(self, directory: str) -> None:
+        """
+        Загружает выгрузку export_snapshot в новую версию индексов.
+
+        Индексы создаются по схемам из выгрузки, а её файлы загружаются
+        в SNAPSHOT_WORKERS потоков в режиме массовой загрузки. Затем,
+        как при пересборке, новая версия догоняет БД: документы объектов,
+        удалённых после выгрузки, удаляются, изменённые строки
+        дочитываются от меток манифеста, а в режиме outbox повторно
+        применяются события, обработанные во время загрузки. Только
+        после этого псевдонимы атомарно переключаются на новую версию.
+
+        События outbox, разобранные между выгрузкой и загрузкой, попали
+        только в прежнюю версию. Смену одних лишь связей (строки
+        person_film_work и genre_film_work без изменения самих объектов)
+        дочитывание по меткам не видит, как и в режиме timestamps.
+        """
+        path = Path(directory)
+        manifest = archive.load_manifest(path)
+        schemas = archive.load_schemas(path)
+        if manifest["indices"].keys() != self.schemas.keys():
+            raise archive.SnapshotError(
+                f"Индексы выгрузки {sorted(manifest['indices'])} "
+                f"не совпадают с {sorted(self.schemas)}."
+            )
+        rebuild_lease = f"{self.process_name}:rebuild"
+        if not self.redis_manager.acquire_lease(
+            rebuild_lease, self.worker_id, SHARD_LEASE_TTL
         ):
-            for schema in self.schemas.keys():
-                self.initialize_index(schema)
-            self.reset_last_modified()
-        while True:
-            self.run_etl_process()
-            interval = random.uniform(0.5, 0.9)
-            time.sleep(interval)
-            logging.debug(f"Refresh {interval} seconds")
+            logging.info("Пересборка индексов уже идёт в другом экземпляре.")
+            return
+        self.refresh_version()
+        self.building = None
+        self.version = self.next_version()
+        self.indices = {
+            index: versioned_index_name(index, self.version)
+            for index in self.schemas
+        }
+        logging.info(f"Загрузка '{directory}' в версию {self.version}.")
+        heartbeat = Heartbeat(
+            lambda: self.keep_building(rebuild_lease), SHARD_LEASE_TTL / 3
+        )
+        parts = [
+            (index, part)
+            for index, entry in manifest["indices"].items()
+            for part in entry["files"]
+        ]
+        try:
+            for index in self.schemas:
+                self.loader.create_index(self.indices[index], schemas[index])
+            self.keep_building(rebuild_lease)
+            heartbeat.start()
+            loaded = dict.fromkeys(self.schemas, 0)
+            with ExitStack() as stack:
+                for index_name in self.indices.values():
+                    stack.enter_context(
+                        self.loader.bulk_load_settings(index_name)
+                    )
+                with ThreadPoolExecutor(SNAPSHOT_WORKERS) as pool:
+                    for index, stats in pool.map(
+                        lambda job: self.load_snapshot_part(path, *job),
+                        parts,
+                    ):
+                        loaded[index] += stats.succeeded
+            if heartbeat.lost:
+                raise RuntimeError("Аренда пересборки потеряна.")
+            for index, entry in manifest["indices"].items():
+                if loaded[index] != entry["documents"]:
+                    raise RuntimeError(
+                        f"В '{index}' загружено {loaded[index]} "
+                        f"документов из {entry['documents']}."
+                    )
+            self.remove_deleted()
+            # изменения после выгрузки дочитываются от меток манифеста
+            self.redis_manager.set_watermarks(
+                {
+                    self.state_key(table): watermark
+                    for table, watermark in manifest["watermarks"].items()
+                }
+            )
+            self.catch_up(heartbeat)
+            self.loader.swap_aliases(self.indices)
+            self.redis_manager.set_version(self.version_key, self.version)
+        except Exception as e:
+            logging.error(
+                f"Загрузка версии {self.version} прервана: {e}",
+                exc_info=True,
+            )
+            for index_name in self.indices.values():
+                self.loader.delete_index(index_name)
+            self.clear_state(self.version)
+            raise
+        finally:
+            heartbeat.stop()
+            self.redis_manager.clear_version(self.building_key)
+            self.redis_manager.release_lease(rebuild_lease, self.worker_id)
+        logging.info(f"Псевдонимы переключены на версию {self.version}.")
+        self.collect_garbage(self.version)
+
+    def remove_deleted(self) -> None:
+        """
+        Удаляет из собираемой версии документы объектов, которых
+        в БД уже нет: дочитывание по меткам удалённых строк не видит.
+        """
+        checker = ConsistencyChecker(self.extractor, self.loader)
+        for table, index in self.table_indices.items():
+            extra = checker.check(table, self.indices[index]).extra
+            if extra:
+                self.delete(index, extra)
+                logging.info(f"Удалено {len(extra)} документов '{index}'.")
+
+    def load_snapshot_part(
+        self, path: Path, index: str, part: dict[str, Any]
+    ) -> tuple[str, Any]:
+        """Загружает один файл выгрузки в индекс новой версии."""
+        stats = self.loader.load_data(
+            self.indices[index],
+            archive.read_part(path, part),
+            self.fingerprint_key(index, self.version),
+        )
+        logging.info(f"Загружен '{part['name']}': {stats.succeeded}.")
+        return index, stats
+
+    def collect_garbage(self, live_version: int) -> None:
+        """
+        Удаляет версии индексов старше INDEX_VERSIONS_KEEP предыдущих,
+        недостроенные версии и метки удалённых версий.
+        """
+        stale: set[int] = set()
+        for index in self.schemas:
+            for version, index_name in self.loader.get_index_versions(
+                index
+            ).items():
+                if (
+                    version < live_version - INDEX_VERSIONS_KEEP
+                    or version > live_version
+                ):
+                    self.loader.delete_index(index_name)
+                    stale.add(version)
+        if live_version - INDEX_VERSIONS_KEEP > 0:
+            stale.add(0)
+        for version in stale:
+            self.clear_state(version)
+
+    def clear_state(self, version: int) -> None:
+        """
+        Удаляет метки всех таблиц и шардов, отпечатки и изменения,
+        запомненные во время сборки версии индексов.
+        """
+        self.redis_manager.clear_changes(self.changes_key(version))
+        for index in self.schemas:
+            self.redis_manager.clear_fingerprints(
+                self.fingerprint_key(index, version)
+            )
+        for table in self.tables:
+            for key in self.state_keys(table, version):
+                self.redis_manager.clear_watermark(key)
+
+    @backoff.on_exception(
+        backoff.expo,
+        (ConnectionError, RedisError, NewConnectionError),
+        max_time=MAX_BACKOFF,
+        max_tries=MAX_RETRIES,
+        jitter=backoff.random_jitter,
+    )
+    def ensure_watermarks(self) -> None:
+        """
+        Загружает шард с начала времён, если у него нет меток.
+
+        Проверяется только отсутствие ключей: ошибка Redis поднимается
+        и повторяется, а не принимается за пустые метки.
+        """
+        if any(value is None for value in self.get_watermarks().values()):
+            self.load_shard()
+
+    def load_shard(self) -> None:
+        """Первичная загрузка шарда с начала времён."""
+        logging.info(f"Первичная загрузка шарда {self.shard}.")
+        self.reset_last_modified()
+        if self.extractor.streaming:
+            self.reload_movies()
+        if CHANGE_CAPTURE == "outbox":
+            # первичная загрузка идёт по меткам времени, дальше - по очереди
+            while self.run_etl_process() and self.hold_shard():
+                pass
+
+    def hold_shard(self) -> bool:
+        """
+        Проверяет аренду своего шарда или захватывает свободный.
+
+        Аренду продлевает фоновый поток, поэтому проверка не обращается
+        к Redis; шард, аренду которого продлить не удалось, отпускается.
+        """
+        if self.shard is not None:
+            if not self.heartbeat.lost:
+                return True
+            logging.warning(f"Аренда шарда {self.shard} потеряна.")
+            self.heartbeat.stop()
+            self.set_shard(None)
+        shards = list(range(SHARDS))
+        random.shuffle(shards)
+        for shard in shards:
+            token = self.redis_manager.acquire_lease(
+                self.lease_name(shard), self.worker_id, SHARD_LEASE_TTL
+            )
+            if token:
+                logging.info(
+                    f"Экземпляр {self.worker_id} взял шард {shard}, "
+                    f"номер захвата {token}."
+                )
+                self.fencing_token = token
+                self.set_shard(shard)
+                self.heartbeat.start()
+                return True
+        return False
+
+    def renew_shard(self) -> bool:
+        """Продлевает аренду своего шарда; вызывается фоновым потоком."""
+        shard = self.shard
+        if shard is None:
+            return True
+        return self.redis_manager.renew_lease(
+            self.lease_name(shard), self.worker_id, SHARD_LEASE_TTL
+        )
+
+    def release_shard(self) -> None:
+        """Отпускает шард, чтобы резервный экземпляр сразу его подхватил."""
+        self.heartbeat.stop()
+        if self.shard is not None:
+            self.redis_manager.release_lease(
+                self.lease_name(self.shard), self.worker_id
+            )
+            logging.info(f"Шард {self.shard} освобождён.")
+            self.set_shard(None)
+
+    def set_shard(self, shard: int | None) -> None:
+        """Запоминает шард; по нему фильтруются таблицы и очередь outbox."""
+        self.shard = shard
+        sharded = shard is not None and SHARDS > 1
+        self.extractor.shard = (shard, SHARDS) if sharded else None
+
+    @property
+    def shard_label(self) -> str:
+        """Шард в метках метрик; у сборщика новой версии шарда нет."""
+        return str(self.shard) if self.shard is not None else ""
+
+    def lease_name(self, shard: int) -> str:
+        return f"{self.process_name}:shard{shard}"
+
+    def wait_for_changes(self) -> None:
+        """Ждёт уведомления об изменениях или делает паузу опроса."""
+        if self.listener is not None:
+            notified = self.listener.wait(NOTIFY_FALLBACK_TIMEOUT)
+            logging.debug(
+                "Получено уведомление об изменениях."
+                if notified
+                else "Уведомлений нет, плановый проход."
+            )
+            return
+        interval = random.uniform(0.5, 0.9)
+        time.sleep(interval)
+        logging.debug(f"Refresh {interval} seconds")
 
     def reset_last_modified(self) -> None:
         initial_timestamp = datetime(1970, 1, 1, 0, 0)
-        self.redis_manager.set_last_modified("film_work", initial_timestamp)
-        self.redis_manager.set_last_modified("genre", initial_timestamp)
-        self.redis_manager.set_last_modified("person", initial_timestamp)
+        self.redis_manager.set_watermarks(
+            {
+                self.state_key(table): (initial_timestamp, MIN_UUID)
+                for table in self.tables
+            }
+        )
+
+
+def exit_on_sigterm(signum: int, frame: Any) -> None:
+    """Завершает процесс штатно, чтобы он успел освободить аренду."""
+    sys.exit(0)
 
 
-def start_etl_process(redis_config: dict[str, Any], first_time: bool) -> None:
-    etl_process = ETLProcess(redis_config, first_time=first_time)
+def start_etl_process(redis_config: dict[str, Any]) -> None:
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
+    etl_process = ETLProcess(redis_config)
     etl_process.start()
 
 
+def spawn_worker(redis_config: dict[str, Any]) -> Process:
+    """Запускает процесс-обработчик."""
+    process = Process(target=start_etl_process, args=(redis_config,))
+    process.start()
+    return process
+
+
+def rebuild_indices(redis_config: dict[str, Any]) -> None:
+    ETLProcess(redis_config).rebuild_indices()
+
+
+def replay_dead_letters(redis_config: dict[str, Any]) -> None:
+    ETLProcess(redis_config).replay_dead_letters()
+
+
+def backfill(redis_config: dict[str, Any]) -> None:
+    # по SIGTERM аренда освобождается, и перезапуск не ждёт её истечения
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
+    ETLProcess(redis_config).backfill()
+
+
 if __name__ == "__main__":
-    processes: list[Process] = []
-    for _ in range(1):
-        process = Process(
-            target=start_etl_process,
-            args=(REDIS_CONFIG, FIRST_TIME_STARTED),
-        )
-        processes.append(process)
-        process.start()
-    for process in processes:
-        process.join()
+    if sys.argv[1:] == ["rebuild"]:
+        # разовая пересборка рядом с работающими обработчиками
+        rebuild_indices(REDIS_CONFIG)
+        sys.exit()
+    if sys.argv[1:] == ["replay"]:
+        # повторная загрузка отложенных документов
+        replay_dead_letters(REDIS_CONFIG)
+        sys.exit()
+    if sys.argv[1:] == ["backfill"]:
+        # перезаливка с контрольными точками рядом с обработчиками
+        backfill(REDIS_CONFIG)
+        sys.exit()
+    # до первого обращения к метрикам, которое создаёт их значения
+    metrics.setup(METRICS_DIR)
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    etl_process = ETLProcess(REDIS_CONFIG)
+    created = etl_process.prepare()
+    if created and BULK_INITIAL_LOAD:
+        etl_process.bulk_load()
+    processes = [spawn_worker(REDIS_CONFIG) for _ in range(WORKERS)]
+
+    def stop_workers(signum: int, frame: Any) -> None:
+        for process in processes:
+            process.terminate()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    if FIRST_TIME_STARTED and not created:
+        rebuild_indices(REDIS_CONFIG)
+    # упавший обработчик перезапускается: при WORKERS == SHARDS резерва
+    # нет, и его шард иначе остался бы без владельца
+    while True:
+        wait([process.sentinel for process in processes])
+        for number, process in enumerate(processes):
+            if process.is_alive():
+                continue
+            process.join()
+            metrics.mark_process_dead(process.pid)
+            logging.warning(
+                f"Обработчик {process.pid} завершился с кодом "
+                f"{process.exitcode}, перезапуск через "
+                f"{WORKER_RESTART_DELAY} с."
+            )
+            time.sleep(WORKER_RESTART_DELAY)
+            processes[number] = spawn_worker(REDIS_CONFIG)
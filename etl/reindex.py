@@ -0,0 +1,250 @@
+"""
+Точечная переиндексация отдельных объектов.
+
+Запуск из каталога etl:
+
+    python reindex.py --ids ID [ID ...]                 # фильмы по id
+    python reindex.py --entity persons --ids-file ids.txt
+    python reindex.py --since 2024-05-01T10:00 --until 2024-05-01T12:00
+    python reindex.py --entity genres                   # все жанры
+    python reindex.py --ids ID --dry-run                # только разница
+
+Объекты выбираются по id, из файла с id (по одному в строке, "-" -
+стандартный ввод), по времени изменения или все объекты сущности.
+Выбранные объекты перечитываются из БД и проходят через Extractor,
+Transformer и Loader, как в инкрементальном проходе: найденные
+документы обновляются, пропавшие из БД - удаляются. Пачки
+обрабатываются параллельно в --workers потоков; метки и аренды
+шардов не затрагиваются. Отпечатки записанных документов не
+проверяются: документ, потерянный или испорченный в индексе,
+отправляется, даже если в БД он не менялся.
+
+С --dry-run в индексы ничего не пишется: для каждого документа
+печатается разница между документом в Elasticsearch и собранным
+заново; порядок элементов списков, как и в отпечатках, не важен.
+"""
+
+import argparse
+import difflib
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Iterator
+
+from config.settings import PG_POOL_MAX_SIZE, REDIS_CONFIG
+from storage.redis_state import MIN_UUID
+
+from etl.loader import encode, fingerprint
+from etl.transformer import Transformer
+from main import ETLProcess
+
+# Индекс -> таблица его объектов
+ENTITIES = {"movies": "film_work", "persons": "person", "genres": "genre"}
+
+
+def read_ids(path: str) -> list[str]:
+    """Читает id по одному в строке; пустые строки и # пропускаются."""
+    file = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with file:
+        return [
+            line.strip()
+            for line in file
+            if line.strip() and not line.startswith("#")
+        ]
+
+
+def select_batches(
+    process: ETLProcess,
+    entity: str,
+    ids: list[str] | None,
+    since: datetime | None,
+    until: datetime | None,
+    batch_size: int,
+) -> Iterator[list[str]]:
+    """Пачки id выбранных объектов."""
+    if ids is not None:
+        for start in range(0, len(ids), batch_size):
+            yield ids[start : start + batch_size]
+        return
+    last_id = MIN_UUID
+    while batch := process.extractor.fetch_ids_after(
+        ENTITIES[entity], last_id, batch_size, since, until
+    ):
+        yield batch
+        last_id = batch[-1]
+
+
+def build_documents(
+    process: ETLProcess, entity: str, ids: list[str]
+) -> list[dict[str, Any]]:
+    """Перечитывает объекты из БД и собирает их документы."""
+    if entity == "movies":
+        return Transformer.transform(
+            process.extractor.fetch_movies(ids),
+            process.extractor.movies_data_type,
+        )
+    if entity == "persons":
+        return Transformer.transform(
+            process.extractor.fetch_persons_by_ids(ids, any_shard=True),
+            "persons",
+        )
+    return Transformer.transform(
+        process.extractor.fetch_genres_by_ids(ids), "genres"
+    )
+
+
+def diff_batch(
+    process: ETLProcess, entity: str, ids: list[str]
+) -> tuple[dict[str, int], list[str]]:
+    """
+    Сравнивает документы в индексе с собранными заново.
+
+    :return: Число документов по исходам и строки разницы для печати.
+    """
+    documents = {
+        str(document["id"]): json.loads(encode(document))
+        for document in build_documents(process, entity, ids)
+    }
+    current = process.loader.get_documents(process.indices[entity], ids)
+    counts = {"changed": 0, "created": 0, "deleted": 0, "unchanged": 0}
+    lines: list[str] = []
+    for doc_id in ids:
+        old, new = current.get(doc_id), documents.get(doc_id)
+        if old is None and new is None:
+            continue
+        if old is not None and new is not None:
+            if fingerprint(old) == fingerprint(new):
+                counts["unchanged"] += 1
+                continue
+        counts[
+            (
+                "created"
+                if old is None
+                else "deleted" if new is None else "changed"
+            )
+        ] += 1
+        lines.extend(
+            difflib.unified_diff(
+                dump(old),
+                dump(new),
+                fromfile=f"es/{entity}/{doc_id}",
+                tofile=f"db/{entity}/{doc_id}",
+                lineterm="",
+            )
+        )
+    return counts, lines
+
+
+def dump(document: dict[str, Any] | None) -> list[str]:
+    """Документ построчно, с упорядоченными ключами и списками."""
+    if document is None:
+        return []
+    return json.dumps(
+        ordered(document), indent=2, sort_keys=True, ensure_ascii=False
+    ).splitlines()
+
+
+def ordered(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: ordered(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return sorted(
+            (ordered(item) for item in value),
+            key=lambda item: json.dumps(item, sort_keys=True),
+        )
+    return value
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--entity", choices=tuple(ENTITIES), default="movies")
+    selector = parser.add_mutually_exclusive_group()
+    selector.add_argument("--ids", nargs="+", help="id объектов")
+    selector.add_argument(
+        "--ids-file", help='файл с id по одному в строке, "-" - stdin'
+    )
+    parser.add_argument(
+        "--since", type=parse_time, help="изменённые не раньше, ISO 8601"
+    )
+    parser.add_argument(
+        "--until", type=parse_time, help="изменённые раньше, ISO 8601"
+    )
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="пачек, обрабатываемых параллельно",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="ничего не записывать, показать разницу документов",
+    )
+    args = parser.parse_args()
+    ids = read_ids(args.ids_file) if args.ids_file else args.ids
+    if ids is not None:
+        ids = list(dict.fromkeys(ids))
+    if ids is not None and (args.since or args.until):
+        parser.error("--since и --until выбирают объекты вместо id")
+
+    process = ETLProcess(REDIS_CONFIG)
+    process.refresh_version()
+    process.loader.fingerprints = None
+    # соединений пула хватает на workers потоков; асинхронный движок
+    # распараллеливает пачку сам и из нескольких потоков не вызывается
+    workers = min(max(args.workers, 1), PG_POOL_MAX_SIZE)
+    if process.pipeline is not None:
+        workers = 1
+    batches = list(
+        select_batches(
+            process, args.entity, ids, args.since, args.until, args.batch_size
+        )
+    )
+    selected = sum(len(batch) for batch in batches)
+    logging.info(
+        f"Выбрано {selected} объектов '{args.entity}', "
+        f"{len(batches)} пачек."
+    )
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            if args.dry_run:
+                totals = dict.fromkeys(
+                    ("changed", "created", "deleted", "unchanged"), 0
+                )
+                for counts, lines in pool.map(
+                    lambda batch: diff_batch(process, args.entity, batch),
+                    batches,
+                ):
+                    for line in lines:
+                        print(line)
+                    for outcome, count in counts.items():
+                        totals[outcome] += count
+                print(
+                    ", ".join(
+                        f"{outcome}: {count}"
+                        for outcome, count in totals.items()
+                    )
+                )
+                return
+            for _ in pool.map(
+                lambda batch: process.resync(args.entity, batch), batches
+            ):
+                pass
+        logging.info(f"Переиндексировано {selected} объектов '{args.entity}'.")
+    finally:
+        if process.pipeline is not None:
+            process.pipeline.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Выгрузка документов индексов в файлы и загрузка обратно.
+
+Запуск из каталога etl:
+
+    python snapshot.py export /snapshots/2024-05-01
+    python snapshot.py import /snapshots/2024-05-01
+
+export собирает документы movies, genres и persons из БД, как первичная
+загрузка, и пишет их в каталог сжатыми файлами NDJSON
+(<индекс>/part-NNNNN.ndjson.gz, по ETL_SNAPSHOT_CHUNK_DOCUMENTS
+документов). Рядом сохраняются схемы индексов (schemas.json)
+и манифест (manifest.json) с метками на начало выгрузки, числом
+документов и суммами sha256 файлов. Манифест пишется последним:
+каталог без него - незавершённая выгрузка.
+
+import создаёт новую версию индексов по схемам из выгрузки, загружает
+файлы в ETL_SNAPSHOT_WORKERS потоков и, как python main.py rebuild,
+догоняет БД до переключения псевдонимов: удаляет документы объектов,
+удалённых после выгрузки, дочитывает изменённые строки от меток
+манифеста и в режиме outbox повторно применяет события, разобранные во
+время загрузки. Смену одних лишь связей фильмов с персонами и жанрами
+между выгрузкой и загрузкой дочитывание по меткам не видит.
+"""
+
+import argparse
+
+from config.settings import REDIS_CONFIG
+
+from main import ETLProcess
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("mode", choices=("export", "import"))
+    parser.add_argument("directory", help="каталог выгрузки")
+    args = parser.parse_args()
+
+    process = ETLProcess(REDIS_CONFIG)
+    try:
+        if args.mode == "export":
+            process.export_snapshot(args.directory)
+        else:
+            process.import_snapshot(args.directory)
+    finally:
+        if process.pipeline is not None:
+            process.pipeline.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import json
 import logging
 from datetime import datetime
 
@@ -5,6 +6,51 @@ import redis
 
 logger = logging.getLogger(__name__)
 
+# Идентификатор, меньший любого UUID: начальная позиция составной метки
+MIN_UUID = "00000000-0000-0000-0000-000000000000"
+
+# Захватить свободную аренду и выдать новый номер захвата (fencing token):
+# номера растут, поэтому запись с номером прежнего владельца распознаётся
+ACQUIRE_LEASE_SCRIPT = """
+if redis.call("SET", KEYS[1], ARGV[1], "NX", "PX", ARGV[2]) then
+    return redis.call("INCR", KEYS[2])
+end
+return 0
+"""
+
+# Продлить аренду, только если она всё ещё принадлежит владельцу
+RENEW_LEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Снять аренду, только если она всё ещё принадлежит владельцу
+RELEASE_LEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# Записать метки, только если аренда всё ещё принадлежит владельцу
+# и захвачена им последней, и заодно продлить её: KEYS[1] - аренда,
+# KEYS[2] - последний выданный номер захвата, остальные ключи - метки
+COMMIT_WATERMARKS_SCRIPT = """
+if redis.call("GET", KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if redis.call("GET", KEYS[2]) ~= ARGV[3] then
+    return 0
+end
+redis.call("PEXPIRE", KEYS[1], ARGV[2])
+for i = 3, #KEYS do
+    redis.call("SET", KEYS[i], ARGV[i + 1])
+end
+return 1
+"""
+
 
 class RedisStateManager:
     def __init__(self, config: dict):
@@ -14,6 +60,18 @@ class RedisStateManager:
         :param config: Конфигурация для подключения к Redis.
         """
         self.redis_client = redis.Redis(**config)
+        self._acquire_lease = self.redis_client.register_script(
+            ACQUIRE_LEASE_SCRIPT
+        )
+        self._renew_lease = self.redis_client.register_script(
+            RENEW_LEASE_SCRIPT
+        )
+        self._release_lease = self.redis_client.register_script(
+            RELEASE_LEASE_SCRIPT
+        )
+        self._commit_watermarks = self.redis_client.register_script(
+            COMMIT_WATERMARKS_SCRIPT
+        )
         logger.info("Redis client initialized with config: %s", config)
 
     def get_last_modified(self, table_name: str) -> str | None:
@@ -63,6 +121,135 @@ class RedisStateManager:
                 "Error setting last_modified for %s: %s", table_name, e
             )
 
+    def get_watermark(self, table_name: str) -> tuple[str, str] | None:
+        """
+        Получить составную метку (modified, id) последней обработанной строки.
+
+        :param table_name: Название таблицы.
+        :return: Пара (время изменения в ISO формате, id) или None.
+        """
+        return self.get_watermarks([table_name])[table_name]
+
+    def get_watermarks(
+        self, table_names: list[str]
+    ) -> dict[str, tuple[str, str] | None]:
+        """
+        Получить составные метки (modified, id) нескольких таблиц одним MGET.
+
+        Если составной метки ещё нет, она строится из старой метки
+        last_modified, чтобы продолжить загрузку с того же места.
+
+        :param table_names: Названия таблиц.
+        :return: Название таблицы -> пара (время изменения в ISO формате,
+            id) или None, если метки нет.
+        :raises RedisError: Redis недоступен.
+        """
+        keys = [f"{name}_watermark" for name in table_names]
+        keys += [f"{name}_last_modified" for name in table_names]
+        # ошибка Redis не означает отсутствия метки: None вызвал бы
+        # первичную загрузку с начала времён, поэтому ошибка поднимается
+        values = self.redis_client.mget(keys) if keys else []
+        result = {}
+        for name, watermark, last_modified in zip(
+            table_names, values, values[len(table_names) :]
+        ):
+            if watermark:
+                data = json.loads(watermark)
+                result[name] = (data["modified"], data["id"])
+            elif last_modified:
+                result[name] = (last_modified.decode("utf-8"), MIN_UUID)
+            else:
+                result[name] = None
+        logger.debug("Retrieved watermarks: %s", result)
+        return result
+
+    def set_watermark(
+        self, table_name: str, timestamp: datetime, last_id: str
+    ) -> None:
+        """
+        Установить составную метку (modified, id) для заданной таблицы.
+
+        :param table_name: Название таблицы.
+        :param timestamp: Время изменения последней обработанной строки.
+        :param last_id: Идентификатор последней обработанной строки.
+        """
+        self.set_watermarks({table_name: (timestamp, last_id)})
+
+    def set_watermarks(
+        self,
+        watermarks: dict[str, tuple[datetime, str]],
+        lease_name: str | None = None,
+        owner: str | None = None,
+        ttl: float | None = None,
+        token: int | None = None,
+    ) -> bool:
+        """
+        Атомарно установить составные метки (modified, id) нескольких таблиц.
+
+        Если передана аренда, метки записываются одним Lua-скриптом только
+        при условии, что аренда всё ещё принадлежит владельцу и её номер
+        захвата - последний выданный, и аренда заодно продлевается.
+        Номер захвата сохраняется вместе с метками. Иначе метки
+        записываются одним MSET.
+
+        :param watermarks: Название таблицы -> (время изменения, id)
+            последней обработанной строки.
+        :param lease_name: Название аренды, которую нужно проверить.
+        :param owner: Идентификатор владельца аренды.
+        :param ttl: Новое время жизни аренды в секундах.
+        :param token: Номер захвата аренды (fencing token).
+        :return: True, если метки записаны.
+        """
+        values = {}
+        for table_name, (timestamp, last_id) in watermarks.items():
+            if not isinstance(timestamp, datetime):
+                logger.error(
+                    "Invalid timestamp: %s. Must be a datetime instance.",
+                    timestamp,
+                )
+                raise ValueError("Timestamp must be a datetime instance.")
+            watermark = {"modified": timestamp.isoformat(), "id": str(last_id)}
+            if token is not None:
+                watermark["token"] = token
+            values[f"{table_name}_watermark"] = json.dumps(watermark)
+        if not values:
+            return True
+        try:
+            if lease_name is None:
+                result = bool(self.redis_client.mset(values))
+            else:
+                result = bool(
+                    self._commit_watermarks(
+                        keys=[
+                            lease_name,
+                            f"{lease_name}:fencing",
+                            *values,
+                        ],
+                        args=[owner, int(ttl * 1000), token, *values.values()],
+                    )
+                )
+            logger.debug("Set watermarks (%s): %s", result, values)
+            return result
+        except Exception as e:
+            logger.error(
+                "Error setting watermarks for %s: %s", list(watermarks), e
+            )
+            return False
+
+    def clear_watermark(self, table_name: str) -> None:
+        """
+        Удалить метки заданной таблицы, чтобы она загрузилась заново.
+
+        :param table_name: Название таблицы.
+        """
+        try:
+            self.redis_client.delete(
+                f"{table_name}_watermark", f"{table_name}_last_modified"
+            )
+            logger.debug("Cleared watermark for %s", table_name)
+        except Exception as e:
+            logger.error("Error clearing watermark for %s: %s", table_name, e)
+
     def set_process_flag(self, process_name: str) -> bool:
         """
         Установить флаг процесса, если он не установлен.
@@ -98,3 +285,301 @@ class RedisStateManager:
                 "Error clearing process flag for %s: %s", process_name, e
             )
             return False
+
+    def acquire_lease(self, lease_name: str, owner: str, ttl: float) -> int:
+        """
+        Захватить аренду, если она свободна.
+
+        Каждый захват получает новый, больший прежних номер (fencing token),
+        по которому отличаются записи нового и прежнего владельцев.
+
+        :param lease_name: Название аренды.
+        :param owner: Идентификатор владельца.
+        :param ttl: Время жизни аренды в секундах.
+        :return: Номер захвата или 0, если аренда занята.
+        """
+        try:
+            token = int(
+                self._acquire_lease(
+                    keys=[lease_name, f"{lease_name}:fencing"],
+                    args=[owner, int(ttl * 1000)],
+                )
+            )
+            logger.debug(
+                "Lease %s acquired by %s: %s", lease_name, owner, token
+            )
+            return token
+        except Exception as e:
+            logger.error("Error acquiring lease %s: %s", lease_name, e)
+            return 0
+
+    def renew_lease(self, lease_name: str, owner: str, ttl: float) -> bool:
+        """
+        Продлить аренду, если она принадлежит владельцу.
+
+        :param lease_name: Название аренды.
+        :param owner: Идентификатор владельца.
+        :param ttl: Новое время жизни аренды в секундах.
+        :return: True, если аренда продлена.
+        """
+        try:
+            return bool(
+                self._renew_lease(
+                    keys=[lease_name], args=[owner, int(ttl * 1000)]
+                )
+            )
+        except Exception as e:
+            logger.error("Error renewing lease %s: %s", lease_name, e)
+            return False
+
+    def release_lease(self, lease_name: str, owner: str) -> bool:
+        """
+        Освободить аренду, если она принадлежит владельцу.
+
+        :param lease_name: Название аренды.
+        :param owner: Идентификатор владельца.
+        :return: True, если аренда освобождена.
+        """
+        try:
+            return bool(self._release_lease(keys=[lease_name], args=[owner]))
+        except Exception as e:
+            logger.error("Error releasing lease %s: %s", lease_name, e)
+            return False
+
+    def get_version(self, name: str) -> int | None:
+        """
+        Получить номер версии, например, версии живых индексов.
+
+        :param name: Название ключа версии.
+        :return: Номер версии или None, если он не задан.
+        :raises RedisError: Redis недоступен.
+        """
+        # ошибка Redis не означает отсутствия версии: без строящейся
+        # версии её изменения из outbox достались бы только живой
+        version = self.redis_client.get(name)
+        return int(version) if version is not None else None
+
+    def set_version(
+        self, name: str, version: int, ttl: float | None = None
+    ) -> None:
+        """
+        Установить номер версии.
+
+        :param name: Название ключа версии.
+        :param version: Номер версии.
+        :param ttl: Время жизни ключа в секундах; None - бессрочно.
+        """
+        try:
+            self.redis_client.set(
+                name, version, px=int(ttl * 1000) if ttl else None
+            )
+            logger.debug("Set version %s: %s", name, version)
+        except Exception as e:
+            logger.error("Error setting version %s: %s", name, e)
+
+    def clear_version(self, name: str) -> None:
+        """
+        Удалить номер версии.
+
+        :param name: Название ключа версии.
+        """
+        try:
+            self.redis_client.delete(name)
+            logger.debug("Cleared version %s", name)
+        except Exception as e:
+            logger.error("Error clearing version %s: %s", name, e)
+
+    def get_fingerprints(
+        self, key: str, doc_ids: list[str]
+    ) -> list[bytes | None]:
+        """
+        Получить отпечатки документов, уже записанных в индекс.
+
+        :param key: Название хеша отпечатков индекса.
+        :param doc_ids: Идентификаторы документов.
+        :return: Отпечатки в порядке doc_ids; None, если отпечатка нет.
+        """
+        if not doc_ids:
+            return []
+        try:
+            return self.redis_client.hmget(key, doc_ids)
+        except Exception as e:
+            logger.error("Error retrieving fingerprints for %s: %s", key, e)
+            return [None] * len(doc_ids)
+
+    def set_fingerprints(self, key: str, fingerprints: dict[str, bytes]):
+        """
+        Запомнить отпечатки записанных документов.
+
+        :param key: Название хеша отпечатков индекса.
+        :param fingerprints: Идентификатор документа -> отпечаток.
+        """
+        if not fingerprints:
+            return
+        try:
+            self.redis_client.hset(key, mapping=fingerprints)
+            logger.debug("Set %s fingerprints for %s", len(fingerprints), key)
+        except Exception as e:
+            logger.error("Error setting fingerprints for %s: %s", key, e)
+
+    def delete_fingerprints(self, key: str, doc_ids: list[str]) -> None:
+        """
+        Забыть отпечатки удалённых документов.
+
+        :param key: Название хеша отпечатков индекса.
+        :param doc_ids: Идентификаторы документов.
+        """
+        if not doc_ids:
+            return
+        try:
+            self.redis_client.hdel(key, *doc_ids)
+        except Exception as e:
+            logger.error("Error deleting fingerprints for %s: %s", key, e)
+
+    def clear_fingerprints(self, key: str) -> None:
+        """
+        Удалить все отпечатки индекса.
+
+        :param key: Название хеша отпечатков индекса.
+        """
+        try:
+            self.redis_client.delete(key)
+            logger.debug("Cleared fingerprints for %s", key)
+        except Exception as e:
+            logger.error("Error clearing fingerprints for %s: %s", key, e)
+
+    def add_dead_letters(self, key: str, letters: dict[str, str]) -> bool:
+        """
+        Отложить документы, которые не удалось загрузить.
+
+        :param key: Название хеша недоставленных документов.
+        :param letters: Идентификатор письма -> письмо в JSON.
+        :return: True, если письма сохранены.
+        """
+        if not letters:
+            return True
+        try:
+            self.redis_client.hset(key, mapping=letters)
+            logger.debug("Added %s dead letters to %s", len(letters), key)
+            return True
+        except Exception as e:
+            logger.error("Error adding dead letters to %s: %s", key, e)
+            return False
+
+    def get_dead_letters(self, key: str) -> dict[str, dict]:
+        """
+        Получить все недоставленные документы.
+
+        :param key: Название хеша недоставленных документов.
+        :return: Идентификатор письма -> письмо.
+        """
+        try:
+            return {
+                letter_id.decode(): json.loads(letter)
+                for letter_id, letter in self.redis_client.hgetall(key).items()
+            }
+        except Exception as e:
+            logger.error("Error retrieving dead letters from %s: %s", key, e)
+            return {}
+
+    def remove_dead_letters(self, key: str, letter_ids: list[str]) -> None:
+        """
+        Удалить письма из очереди недоставленных.
+
+        :param key: Название хеша недоставленных документов.
+        :param letter_ids: Идентификаторы писем.
+        """
+        if not letter_ids:
+            return
+        try:
+            self.redis_client.hdel(key, *letter_ids)
+        except Exception as e:
+            logger.error("Error removing dead letters from %s: %s", key, e)
+
+    def count_dead_letters(self, key: str) -> int:
+        """
+        Количество недоставленных документов.
+
+        :param key: Название хеша недоставленных документов.
+        """
+        try:
+            return self.redis_client.hlen(key)
+        except Exception as e:
+            logger.error("Error counting dead letters in %s: %s", key, e)
+            return 0
+
+    def add_changes(self, key: str, members: list[str]) -> None:
+        """
+        Запомнить объекты, изменения которых нужно применить повторно.
+
+        Ошибка Redis поднимается: событие, не записанное в множество,
+        нельзя удалять из очереди.
+
+        :param key: Название множества изменений.
+        :param members: Объекты в виде "таблица:id".
+        """
+        if members:
+            self.redis_client.sadd(key, *members)
+
+    def pop_changes(self, key: str, count: int) -> list[str]:
+        """
+        Извлечь из множества не больше count объектов.
+
+        :param key: Название множества изменений.
+        :return: Объекты в виде "таблица:id"; пустой список, если
+            множество исчерпано.
+        :raises RedisError: Redis недоступен.
+        """
+        return [
+            member.decode() for member in self.redis_client.spop(key, count)
+        ]
+
+    def clear_changes(self, key: str) -> None:
+        """
+        Удалить множество изменений.
+
+        :param key: Название множества изменений.
+        """
+        try:
+            self.redis_client.delete(key)
+        except Exception as e:
+            logger.error("Error clearing changes %s: %s", key, e)
+
+    def get_checkpoint(self, key: str) -> dict | None:
+        """
+        Получить контрольную точку долгой задачи.
+
+        :param key: Название ключа контрольной точки.
+        :return: Сохранённое состояние или None, если его нет.
+        """
+        try:
+            checkpoint = self.redis_client.get(key)
+        except Exception as e:
+            logger.error("Error retrieving checkpoint %s: %s", key, e)
+            return None
+        return json.loads(checkpoint) if checkpoint is not None else None
+
+    def set_checkpoint(self, key: str, checkpoint: dict) -> None:
+        """
+        Сохранить контрольную точку долгой задачи.
+
+        :param key: Название ключа контрольной точки.
+        :param checkpoint: Состояние, сериализуемое в JSON.
+        """
+        try:
+            self.redis_client.set(key, json.dumps(checkpoint))
+            logger.debug("Set checkpoint %s: %s", key, checkpoint)
+        except Exception as e:
+            logger.error("Error setting checkpoint %s: %s", key, e)
+
+    def clear_checkpoint(self, key: str) -> None:
+        """
+        Удалить контрольную точку долгой задачи.
+
+        :param key: Название ключа контрольной точки.
+        """
+        try:
+            self.redis_client.delete(key)
+            logger.debug("Cleared checkpoint %s", key)
+        except Exception as e:
+            logger.error("Error clearing checkpoint %s: %s", key, e)
@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import fakeredis
+import pytest
+import redis
+
+import main
+
+DB_TIME = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def fetch_nothing(watermark: tuple[str, str], batch_size: int) -> list:
+    """Выборка изменений без БД: как и запрос, разбирает метку."""
+    modified, last_id = watermark
+    return []
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis, "Redis", lambda **config: fakeredis.FakeRedis(server=server)
+    )
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+
+@pytest.fixture
+def etl_process(redis_client, monkeypatch):
+    """ETLProcess с Redis в памяти и без Elasticsearch и PostgreSQL."""
+    monkeypatch.setattr(main, "Elasticsearch", MagicMock())
+    process = main.ETLProcess({})
+    process.loader = MagicMock()
+    process.loader.adaptive = False
+    process.loader.get_index_versions.return_value = {}
+    process.extractor = MagicMock()
+    process.extractor.fetch_db_time.return_value = DB_TIME
+    for source in ("copy_genres", "copy_persons", "copy_filmwork_documents"):
+        getattr(process.extractor, source).return_value = iter([])
+    for table in ("filmworks", "persons", "genres"):
+        getattr(process.extractor, f"fetch_modified_{table}").side_effect = (
+            fetch_nothing
+        )
+    return process
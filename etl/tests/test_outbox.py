@@ -0,0 +1,38 @@
+from unittest.mock import Mock
+
+from redis.exceptions import RedisError
+
+import main
+
+
+def test_prune_outbox_once_per_interval(etl_process, monkeypatch):
+    monkeypatch.setattr(main, "OUTBOX_PRUNE_INTERVAL", 600)
+    etl_process.extractor.prune_outbox.return_value = 3
+
+    etl_process.prune_outbox()
+    etl_process.prune_outbox()
+
+    etl_process.extractor.prune_outbox.assert_called_once_with(
+        main.OUTBOX_RETENTION
+    )
+
+
+def test_prune_outbox_error_does_not_stop_pass(etl_process):
+    etl_process.extractor.prune_outbox.side_effect = RuntimeError
+
+    etl_process.prune_outbox()
+
+    assert etl_process.outbox_pruned_at is not None
+
+
+def test_redis_error_keeps_building_version(etl_process, monkeypatch):
+    monkeypatch.setattr(main, "CHANGE_CAPTURE", "outbox")
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    client = etl_process.redis_manager.redis_client
+    monkeypatch.setattr(
+        client, "get", Mock(side_effect=[b"1", RedisError, b"1", b"2"])
+    )
+
+    etl_process.refresh_version()
+
+    assert (etl_process.version, etl_process.building) == (1, 2)
@@ -0,0 +1,92 @@
+import threading
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from etl.pool import PostgresPool
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Соединения, открытые пулом; вместо PostgreSQL - заглушки."""
+    opened = []
+
+    def connect(**config):
+        conn = MagicMock(closed=0)
+        conn.info.transaction_status = TRANSACTION_STATUS_IDLE
+
+        def close():
+            conn.closed = 1
+
+        conn.close.side_effect = close
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(psycopg2, "connect", connect)
+    return opened
+
+
+def make_pool(max_size: int = 2, timeout: float = 0.1) -> PostgresPool:
+    return PostgresPool(
+        {},
+        min_size=1,
+        max_size=max_size,
+        max_lifetime=1800,
+        healthcheck_interval=30,
+        timeout=timeout,
+    )
+
+
+def test_idle_connections_are_kept_up_to_max_size(connections):
+    pool = make_pool()
+
+    for _ in range(10):
+        first, second = pool.getconn(), pool.getconn()
+        pool.putconn(second)
+        pool.putconn(first)
+
+    assert len(connections) == 2
+    assert not any(conn.closed for conn in connections)
+
+
+def test_exhausted_pool_waits_for_returned_connection(connections):
+    pool = make_pool(timeout=5)
+    pool.getconn()
+    second = pool.getconn()
+    threading.Timer(0.05, pool.putconn, [second]).start()
+
+    assert pool.getconn() is second
+    assert len(connections) == 2
+
+
+def test_exhausted_pool_times_out(connections):
+    pool = make_pool(max_size=1)
+    pool.getconn()
+
+    with pytest.raises(psycopg2.OperationalError):
+        pool._acquire()
+
+
+def test_closed_connection_forgets_its_metadata(connections):
+    pool = make_pool()
+    conn = pool.getconn()
+
+    pool.putconn(conn, close=True)
+
+    assert conn.closed
+    assert id(conn) not in pool._opened_at
+    assert id(conn) not in pool._checked_at
+    assert pool._size == 0
+
+
+def test_connection_returned_after_closeall_is_closed(connections):
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.closeall()
+
+    pool.putconn(conn)
+
+    assert conn.closed
+    assert pool._size == 0
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+import pytest
+
+import main
+from tests.conftest import DB_TIME
+
+
+@pytest.mark.parametrize("shards", [1, 3])
+def test_rebuild_after_bulk_load(etl_process, monkeypatch, shards):
+    monkeypatch.setattr(main, "SHARDS", shards)
+    monkeypatch.setattr(main, "BULK_INITIAL_LOAD", True)
+
+    etl_process.rebuild_indices()
+
+    assert etl_process.redis_manager.get_version("etl_index_version") == 1
+    etl_process.loader.swap_aliases.assert_called_once_with(
+        {index: f"{index}_v1" for index in etl_process.schemas}
+    )
+    started = DB_TIME - timedelta(seconds=main.INITIAL_LOAD_SAFETY_MARGIN)
+    for shard in range(shards):
+        etl_process.set_shard(shard)
+        watermarks = etl_process.get_watermarks()
+        assert all(
+            watermark is not None
+            and etl_process.convert_to_datetime(watermark[0]) == started
+            for watermark in watermarks.values()
+        ), watermarks
+
+
+def test_failed_rebuild_clears_builder_watermarks(
+    etl_process, redis_client, monkeypatch
+):
+    monkeypatch.setattr(main, "SHARDS", 3)
+    monkeypatch.setattr(main, "BULK_INITIAL_LOAD", True)
+    etl_process.loader.swap_aliases.side_effect = RuntimeError
+
+    with pytest.raises(RuntimeError):
+        etl_process.rebuild_indices()
+
+    assert not redis_client.keys("v1:*")
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+CONTENT_TABLES = (
+    'film_work',
+    'person',
+    'genre',
+    'genre_film_work',
+    'person_film_work',
+)
+
+CREATE_NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION content.etl_notify_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('etl_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+CREATE_NOTIFY_TRIGGER = """
+CREATE TRIGGER {table}_etl_notify
+AFTER INSERT OR UPDATE OR DELETE ON content.{table}
+FOR EACH STATEMENT EXECUTE FUNCTION content.etl_notify_change();
+"""
+
+DROP_NOTIFY_TRIGGER = 'DROP TRIGGER IF EXISTS {table}_etl_notify ON content.{table};'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_add_modified_id_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=CREATE_NOTIFY_FUNCTION,
+            reverse_sql='DROP FUNCTION IF EXISTS content.etl_notify_change();',
+        ),
+    ] + [
+        migrations.RunSQL(
+            sql=CREATE_NOTIFY_TRIGGER.format(table=table),
+            reverse_sql=DROP_NOTIFY_TRIGGER.format(table=table),
+        )
+        for table in CONTENT_TABLES
+    ]
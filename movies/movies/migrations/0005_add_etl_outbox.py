@@ -0,0 +1,99 @@
+from django.db import migrations
+
+# Очередь разбирает ETL в режиме ETL_CHANGE_CAPTURE=outbox; в режиме
+# timestamps триггеры тоже пишут в неё, а ETL удаляет события старше
+# ETL_OUTBOX_RETENTION секунд
+CREATE_OUTBOX_TABLE = """
+CREATE TABLE content.etl_outbox (
+    id bigserial PRIMARY KEY,
+    entity_type varchar(32) NOT NULL,
+    entity_id uuid NOT NULL,
+    operation char(1) NOT NULL,
+    created timestamp with time zone NOT NULL DEFAULT now()
+);
+"""
+
+# Изменение фильма, персоны или жанра: U - вставка/обновление, D - удаление
+CREATE_ENTITY_FUNCTION = """
+CREATE OR REPLACE FUNCTION content.etl_outbox_entity() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO content.etl_outbox (entity_type, entity_id, operation)
+        VALUES (TG_TABLE_NAME, OLD.id, 'D');
+    ELSE
+        INSERT INTO content.etl_outbox (entity_type, entity_id, operation)
+        VALUES (TG_TABLE_NAME, NEW.id, 'U');
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Изменение связи меняет документ фильма, а для персон - и документ персоны
+CREATE_RELATION_FUNCTION = """
+CREATE OR REPLACE FUNCTION content.etl_outbox_relation() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO content.etl_outbox (entity_type, entity_id, operation)
+        VALUES ('film_work', OLD.film_work_id, 'U');
+        IF TG_TABLE_NAME = 'person_film_work' THEN
+            INSERT INTO content.etl_outbox (entity_type, entity_id, operation)
+            VALUES ('person', OLD.person_id, 'U');
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO content.etl_outbox (entity_type, entity_id, operation)
+        VALUES ('film_work', NEW.film_work_id, 'U');
+        IF TG_TABLE_NAME = 'person_film_work' THEN
+            INSERT INTO content.etl_outbox (entity_type, entity_id, operation)
+            VALUES ('person', NEW.person_id, 'U');
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+CREATE_OUTBOX_TRIGGER = """
+CREATE TRIGGER {table}_etl_outbox
+AFTER INSERT OR UPDATE OR DELETE ON content.{table}
+FOR EACH ROW EXECUTE FUNCTION content.{function}();
+"""
+
+DROP_OUTBOX_TRIGGER = 'DROP TRIGGER IF EXISTS {table}_etl_outbox ON content.{table};'
+
+OUTBOX_TRIGGERS = (
+    ('film_work', 'etl_outbox_entity'),
+    ('person', 'etl_outbox_entity'),
+    ('genre', 'etl_outbox_entity'),
+    ('genre_film_work', 'etl_outbox_relation'),
+    ('person_film_work', 'etl_outbox_relation'),
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_add_etl_change_notify'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=CREATE_OUTBOX_TABLE,
+            reverse_sql='DROP TABLE IF EXISTS content.etl_outbox;',
+        ),
+        migrations.RunSQL(
+            sql=CREATE_ENTITY_FUNCTION,
+            reverse_sql='DROP FUNCTION IF EXISTS content.etl_outbox_entity();',
+        ),
+        migrations.RunSQL(
+            sql=CREATE_RELATION_FUNCTION,
+            reverse_sql='DROP FUNCTION IF EXISTS content.etl_outbox_relation();',
+        ),
+    ] + [
+        migrations.RunSQL(
+            sql=CREATE_OUTBOX_TRIGGER.format(table=table, function=function),
+            reverse_sql=DROP_OUTBOX_TRIGGER.format(table=table),
+        )
+        for table, function in OUTBOX_TRIGGERS
+    ]
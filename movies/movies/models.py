@@ -28,6 +28,9 @@ class Genre(UUIDMixin, TimeStampedMixin):
         db_table = "content\".\"genre"
         verbose_name = _('Genre')
         verbose_name_plural = _('Genres')
+        indexes = [
+            models.Index(fields=['modified', 'id'], name='genre_modified_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -47,6 +50,7 @@ class Person(UUIDMixin, TimeStampedMixin):
         verbose_name_plural = _('Persons')
         indexes = [
             models.Index(fields=['full_name'], name='person_full_name_idx'),
+            models.Index(fields=['modified', 'id'], name='person_modified_idx'),
         ]
 
     def __str__(self):
@@ -82,6 +86,7 @@ class Filmwork(UUIDMixin, TimeStampedMixin):
             models.Index(fields=['creation_date', 'rating'], name='film_work_creation_date_idx'),
             models.Index(fields=['title'], name='film_work_title_idx'),
             models.Index(fields=['rating'], name='film_work_rating_idx'),
+            models.Index(fields=['modified', 'id'], name='film_work_modified_idx'),
         ]
 
     def __str__(self):